@@ -1,17 +1,44 @@
 import os
+import sys
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import HTTPError as Urllib3Error
 import logging
 import datetime
 import re
 import time
+import random
 import threading
 import mimetypes
+import hashlib
+import io
+import gzip
+import zlib
+import bisect
+import struct
+import sqlite3
+import mmap
+import codecs
+import socket
+import contextlib
 import concurrent.futures # Added for concurrent fetching
-from flask import Flask, jsonify, request, render_template
-from urllib.parse import urlparse, unquote
+from array import array
+from collections import namedtuple, OrderedDict, deque
+from flask import Flask, jsonify, request, render_template, Response
+from urllib.parse import urlparse, unquote, urlencode, parse_qsl, urlunparse
 from dotenv import load_dotenv
 from waitress import serve
+try:
+    import fcntl # Cross-process file locks on POSIX
+except ImportError:
+    fcntl = None
+    import msvcrt # Windows
+
+# Start of the startup-time breakdown (see StartupTimer). Taken this high, before configuration and every
+# definition below, so the first phase ('config') covers the module's own setup; the imports above are not timed.
+_LAUNCHED = time.perf_counter()
 
 load_dotenv() 
 
@@ -47,6 +74,21 @@ DATA_FILE_PATH = os.environ.get('APP_DATA_FILE_PATH', DEFAULT_DATA_PATH)
 DATA_FILE_PATH = os.path.abspath(DATA_FILE_PATH)
 logging.info(f"Using data file path: {DATA_FILE_PATH}")
 
+# Archive storage backend: 'json' (data.json + journal) or 'sqlite' (WAL-mode database)
+STORAGE_BACKEND = os.environ.get('APP_STORAGE_BACKEND', 'json').strip().lower()
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(DATA_FILE_PATH), 'archive.db')
+SQLITE_PATH = os.path.abspath(os.environ.get('APP_SQLITE_PATH', DEFAULT_SQLITE_PATH))
+
+# Multi-process mode: processes sharing the data directory compete for the ingestion lease. The holder polls the
+# feeds and writes the archive; the others serve pages and follow the archive. APP_ROLE=web never takes the lease.
+APP_ROLE = os.environ.get('APP_ROLE', 'auto').strip().lower()
+INGEST_LEASE_PATH = os.path.join(os.path.dirname(DATA_FILE_PATH), 'ingest.lock')
+ARCHIVE_LOCK_PATH = os.path.join(os.path.dirname(DATA_FILE_PATH), 'archive.lock')
+ARCHIVE_STAMP_PATH = os.path.join(os.path.dirname(DATA_FILE_PATH), 'archive.version')
+CONTROL_DIR = os.path.join(os.path.dirname(DATA_FILE_PATH), 'control') # Requests forwarded from web workers to the ingestion process
+ARCHIVE_POLL_SECONDS = float(os.environ.get('ARCHIVE_POLL_SECONDS', 1)) # How often web workers check the archive version stamp
+LEASE_RETRY_SECONDS = int(os.environ.get('LEASE_RETRY_SECONDS', 5)) # How often web workers try to take over ingestion
+
 
 # Communities.Win Headers - Load sensitive parts from environment
 # Define non-sensitive headers first
@@ -90,9 +132,85 @@ SUPPORTED_VIDEO_EXTENSIONS = {'.mp4'}
 SUPPORTED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.gif', '.png', '.webp'}
 SUPPORTED_EXTENSIONS = SUPPORTED_VIDEO_EXTENSIONS.union(SUPPORTED_IMAGE_EXTENSIONS)
 
-REQUEST_TIMEOUT = 30
-UPLOAD_TIMEOUT = 300
-PROCESSING_INTERVAL_SECONDS = 120 
+REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', 30))
+UPLOAD_TIMEOUT = int(os.environ.get('UPLOAD_TIMEOUT', 300))
+# (connect, read) timeouts used by the pooled HTTP sessions; read defaults to REQUEST_TIMEOUT
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10))
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', REQUEST_TIMEOUT))
+UPLOAD_READ_TIMEOUT = float(os.environ.get('HTTP_UPLOAD_READ_TIMEOUT', UPLOAD_TIMEOUT))
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 3))
+HTTP_BACKOFF_FACTOR = float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.5))
+PROCESSING_INTERVAL_SECONDS = int(os.environ.get('PROCESSING_INTERVAL_SECONDS', 120)) # Initial per-feed polling interval
+
+# Per-feed adaptive polling: each feed's interval follows its observed new-post rate within these bounds
+FEED_MIN_INTERVAL_SECONDS = int(os.environ.get('FEED_MIN_INTERVAL_SECONDS', 30))
+FEED_MAX_INTERVAL_SECONDS = int(os.environ.get('FEED_MAX_INTERVAL_SECONDS', 900))
+FEED_INTERVAL_JITTER = float(os.environ.get('FEED_INTERVAL_JITTER', 0.1)) # +/- fraction applied to each interval
+FEED_RATE_SMOOTHING = 0.3 # Weight of the latest observation in the new-post rate average
+MANUAL_PROCESS_TIMEOUT = int(os.environ.get('MANUAL_PROCESS_TIMEOUT', 600)) # Max seconds /process?wait=1 waits for its cycle
+
+# /events (Server-Sent Events): each open stream holds one Waitress thread, so keep EVENT_MAX_STREAMS well below WAITRESS_THREADS
+EVENT_MAX_STREAMS = int(os.environ.get('EVENT_MAX_STREAMS', 4))
+EVENT_STREAM_MAX_SECONDS = int(os.environ.get('EVENT_STREAM_MAX_SECONDS', 300)) # Streams are closed after this; browsers reconnect and resume
+EVENT_KEEPALIVE_SECONDS = int(os.environ.get('EVENT_KEEPALIVE_SECONDS', 15))
+EVENT_REPLAY_LIMIT = int(os.environ.get('EVENT_REPLAY_LIMIT', 1000)) # Max entries replayed on resume; larger gaps get a 'reset' event
+
+# Mirror (download + upload) concurrency
+MIRROR_WORKERS = int(os.environ.get('MIRROR_WORKERS', 4))
+MIRROR_PER_HOST_LIMIT = int(os.environ.get('MIRROR_PER_HOST_LIMIT', 2)) # Concurrent downloads per source CDN host
+FILEDITCH_CONCURRENCY = int(os.environ.get('FILEDITCH_CONCURRENCY', 2)) # Concurrent uploads to FileDitch
+
+# Transfer scheduler: token-bucket byte-rate caps (0 = unlimited) on uploads to FileDitch and on downloads from each
+# source host. Mirrors start smallest first (known size from the probe, else an estimate by media type).
+TRANSFER_MAX_BYTES_PER_SECOND = int(os.environ.get('TRANSFER_MAX_BYTES_PER_SECOND', 0))
+TRANSFER_HOST_MAX_BYTES_PER_SECOND = int(os.environ.get('TRANSFER_HOST_MAX_BYTES_PER_SECOND', 0))
+TRANSFER_BURST_SECONDS = float(os.environ.get('TRANSFER_BURST_SECONDS', 1)) # Bucket size, in seconds at the capped rate
+TRANSFER_ASSUMED_IMAGE_BYTES = 2 * 1024 * 1024 # Size estimates for ordering when the probe didn't report one
+TRANSFER_ASSUMED_VIDEO_BYTES = 64 * 1024 * 1024
+TRANSFER_RATE_WINDOW_SECONDS = 10 # Window for the reported throughput
+
+# Durable mirror job queue: failed mirrors are retried with exponential backoff, then dead-lettered
+MIRROR_MAX_ATTEMPTS = int(os.environ.get('MIRROR_MAX_ATTEMPTS', 8))
+MIRROR_RETRY_BASE_SECONDS = int(os.environ.get('MIRROR_RETRY_BASE_SECONDS', 60)) # Delay after the first failure; doubles per attempt
+MIRROR_RETRY_MAX_SECONDS = int(os.environ.get('MIRROR_RETRY_MAX_SECONDS', 6 * 3600))
+
+# Ingestion engine: 'thread' (background thread + thread pools) or 'asyncio' (single event loop, needs aiohttp)
+INGESTION_ENGINE = os.environ.get('INGESTION_ENGINE', 'thread').strip().lower()
+ASYNC_MIRROR_CONCURRENCY = int(os.environ.get('ASYNC_MIRROR_CONCURRENCY', 32)) # In-flight mirrors on the asyncio engine
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', 100))
+STREAM_CHUNK_SIZE = 64 * 1024
+# Feed responses are parsed incrementally; a single post (or other top-level value) larger than this is rejected
+FEED_MAX_VALUE_BYTES = int(os.environ.get('FEED_MAX_VALUE_BYTES', 4 * 1024 * 1024))
+
+# Media files up to this size are hashed in memory before uploading, so duplicate content skips the upload
+MEDIA_HASH_BUFFER_BYTES = int(os.environ.get('MEDIA_HASH_BUFFER_BYTES', 32 * 1024 * 1024))
+
+# Pre-flight probe: new posts get a HEAD (or Range 0-0 GET) before mirroring; dead links, non-media responses and
+# files over MEDIA_MAX_BYTES never reach the mirror stage. Rejections are remembered per URL for PROBE_NEGATIVE_TTL_SECONDS.
+PROBE_ENABLED = os.environ.get('PROBE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PROBE_CONCURRENCY = int(os.environ.get('PROBE_CONCURRENCY', 8))
+PROBE_NEGATIVE_TTL_SECONDS = int(os.environ.get('PROBE_NEGATIVE_TTL_SECONDS', 6 * 3600))
+MEDIA_MAX_BYTES = int(os.environ.get('MEDIA_MAX_BYTES', 5 * 1024 * 1024 * 1024))
+# Content-Type prefixes accepted from the source; a response without a Content-Type is accepted
+PROBE_ALLOWED_TYPES = tuple(t.strip().lower() for t in os.environ.get('PROBE_ALLOWED_TYPES', 'image/,video/,application/octet-stream,binary/octet-stream').split(',') if t.strip())
+
+# Optional spool: videos are downloaded to this directory (resuming with Range requests) and uploaded from disk.
+# Empty disables spooling, so every file is piped straight from the source into the upload.
+MEDIA_SPOOL_DIR = os.environ.get('APP_SPOOL_DIR', '').strip()
+SPOOL_MAX_BYTES = int(os.environ.get('SPOOL_MAX_BYTES', 2 * 1024 * 1024 * 1024)) # Disk budget; least recently used files are evicted
+SPOOL_RESUME_ATTEMPTS = int(os.environ.get('SPOOL_RESUME_ATTEMPTS', 5)) # Range resumes per download after an interruption
+SPOOL_UPLOAD_CHUNK = 1024 * 1024
+
+# /data API: largest page a client may request, and items per chunk when streaming a full export
+DATA_PAGE_MAX_LIMIT = int(os.environ.get('DATA_PAGE_MAX_LIMIT', 1000))
+DATA_STREAM_BATCH = 200
+
+# Index page: rows per page (further pages load on scroll) and rendered pages kept in the render cache
+INDEX_PAGE_SIZE = int(os.environ.get('INDEX_PAGE_SIZE', 100))
+INDEX_RENDER_CACHE_SIZE = int(os.environ.get('INDEX_RENDER_CACHE_SIZE', 64))
+
+# Journal records appended since the last snapshot before data.json is rewritten (compacted)
+JOURNAL_COMPACT_THRESHOLD = int(os.environ.get('APP_JOURNAL_COMPACT_THRESHOLD', 500))
 
 log_format = '%(asctime)s - %(levelname)s - [%(threadName)s] - %(message)s' # Added threadName
 logging.basicConfig(level=logging.INFO, format=log_format, datefmt='%Y-%m-%dT%H:%M:%S%z')
@@ -102,10 +220,219 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 app = Flask(__name__, template_folder=os.path.join(script_dir, 'templates'), static_folder=os.path.join(script_dir, 'static'))
 
 
-data_lock = threading.Lock()
+# Startup Timing (StartupTimer)
+class StartupTimer:
+    """
+    Wall-clock breakdown of process startup. mark(phase) adds the time since the previous mark to
+    that phase; finish() logs the breakdown once the server is about to accept requests. Work that
+    continues in the background afterwards is reported with milestone().
+    """
+
+    def __init__(self, launched):
+        self.launched = launched
+        self._last = launched
+        self.phases = {}
+        self.milestones = {}
+        self.ready_seconds = None
+
+    def since_launch(self):
+        return time.perf_counter() - self.launched
+
+    def mark(self, phase):
+        if self.ready_seconds is not None:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def finish(self):
+        if self.ready_seconds is not None:
+            return
+        self.ready_seconds = self.since_launch()
+        breakdown = ', '.join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.phases.items())
+        logging.info(f"Startup: {breakdown}; ready in {self.ready_seconds * 1000:.0f}ms.")
+
+    def milestone(self, name):
+        """Records (once) how long after launch something finished, and logs it."""
+        if name not in self.milestones:
+            self.milestones[name] = self.since_launch()
+            logging.info(f"Startup milestone: {name} after {self.milestones[name] * 1000:.0f}ms.")
+
+    def stats(self):
+        return {"phases": {phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+                "ready_seconds": round(self.ready_seconds, 4) if self.ready_seconds is not None else None,
+                "milestones": {name: round(seconds, 4) for name, seconds in self.milestones.items()}}
+
+startup_timer = StartupTimer(_LAUNCHED)
+startup_timer.mark('config')
+
+
+# Metrics (Counter, Histogram, CallbackMetric) exposed in Prometheus text format on /metrics
+METRIC_PREFIX = 'ip2ditch_'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SIZE_BUCKETS = tuple(64 * 1024 * 4 ** i for i in range(9)) # 64 KiB .. 4 GiB
+_metrics_registry = []
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Counter:
+    """Monotonic counter with optional labels. inc() is one dict update under a lock."""
+
+    type = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = METRIC_PREFIX + name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics_registry.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values]
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = METRIC_PREFIX + name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {} # labelvalues -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _metrics_registry.append(self)
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', repr(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {values[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {values[-1]}")
+        return lines
+
+class CallbackMetric:
+    """Gauge (or externally kept counter) whose values are read from a callback at scrape time."""
+
+    def __init__(self, name, help_text, labelnames, callback, metric_type='gauge'):
+        self.name = METRIC_PREFIX + name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.type = metric_type
+        self._callback = callback
+        _metrics_registry.append(self)
+
+    def render(self):
+        try:
+            values = self._callback()
+        except Exception as e:
+            logging.error(f"Error collecting metric {self.name}: {e}")
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in sorted(values.items())]
+
+def render_metrics():
+    """Returns every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics_registry:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+FEED_FETCH_SECONDS = Histogram('feed_fetch_seconds', "Feed fetch latency, including retries.", ('feed',))
+FEED_POLLS = Counter('feed_polls_total', "Feed polls by outcome (ok, not_modified, error).", ('feed', 'outcome'))
+DOWNLOAD_SECONDS = Histogram('download_seconds', "Source download time. Piped transfers count until the upload starts; the rest is in upload_seconds.", ('mode',))
+UPLOAD_SECONDS = Histogram('upload_seconds', "FileDitch upload time. Piped transfers include streaming the rest of the source.", ('mode',))
+MEDIA_BYTES = Histogram('media_bytes', "Size of each mirrored file.", ('mode',), buckets=SIZE_BUCKETS)
+TRANSFER_BYTES = Counter('uploaded_bytes_total', "Bytes uploaded to FileDitch.", ('mode',))
+STORAGE_SECONDS = Histogram('storage_seconds', "Archive storage operation time (load, append, rewrite).", ('backend', 'operation'))
+LOCK_WAIT_SECONDS = Histogram('lock_wait_seconds', "Time spent waiting to acquire a lock.", ('lock',))
+LOCK_HOLD_SECONDS = Histogram('lock_hold_seconds', "Time a lock was held.", ('lock',))
+CYCLE_SECONDS = Histogram('cycle_seconds', "Processing cycle duration.")
+POSTS_SKIPPED = Counter('posts_skipped_total', "Feed posts not mirrored, by reason (already_archived and in_flight are dedup hits).", ('reason',))
+ERRORS = Counter('errors_total', "Errors by stage.", ('stage',))
+TRANSFER_THROTTLED_SECONDS = Counter('transfer_throttled_seconds_total', "Time transfers waited on the byte-rate limits.", ('direction',))
+PROBES = Counter('media_probes_total', "Pre-flight media probes by outcome (ok, unverified, cached, or the rejection reason).", ('outcome',))
+
+class _InstrumentedLock:
+    """threading.Lock that records how long callers wait for it and how long it is held."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = time.perf_counter()
+            LOCK_WAIT_SECONDS.observe(self._acquired_at - started, self.name)
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        LOCK_HOLD_SECONDS.observe(held, self.name)
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+data_lock = _InstrumentedLock('data')
+
+def _journal_path(filepath):
+    return filepath + ".journal"
 
 def load_data(filepath):
-    """Loads data from the JSON file. Assumes lock is held."""
+    """
+    Loads the snapshot from the JSON file and replays any journal records appended since.
+    A legacy data.json without a journal is used as-is as the base snapshot. Assumes lock is held.
+    """
+    data = _load_snapshot(filepath)
+    replayed = _replay_journal(filepath, data)
+    if replayed:
+        logging.info(f"Replayed {replayed} journal records on top of {filepath} ({len(data)} items total)")
+    return data
+
+def _load_snapshot(filepath):
+    """Loads the base snapshot list from the JSON file. Assumes lock is held."""
     try:
         # Ensure the *directory* exists before trying to read/write
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
@@ -135,16 +462,111 @@ def load_data(filepath):
         logging.error(f"Error loading data from {filepath}: {e}")
         return [] # Return empty list on generic error
 
+def _replay_journal(filepath, data):
+    """
+    Appends journal records to data in place, skipping entries already in the snapshot
+    (left over from a compaction that was interrupted before the journal was cleared).
+    A torn final record from a crash mid-append is dropped and truncated away.
+    Returns the number of records replayed. Assumes lock is held.
+    """
+    journal_path = _journal_path(filepath)
+    if not os.path.exists(journal_path):
+        return 0
+    seen_keys = set()
+    for item in data:
+        if isinstance(item, dict):
+            key = _dedup_key(item)
+            if key is not None:
+                seen_keys.add(key)
+    replayed = 0
+    good_offset = 0
+    try:
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    logging.warning(f"Dropping incomplete trailing record in journal {journal_path}")
+                    break
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError) as json_err:
+                        logging.error(f"Corrupt record in journal {journal_path} at offset {good_offset}: {json_err}. Ignoring the rest of the journal.")
+                        break
+                    if isinstance(record, dict):
+                        key = _dedup_key(record)
+                        if key is None or key not in seen_keys:
+                            data.append(record)
+                            replayed += 1
+                            if key is not None:
+                                seen_keys.add(key)
+                good_offset += len(line)
+        if good_offset < os.path.getsize(journal_path):
+            with open(journal_path, 'r+b') as f:
+                f.truncate(good_offset)
+            logging.info(f"Truncated journal {journal_path} to last good record (offset {good_offset}).")
+    except Exception as e:
+        logging.error(f"Error replaying journal {journal_path}: {e}")
+    return replayed
+
+def count_journal_records(filepath):
+    """Returns the number of records in the journal file (0 if absent)."""
+    try:
+        with open(_journal_path(filepath), 'rb') as f:
+            return sum(1 for line in f if line.strip())
+    except FileNotFoundError:
+        return 0
+
+def append_data(filepath, entries):
+    """
+    Appends entries to the journal as JSON Lines with a single fsync for the batch.
+    Returns True if the batch is durable. Assumes lock is held.
+    """
+    journal_path = _journal_path(filepath)
+    try:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        if not os.path.exists(journal_path) and os.path.exists(filepath):
+            logging.info(f"Migrating {filepath} to journaled storage; existing file is kept as the base snapshot.")
+        payload = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+        with open(journal_path, 'a', encoding='utf-8') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        logging.info(f"Appended {len(entries)} records to journal {journal_path}")
+        return True
+    except Exception as e:
+        logging.error(f"Error appending to journal {journal_path}: {e}")
+        return False
+
+def compact_data(filepath, data):
+    """
+    Rewrites the snapshot with the full data and clears the journal. Returns True on success.
+    Assumes lock is held.
+    """
+    if not save_data(filepath, data):
+        return False
+    try:
+        with open(_journal_path(filepath), 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        logging.info(f"Compacted journal into {filepath} ({len(data)} items)")
+        return True
+    except Exception as e:
+        logging.error(f"Error clearing journal for {filepath} after compaction: {e}")
+        return False
+
 def save_data(filepath, data):
-    """Saves data to the JSON file. Assumes lock is held."""
+    """Saves data to the JSON file. Returns True on success. Assumes lock is held."""
     try:
         # Ensure the *directory* exists before trying to write
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         temp_filepath = filepath + ".tmp"
         with open(temp_filepath, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
         os.replace(temp_filepath, filepath) # Atomic replace on most OS
         logging.info(f"Data successfully saved to {filepath} ({len(data)} items)")
+        return True
     except Exception as e:
         logging.error(f"Error saving data to {filepath}: {e}")
         if 'temp_filepath' in locals() and os.path.exists(temp_filepath):
@@ -153,416 +575,3956 @@ def save_data(filepath, data):
                 logging.info(f"Removed temporary file {temp_filepath} after save error.")
             except Exception as remove_err:
                 logging.error(f"Could not remove temporary file {temp_filepath} after save error: {remove_err}")
+        return False
 
 
-def fetch_communities_data(api_url):
-    """Fetches data from a communities.win API endpoint."""
-    # This function remains unchanged, designed to fetch one URL
-    logging.info(f"Attempting to fetch data from: {api_url}")
-    try:
-        # Uses the global COMMUNITIES_HEADERS which now includes env vars
-        response = requests.get(api_url, headers=COMMUNITIES_HEADERS, timeout=REQUEST_TIMEOUT)
-        logging.debug(f"Response status code for {api_url}: {response.status_code}")
-        response.raise_for_status()
+def _dedup_key(item):
+    """Returns the (title, author) duplicate-check key for an archive entry, or None if incomplete."""
+    title = item.get('title', '').strip()
+    author = item.get('author', '').strip()
+    if title and author:
+        return (title, author)
+    return None
+
+def _dedup_hash(key):
+    """Stable 64-bit BLAKE2b hash of a (title, author) key, which is what ArchiveStore keeps in its dedup set."""
+    title, author = key
+    return int.from_bytes(hashlib.blake2b(f"{title}\0{author}".encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+# Archive Storage Backends (JsonJournalStorage, SqliteStorage)
+# Both expose: load() -> items oldest first, append(entries, first_position) -> bool (one durable batch),
+# rewrite(items) -> bool (bring disk fully in line with memory), wants_rewrite,
+# tail() -> entries another process committed since load()/tail() (None: reload instead),
+# position() / seek(position) -> save and restore where tail() continues from (used by the dedup index file), and
+# filter_positions(query, upto, start=0, limit=None) -> up to limit archive positions in [start, upto) matching
+# a DataQuery, or None if the backend can't index it.
+# All but filter_positions() assume data_lock is held.
+class JsonJournalStorage:
+    """data.json snapshot plus an append-only JSON Lines journal, compacted every JOURNAL_COMPACT_THRESHOLD records."""
+
+    name = 'json'
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._journal_records = 0
+        self._journal_offset = 0 # Bytes of the journal already loaded, for tail()
+
+    def load(self):
+        data = load_data(self.filepath)
+        self._journal_records = count_journal_records(self.filepath)
         try:
-            data = response.json()
-            logging.debug(f"Successfully decoded JSON from {api_url}")
-            return data # Return the parsed data or None on error below
-        except json.JSONDecodeError as json_err:
-            logging.error(f"Error decoding JSON response from {api_url}. Error: {json_err}. Response text: {response.text[:200]}...")
-            return None
-    except requests.exceptions.Timeout:
-        logging.error(f"Timeout occurred while fetching data from {api_url} after {REQUEST_TIMEOUT} seconds.")
-        return None
-    except requests.exceptions.HTTPError as http_err:
-        logging.error(f"HTTP error occurred for {api_url}: {http_err}")
-        if http_err.response is not None:
-             # Check for 401/403 which might indicate bad credentials
-             if http_err.response.status_code in [401, 403]:
-                  logging.error("Received 401/403 Unauthorized/Forbidden error. Check your CW_API_KEY, CW_API_SECRET, CW_XSRF_TOKEN environment variables.")
-             logging.error(f"Status Code: {http_err.response.status_code}, Response: {http_err.response.text[:200]}...")
-        return None
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Generic network error fetching data from {api_url}: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            logging.error(f"Status Code: {e.response.status_code}, Response: {e.response.text[:200]}...")
-        return None
-    except Exception as e:
-        logging.error(f"An unexpected error occurred during fetch for {api_url}: {e}")
-        return None
+            self._journal_offset = os.path.getsize(_journal_path(self.filepath))
+        except FileNotFoundError:
+            self._journal_offset = 0
+        return data
 
-def upload_to_fileditch(file_url):
-    """Downloads a file (video/image) from a URL and uploads it to FileDitch."""
-    try:
-        logging.info(f"Attempting to download: {file_url}")
-        download_headers = {
-            'User-Agent': COMMUNITIES_HEADERS.get('user-agent'), # Get from global headers
-            'Accept': 'image/jpeg, image/png, image/gif, image/webp, video/mp4, */*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Referer': file_url
-        }
-        with requests.get(file_url, stream=True, timeout=REQUEST_TIMEOUT, headers=download_headers) as r:
-            r.raise_for_status()
-            logging.info(f"Download started for {file_url} (Status: {r.status_code})")
+    def _snapshot_signature(self):
+        try:
+            st = os.stat(self.filepath)
+        except FileNotFoundError:
+            return None
+        return [st.st_ino, st.st_size, st.st_mtime_ns]
 
-            filename = None
-            original_extension = os.path.splitext(urlparse(file_url).path)[1].lower()
+    def position(self):
+        """Where load()/append()/rewrite() left off, as a JSON-able token for seek()."""
+        return {"snapshot": self._snapshot_signature(), "journal_offset": self._journal_offset}
 
-            try:
-                content_disposition = r.headers.get('content-disposition')
-                if content_disposition:
-                    fname_match = re.search(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', content_disposition, re.IGNORECASE)
-                    if fname_match:
-                        filename = unquote(fname_match.group(1))
-                        filename = re.sub(r'[\\/*?:"<>|]', '_', filename) # Basic sanitization
-                        logging.debug(f"Filename from Content-Disposition: '{filename}'")
-
-                if not filename:
-                    parsed_url = urlparse(file_url)
-                    path_part = unquote(parsed_url.path.split('/')[-1])
-                    if path_part and '.' in path_part:
-                        filename = re.sub(r'[\\/*?:"<>|]', '_', path_part) # Basic sanitization
-                        logging.debug(f"Filename from URL path: '{filename}'")
-
-                if not filename:
-                    fallback_ext = original_extension if original_extension in SUPPORTED_EXTENSIONS else ".dat"
-                    filename = f"upload{fallback_ext}"
-                    logging.debug(f"Using fallback filename: '{filename}'")
-
-                # Ensure filename has an extension (add original if missing and supported)
-                if '.' not in filename[-6:]: # Check last few chars for extension
-                    current_ext = os.path.splitext(filename)[1]
-                    if not current_ext:
-                          add_ext = original_extension if original_extension in SUPPORTED_EXTENSIONS else ".dat"
-                          filename += add_ext
-                          logging.debug(f"Appended extension '{add_ext}', final filename: '{filename}'")
-
-            except Exception as e_fname:
-                logging.warning(f"Could not reliably determine filename for {file_url}: {e_fname}. Using fallback 'upload.dat'.")
-                filename = "upload.dat"
-
-            mime_type, _ = mimetypes.guess_type(filename)
-            if not mime_type:
-                # Fallback MIME type guessing based on known extensions
-                if original_extension == '.mp4': mime_type = 'video/mp4'
-                elif original_extension in ['.jpg', '.jpeg']: mime_type = 'image/jpeg'
-                elif original_extension == '.png': mime_type = 'image/png'
-                elif original_extension == '.gif': mime_type = 'image/gif'
-                elif original_extension == '.webp': mime_type = 'image/webp'
-                else: mime_type = 'application/octet-stream'
-                logging.warning(f"Could not guess MIME type for '{filename}'. Using fallback: {mime_type}")
-            logging.debug(f"Using MIME type: {mime_type} for upload.")
-
-            files = {'files[]': (filename, r.raw, mime_type)}
-            # Uses the global FILEDITCH_UPLOAD_URL
-            logging.info(f"Uploading '{filename}' (from {file_url}, type: {mime_type}) to {FILEDITCH_UPLOAD_URL}...")
+    def seek(self, position):
+        """Makes tail() continue from a position() token. False if the files changed under it (reload instead)."""
+        if not isinstance(position, dict) or position.get('snapshot') != self._snapshot_signature():
+            return False
+        offset = position.get('journal_offset')
+        try:
+            journal_size = os.path.getsize(_journal_path(self.filepath))
+        except FileNotFoundError:
+            journal_size = 0
+        if not isinstance(offset, int) or offset > journal_size:
+            return False
+        self._journal_offset = offset
+        return True
 
-            upload_response = requests.post(FILEDITCH_UPLOAD_URL, files=files, timeout=UPLOAD_TIMEOUT)
-            upload_response.raise_for_status()
+    def tail(self):
+        """Journal records appended by another process since load()/tail(), or None if a full reload is needed."""
+        try:
+            with open(_journal_path(self.filepath), 'rb') as f:
+                if f.seek(0, os.SEEK_END) < self._journal_offset:
+                    return None # Compacted since
+                f.seek(self._journal_offset)
+                entries = []
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    if line.strip():
+                        try:
+                            entries.append(json.loads(line))
+                        except (json.JSONDecodeError, UnicodeDecodeError) as json_err:
+                            logging.error(f"Corrupt record in journal at offset {self._journal_offset}: {json_err}. Reloading the archive.")
+                            return None
+                    self._journal_offset += len(line)
+                return entries
+        except FileNotFoundError:
+            return None if self._journal_offset else []
 
-            try:
-                upload_data = upload_response.json()
-            except json.JSONDecodeError:
-                logging.error(f"Error decoding FileDitch JSON response. Status: {upload_response.status_code}. Response text: {upload_response.text[:200]}...")
-                return None
+    def append(self, entries, first_position):
+        if not append_data(self.filepath, entries):
+            return False
+        self._journal_records += len(entries)
+        self._journal_offset = os.path.getsize(_journal_path(self.filepath))
+        return True
 
-            logging.debug(f"FileDitch response: {json.dumps(upload_data, indent=2)}")
+    @property
+    def wants_rewrite(self):
+        return self._journal_records >= JOURNAL_COMPACT_THRESHOLD
 
-            if upload_data.get("success") is True and isinstance(upload_data.get("files"), list) and len(upload_data["files"]) > 0:
-                first_file = upload_data["files"][0]
-                if isinstance(first_file, dict) and first_file.get("url"):
-                    fileditch_link = first_file["url"]
-                    logging.info(f"Successfully uploaded to FileDitch: {fileditch_link}")
-                    return fileditch_link
-                else:
-                    logging.error(f"FileDitch response structure mismatch or missing 'url'. File data: {first_file}")
-                    return None
-            else:
-                error_message = upload_data.get("error", "No specific error message provided.")
-                logging.error(f"FileDitch upload failed. Success flag: {upload_data.get('success')}. Error: {error_message}. Full response: {upload_data}")
-                return None
+    def rewrite(self, items):
+        if not compact_data(self.filepath, list(items)):
+            return False
+        self._journal_records = 0
+        self._journal_offset = 0
+        return True
 
-    except requests.exceptions.Timeout:
-        stage = "download" if 'r' not in locals() else "upload"
-        timeout_val = REQUEST_TIMEOUT if stage == "download" else UPLOAD_TIMEOUT
-        logging.error(f"Timeout ({timeout_val}s) occurred during {stage} for URL: {file_url}")
-        return None
-    except requests.exceptions.HTTPError as http_err:
-        stage = "download" if 'r' not in locals() else "upload"
-        logging.error(f"HTTP error occurred during {stage} for {file_url}: {http_err}")
-        if hasattr(http_err, 'response') and http_err.response is not None:
-            logging.error(f"Status Code: {http_err.response.status_code}, Response: {http_err.response.text[:200]}...")
-        return None
-    except requests.exceptions.RequestException as e:
-        stage = "download" if 'r' not in locals() else "upload"
-        logging.error(f"Network error during {stage} for {file_url}: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            logging.error(f"Status Code: {e.response.status_code}, Response: {e.response.text[:200]}...")
-        return None
-    except Exception as e:
-        logging.error(f"An unexpected error occurred during upload processing for {file_url}: {e}", exc_info=True)
+    def filter_positions(self, query, upto, start=0, limit=None):
         return None
 
-# Core Processing Logic (_run_processing_cycle)
-def _run_processing_cycle():
+
+class SqliteStorage:
     """
-    Internal function to fetch, process, and save data. Handles locking.
-    Fetches API data concurrently.
-    Returns a tuple: (success_flag, new_items_added, total_items_in_file, posts_checked_this_cycle)
+    SQLite database in WAL mode. Each archive entry is one row whose id is its archive position + 1,
+    with a unique index on the (title, author) dedup key and secondary indexes for the /data filters.
+    The writer uses one connection under data_lock; readers get a per-thread connection, so under WAL
+    they see the last committed state without blocking (or being blocked by) the writer.
     """
-    logging.info("Starting processing cycle...")
-    new_items_added = 0
-    processed_api_posts_count = 0
-    current_total_items = 0
-    success = False
 
-    # Uses global DATA_FILE_PATH loaded from env
-    with data_lock:
-        existing_data = load_data(DATA_FILE_PATH)
-        if not isinstance(existing_data, list):
-            logging.error("Loaded data is not a list. Aborting processing cycle.")
-            return False, 0, 0, 0
-
-        current_total_items = len(existing_data)
-        # Use (title, author) tuple for duplicate checking
-        existing_post_ids = set()
-        for item in existing_data:
-             if isinstance(item, dict):
-                 title = item.get('title', '').strip()
-                 author = item.get('author', '').strip()
-                 if title and author:
-                     existing_post_ids.add((title, author))
-                 else:
-                     logging.warning(f"Found item in existing data with missing title or author: {item}")
-             else:
-                 logging.warning(f"Found non-dictionary item in existing data: {item}")
-        logging.info(f"Initialized duplicate check set with {len(existing_post_ids)} existing post IDs.")
-
-        all_posts_from_apis = []
-        # Fetch data from all APIs concurrently using ThreadPoolExecutor
-        logging.info(f"Starting concurrent fetch for {len(COMMUNITIES_API_URLS)} URLs...")
-        results = []
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # map applies fetch_communities_data to each URL in the list concurrently
-            # it returns an iterator yielding results in the order the URLs were submitted
-            results = executor.map(fetch_communities_data, COMMUNITIES_API_URLS)
-
-        logging.info("Concurrent fetching complete. Processing results...")
-        # Process results from the concurrent fetches
-        for data in results: # data here is the return value of fetch_communities_data (dict, list or None)
-            if data: # Check if fetch was successful and returned data
-                posts_list = None
-                original_url = "Unknown" # Placeholder, map doesn't easily provide the originating URL alongside the result
-
-                # Determine the structure of the returned data (list or dict containing list)
-                if isinstance(data, list):
-                    posts_list = data
-                elif isinstance(data, dict):
-                    possible_keys = ['posts', 'data', 'items', 'results', 'threads', 'newPosts', 'hotPosts']
-                    found_key = None
-                    for key in possible_keys:
-                        potential_list = data.get(key)
-                        if isinstance(potential_list, list):
-                            posts_list = potential_list
-                            found_key = key
-                            break
-                    if posts_list is None and all(k in data for k in ['title', 'author', 'link']):
-                         posts_list = [data] # Treat root dict as single post
+    name = 'sqlite'
+    wants_rewrite = False
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            title_key TEXT,
+            author_key TEXT,
+            author_lc TEXT,
+            type TEXT,
+            community TEXT,
+            processed_at REAL,
+            data TEXT NOT NULL
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS items_dedup ON items (title_key, author_key)",
+        "CREATE INDEX IF NOT EXISTS items_author ON items (author_lc, id)",
+        "CREATE INDEX IF NOT EXISTS items_type ON items (type, id)",
+        "CREATE INDEX IF NOT EXISTS items_processed_at ON items (processed_at)",
+    )
 
-                    if posts_list is None:
-                         logging.warning(f"Could not find a list of posts under expected keys or as root dict in response. Keys found: {list(data.keys())}") # Removed URL as it's harder to track here
-                else:
-                    logging.warning(f"Received unexpected data type from fetch: {type(data)}") # Removed URL
-
-                # Process the found list of posts
-                if posts_list is not None:
-                    valid_posts_count = 0
-                    for post in posts_list:
-                        if isinstance(post, dict):
-                            if all(k in post for k in ['title', 'author', 'link']):
-                                all_posts_from_apis.append(post)
-                                valid_posts_count += 1
-                            else:
-                                logging.warning(f"Skipping post missing required keys (title, author, link): {post}") # Removed URL
-                        else:
-                            logging.warning(f"Skipping non-dictionary item found in list: {post}") # Removed URL
-                    # logging.info(f"Added {valid_posts_count} valid posts from one API result to process queue.") # Reduce verbosity
-            else:
-                 # Fetch returned None (likely due to error logged in fetch_communities_data)
-                 logging.warning("A fetch operation returned None (check logs above for details).")
+    def __init__(self, db_path, legacy_json_path=None):
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path
+        self._writer = None
+        self._readers = threading.local()
+        # Positions are only usable for /data lookups while row ids match archive positions
+        self._positions_match = False
+        self._last_id = 0 # Highest row id loaded, for tail()
 
+    def _connect(self, readonly=False):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = FULL") # Each committed batch is durable, like the fsync'd journal
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        return conn
 
-        logging.info(f"Total valid posts fetched across all APIs: {len(all_posts_from_apis)}. Processing...")
+    def _writer_conn(self):
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
 
-        items_to_add = []
-        for post in all_posts_from_apis:
-            processed_api_posts_count += 1
+    def _reader_conn(self):
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None:
+            conn = self._readers.conn = self._connect(readonly=True)
+        return conn
 
-            author = post.get('author', '').strip()
-            title = post.get('title', '').strip()
-            link = post.get('link', '')
+    @staticmethod
+    def _row(position, item):
+        key = _dedup_key(item) or (None, None)
+        timestamp = _parse_timestamp(item.get('processed_timestamp'))
+        return (position + 1, key[0], key[1],
+                (item.get('author') or '').strip().lower() or None,
+                _item_type(item),
+                (item.get('community') or '').lower() or None,
+                timestamp.timestamp() if timestamp else None,
+                json.dumps(item, ensure_ascii=False))
 
-            if not author or not title or not link or not isinstance(link, str):
-                logging.debug(f"Skipping post with missing info: Title='{title}', Author='{author}', Link Type='{type(link)}'")
-                continue
+    def _insert(self, conn, rows):
+        """Inserts rows in a single transaction. Rows already present (same id or dedup key) are skipped."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR IGNORE INTO items (id, title_key, author_key, author_lc, type, community, processed_at, data) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
 
-            # Extract extension safely
-            try:
-                _, extension = os.path.splitext(urlparse(link).path) # Parse path before splitext
-                extension = extension.lower()
-            except Exception as ext_err:
-                 logging.warning(f"Could not extract extension from link '{link}': {ext_err}. Skipping.")
-                 continue
-
-            # Uses global SUPPORTED_EXTENSIONS
-            if extension in SUPPORTED_EXTENSIONS:
-                post_id_tuple = (title, author)
-
-                if post_id_tuple in existing_post_ids:
-                    logging.debug(f"Skipping already processed/existing post: Title='{title}', Author='{author}'")
+    def load(self):
+        try:
+            conn = self._writer_conn()
+            count = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+            if count == 0 and self.legacy_json_path and (os.path.exists(self.legacy_json_path) or os.path.exists(_journal_path(self.legacy_json_path))):
+                logging.info(f"SQLite archive {self.db_path} is empty. Importing {self.legacy_json_path} first.")
+                self.import_items(load_data(self.legacy_json_path))
+            data = []
+            last_id = 0
+            contiguous = True
+            for row_id, raw in conn.execute("SELECT id, data FROM items ORDER BY id"):
+                try:
+                    item = json.loads(raw)
+                except json.JSONDecodeError as json_err:
+                    logging.error(f"Corrupt row {row_id} in {self.db_path}: {json_err}. Skipping it.")
+                    contiguous = False
                     continue
+                contiguous = contiguous and row_id == last_id + 1
+                last_id = row_id
+                data.append(item)
+            self._positions_match = contiguous
+            self._last_id = last_id
+            if not contiguous:
+                logging.warning(f"Row ids in {self.db_path} are not contiguous. /data filters will scan memory instead of using indexes.")
+            logging.info(f"Successfully loaded {len(data)} items from {self.db_path}")
+            return data
+        except Exception as e:
+            logging.error(f"Error loading data from {self.db_path}: {e}")
+            return []
 
-                logging.info(f"Found new post with supported file: Title='{title}', Author='{author}', Link='{link}'")
-                fileditch_link = upload_to_fileditch(link) # upload uses global upload URL
+    def position(self):
+        """Highest row id loaded or written, as a JSON-able token for seek()."""
+        return {"last_id": self._last_id}
 
-                if fileditch_link:
-                    new_entry = {
-                        "title": title,
-                        "author": author,
-                        "fileditch_link": fileditch_link,
-                        "original_link": link,
-                        "type": "video" if extension in SUPPORTED_VIDEO_EXTENSIONS else "image"
-                    }
-                    items_to_add.append(new_entry)
-                    existing_post_ids.add(post_id_tuple) # Add to set immediately
-                    new_items_added += 1
-                    logging.info(f"Prepared new entry for '{title}' by {author} (Type: {new_entry['type']}).")
-                else:
-                    logging.warning(f"Failed to upload file for post: Title='{title}', Author='{author}' (Link: {link})")
-            else:
-                logging.debug(f"Skipping post with unsupported extension ('{extension}'): Title='{title}', Author='{author}', Link: {link[:100]}...")
+    def seek(self, position):
+        """Makes tail() continue after a position() token. False if rows it covered are gone (reload instead)."""
+        last_id = position.get('last_id') if isinstance(position, dict) else None
+        if not isinstance(last_id, int):
+            return False
+        try:
+            max_id = self._reader_conn().execute("SELECT MAX(id) FROM items").fetchone()[0] or 0
+        except sqlite3.Error as e:
+            logging.error(f"Error reading {self.db_path}: {e}")
+            return False
+        if max_id < last_id:
+            return False
+        self._last_id = last_id
+        return True
 
-        logging.info(f"Checked {processed_api_posts_count} posts fetched from APIs in this cycle.")
+    def tail(self):
+        """Rows committed by another process since load()/tail()."""
+        entries = []
+        for row_id, raw in self._reader_conn().execute("SELECT id, data FROM items WHERE id > ? ORDER BY id", (self._last_id,)):
+            try:
+                entry = json.loads(raw)
+            except json.JSONDecodeError as json_err:
+                logging.error(f"Corrupt row {row_id} in {self.db_path}: {json_err}. Skipping it.")
+                self._positions_match = False
+                continue
+            if row_id != self._last_id + 1:
+                self._positions_match = False
+            self._last_id = row_id
+            entries.append(entry)
+        return entries
 
-        if new_items_added > 0:
-            existing_data.extend(items_to_add)
-            logging.info(f"Attempting to save {len(existing_data)} total items ({new_items_added} new) to {DATA_FILE_PATH}")
-            save_data(DATA_FILE_PATH, existing_data) # save uses global data path
-            current_total_items = len(existing_data)
-            success = True
-        else:
-            logging.info("No new supported media posts found or processed successfully. Data file not modified.")
-            success = True # Still successful cycle, just no new items
+    def import_items(self, items):
+        """
+        Writes items in one transaction, numbering them from archive position 0. Later duplicates of a
+        dedup key are dropped before numbering so row ids stay contiguous. Returns the number of rows inserted.
+        """
+        rows = []
+        seen_keys = set()
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            key = _dedup_key(item)
+            if key is not None:
+                if key in seen_keys:
+                    continue
+                seen_keys.add(key)
+            rows.append(self._row(len(rows), item))
+        conn = self._writer_conn()
+        before = conn.total_changes
+        self._insert(conn, rows)
+        return conn.total_changes - before
 
-    return success, new_items_added, current_total_items, processed_api_posts_count
+    def append(self, entries, first_position):
+        try:
+            conn = self._writer_conn()
+            before = conn.total_changes
+            self._insert(conn, [self._row(first_position + offset, item) for offset, item in enumerate(entries)])
+            inserted = conn.total_changes - before
+            self._last_id = max(self._last_id, first_position + len(entries))
+            if inserted != len(entries):
+                logging.warning(f"Only {inserted} of {len(entries)} entries were new in {self.db_path}.")
+                self._positions_match = False
+            logging.info(f"Committed {inserted} records to {self.db_path}")
+            return True
+        except Exception as e:
+            logging.error(f"Error writing to {self.db_path}: {e}")
+            self._positions_match = False
+            return False
 
-# Background Processing Thread (background_processor)
-# No changes needed, it calls _run_processing_cycle which uses global vars
-def background_processor():
-    """Target function for the background thread."""
-    logging.info("Background processing thread started.")
-    while True:
+    def rewrite(self, items):
+        """Inserts any entries missing after an earlier failed write."""
         try:
-            logging.info("Background thread waking up for processing cycle.")
-            # Need app context if background thread interacts with Flask extensions,
-            # but here it only calls _run_processing_cycle which doesn't directly.
-            # However, keeping it is harmless and good practice if dependencies change.
-            with app.app_context():
-                 success, added, total, checked = _run_processing_cycle()
-            if success:
-                 logging.info(f"Background processing cycle complete. Added: {added}, Total: {total}, Checked: {checked}")
-            else:
-                 logging.warning("Background processing cycle finished with errors (check logs above).")
+            inserted = self.import_items(items)
+            self._last_id = self._writer_conn().execute("SELECT MAX(id) FROM items").fetchone()[0] or 0
+            logging.info(f"Re-synced {self.db_path} with the in-memory archive ({inserted} missing rows written)")
+            return True
         except Exception as e:
-            # Log the full traceback for unexpected errors in the loop
-            logging.exception(f"!!! Unhandled exception in background_processor loop: {e} !!!")
+            logging.error(f"Error re-syncing {self.db_path}: {e}")
+            return False
 
-        logging.info(f"Background thread sleeping for {PROCESSING_INTERVAL_SECONDS} seconds.")
-        time.sleep(PROCESSING_INTERVAL_SECONDS)
+    def filter_positions(self, query, upto, start=0, limit=None):
+        """Up to limit archive positions in [start, upto) of rows matching query's filters, oldest first, using the indexes."""
+        if not self._positions_match:
+            return None
+        clauses = ["id > ?", "id <= ?"] # id = position + 1
+        params = [start, upto]
+        if query.type:
+            clauses.append("type = ?")
+            params.append(query.type)
+        if query.author:
+            clauses.append("author_lc = ?")
+            params.append(query.author)
+        if query.community:
+            clauses.append("community = ?")
+            params.append(query.community)
+        if query.since:
+            clauses.append("processed_at >= ?")
+            params.append(query.since.timestamp())
+        if query.until:
+            clauses.append("processed_at <= ?")
+            params.append(query.until.timestamp())
+        try:
+            sql = f"SELECT id FROM items WHERE {' AND '.join(clauses)} ORDER BY id"
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit)
+            rows = self._reader_conn().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Error querying {self.db_path}: {e}. Falling back to an in-memory scan.")
+            return None
+        return [row_id - 1 for (row_id,) in rows]
 
 
-# Flask Routes (index, process_posts_request, get_data)
-# These use DATA_FILE_PATH and call _run_processing_cycle, which use global vars
-@app.route('/', methods=['GET'])
-def index():
-    """Renders the HTML table page with data from the JSON file."""
-    logging.info("Request received for index page ('/')")
-    backup_data = []
-    try:
-        with data_lock:
-             # Uses global DATA_FILE_PATH
-             loaded_data = load_data(DATA_FILE_PATH)
-        if isinstance(loaded_data, list):
-            backup_data = loaded_data
+def migrate_to_sqlite(json_path, db_path):
+    """Copies the JSON archive (snapshot plus journal) into a new SQLite database. Returns a process exit code."""
+    storage = SqliteStorage(db_path)
+    with data_lock:
+        try:
+            existing = storage._writer_conn().execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        except sqlite3.Error as e:
+            logging.error(f"Could not open SQLite database {db_path}: {e}")
+            return 1
+        if existing:
+            logging.error(f"SQLite database {db_path} already holds {existing} items. Refusing to migrate into it.")
+            return 1
+        items = [item for item in load_data(json_path) if isinstance(item, dict)]
+        started = time.monotonic()
+        inserted = storage.import_items(items)
+    logging.info(f"Migrated {inserted} of {len(items)} items from {json_path} to {db_path} in {time.monotonic() - started:.2f}s. "
+                 f"Set APP_STORAGE_BACKEND=sqlite to use it.")
+    if inserted != len(items):
+        logging.warning(f"{len(items) - inserted} items were duplicates of earlier entries and were not copied.")
+    return 0
+
+def _build_storage():
+    """Returns the storage backend selected by APP_STORAGE_BACKEND."""
+    if STORAGE_BACKEND == 'sqlite':
+        return SqliteStorage(SQLITE_PATH, legacy_json_path=DATA_FILE_PATH)
+    if STORAGE_BACKEND != 'json':
+        logging.warning(f"Unknown APP_STORAGE_BACKEND '{STORAGE_BACKEND}'. Using the JSON backend.")
+    return JsonJournalStorage(DATA_FILE_PATH)
+
+
+# Cross-process Coordination (_FileLock, archive version stamp)
+class _FileLock:
+    """
+    Advisory lock on a file, shared by every process using the same data directory: flock() on
+    POSIX, msvcrt.locking() on Windows (which has no shared locks, so shared=True is exclusive
+    there). The OS drops the lock if the process dies. Not reentrant; callers serialize threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def _open(self):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    def acquire(self, shared=False, blocking=True):
+        """Returns True once the lock is held, or False if blocking=False and another process holds it."""
+        fd = self._open()
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return False
+            return True
+        while True:
+            os.lseek(fd, 0, os.SEEK_SET)
+            try:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.05)
+
+    def release(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
         else:
-            logging.error("Loaded data in index route was not a list! Forcing empty list.")
-            backup_data = [] # Ensure backup_data is always a list for render_template
-    except Exception as e:
-        logging.exception(f"Unexpected error acquiring lock or loading data in index route: {e}")
-        backup_data = [] # Ensure backup_data is always a list for render_template
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
 
-    item_count = len(backup_data)
-    # Pass data in reverse chronological order (newest first)
-    return render_template('index.html', items=reversed(backup_data), item_count=item_count)
+    @contextlib.contextmanager
+    def held(self, shared=False):
+        self.acquire(shared)
+        try:
+            yield
+        finally:
+            self.release()
 
-@app.route('/process', methods=['POST'])
-def process_posts_request():
-    """Manual trigger endpoint. Runs the processing cycle and returns status."""
-    logging.info("Manual processing request received via /process endpoint...")
+def _archive_stamp_signature():
+    """Cheap change check for the version stamp file: (inode, mtime, size), or None if there is none yet."""
     try:
-        # Need app context if _run_processing_cycle interacts with Flask extensions
-        with app.app_context():
-            success, new_items, total_items, posts_checked = _run_processing_cycle()
-        if success:
-            return jsonify({
-                "message": "Processing complete.",
-                "new_items_added": new_items,
-                "total_items_in_file": total_items,
-                "posts_checked_this_cycle": posts_checked
-            }), 200
-        else:
-            # Even if the cycle had internal errors (e.g., failed fetch),
-            # the request itself might succeed, but report the outcome.
-            # Return 500 only if the request handler itself fails catastrophically.
-             return jsonify({
-                 "message": "Processing cycle finished, potentially with errors (check server logs).",
-                 "new_items_added": new_items,
-                 "total_items_in_file": total_items,
-                 "posts_checked_this_cycle": posts_checked
-             }), 200 # Or maybe 500 if 'success=False' implies a server-side failure state
-    except Exception as e:
-        logging.exception(f"Error during manual /process request: {e}")
-        return jsonify({"message": "An unexpected error occurred during processing."}), 500
+        st = os.stat(ARCHIVE_STAMP_PATH)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
 
-@app.route('/data', methods=['GET'])
-def get_data():
-    """Returns the current data as raw JSON."""
-    logging.info("Request received for /data endpoint")
-    with data_lock:
-        # Uses global DATA_FILE_PATH
-        current_data = load_data(DATA_FILE_PATH)
-    if not isinstance(current_data, list):
-        logging.error("Data loaded for /data endpoint was not a list.")
-        return jsonify({"error": "Failed to load data correctly", "data": []}), 500
-    return jsonify(current_data)
+def _read_archive_stamp():
+    """
+    Returns the version stamp the last archive writer left: {"version", "generation", "items"}.
+    version changes on every write and generation on every rewrite (compaction).
+    """
+    try:
+        with open(ARCHIVE_STAMP_PATH, 'r', encoding='utf-8') as f:
+            stamp = json.load(f)
+        if isinstance(stamp, dict):
+            return stamp
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logging.error(f"Error reading archive version stamp {ARCHIVE_STAMP_PATH}: {e}")
+    return {"version": 0, "generation": 0, "items": None}
 
-# Main Execution
-if __name__ == '__main__':
-    # Ensure backup directory exists (uses DATA_FILE_PATH from env)
-    backup_dir = os.path.dirname(DATA_FILE_PATH)
+def _write_archive_stamp(stamp):
     try:
-        os.makedirs(backup_dir, exist_ok=True)
-        logging.info(f"Ensured backup directory exists: {backup_dir}")
+        temp_filepath = ARCHIVE_STAMP_PATH + ".tmp"
+        with open(temp_filepath, 'w', encoding='utf-8') as f:
+            json.dump(stamp, f)
+        os.replace(temp_filepath, ARCHIVE_STAMP_PATH)
     except Exception as e:
-        logging.error(f"Could not create backup directory {backup_dir}: {e}. File operations might fail.")
+        logging.error(f"Error writing archive version stamp {ARCHIVE_STAMP_PATH}: {e}")
 
-    template_dir = app.template_folder 
-    static_dir = app.static_folder   
 
-    if not os.path.exists(template_dir):
-        try:
-            os.makedirs(template_dir)
-            logging.info(f"Created missing 'templates' directory at {template_dir}. Ensure index.html is present.")
+# Archive Dedup Index File (DedupKeySet, archive.idx)
+# The sorted dedup hashes of the whole archive plus the storage position they cover, rewritten after full loads and
+# compactions. At startup the file is memory-mapped and only entries committed after it are read, so ingestion can
+# begin before the archive itself is loaded. Layout: magic, header length (uint32 LE), JSON header padded with
+# spaces to a multiple of 8 bytes, then the hashes as sorted native-endian uint64s.
+DEFAULT_ARCHIVE_INDEX_PATH = os.path.join(os.path.dirname(DATA_FILE_PATH), 'archive.idx')
+ARCHIVE_INDEX_PATH = os.path.abspath(os.environ.get('APP_ARCHIVE_INDEX_PATH', DEFAULT_ARCHIVE_INDEX_PATH))
+_ARCHIVE_INDEX_MAGIC = b'IP2DIDX1'
+_ARCHIVE_INDEX_FORMAT = 1
+
+class DedupKeySet:
+    """
+    Set of dedup hashes made of a sorted, read-only base sequence (the mapped index file) and an
+    ordinary set of hashes added since. Supports the set operations ArchiveStore's callers use.
+    """
+
+    __slots__ = ('_base', '_added')
+
+    def __init__(self, base=(), added=None):
+        self._base = base
+        self._added = added if added is not None else set()
+
+    def _in_base(self, value):
+        base = self._base
+        if not base:
+            return False
+        position = bisect.bisect_left(base, value)
+        return position < len(base) and base[position] == value
+
+    def __contains__(self, value):
+        return value in self._added or self._in_base(value)
+
+    def add(self, value):
+        if not self._in_base(value):
+            self._added.add(value)
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def __len__(self):
+        return len(self._base) + len(self._added)
+
+    def __iter__(self):
+        yield from self._base
+        yield from self._added
+
+    def copy(self):
+        """Shares the immutable base; only the added hashes are copied."""
+        return DedupKeySet(self._base, set(self._added))
+
+def _write_dedup_index(keys, header):
+    """Writes the index file atomically: header (a dict) plus the sorted keys. Returns True on success."""
+    temp_filepath = f"{ARCHIVE_INDEX_PATH}.{os.getpid()}.tmp"
+    try:
+        values = array('Q', sorted(keys))
+        header = dict(header, format=_ARCHIVE_INDEX_FORMAT, byteorder=sys.byteorder, keys=len(values))
+        encoded = json.dumps(header).encode('utf-8')
+        encoded += b' ' * (-(len(_ARCHIVE_INDEX_MAGIC) + 4 + len(encoded)) % 8)
+        with open(temp_filepath, 'wb') as f:
+            f.write(_ARCHIVE_INDEX_MAGIC + struct.pack('<I', len(encoded)) + encoded)
+            values.tofile(f)
+        os.replace(temp_filepath, ARCHIVE_INDEX_PATH)
+        return True
+    except Exception as e:
+        logging.error(f"Error writing archive index {ARCHIVE_INDEX_PATH}: {e}")
+        with contextlib.suppress(OSError):
+            os.remove(temp_filepath)
+        return False
+
+def _open_dedup_index():
+    """Maps the index file. Returns (header, sorted hashes), or None if it is missing or unusable."""
+    prefix_length = len(_ARCHIVE_INDEX_MAGIC) + 4
+    try:
+        with open(ARCHIVE_INDEX_PATH, 'rb') as f:
+            prefix = f.read(prefix_length)
+            if len(prefix) != prefix_length or not prefix.startswith(_ARCHIVE_INDEX_MAGIC):
+                logging.warning(f"Ignoring archive index {ARCHIVE_INDEX_PATH}: not an index file.")
+                return None
+            header_length, = struct.unpack('<I', prefix[len(_ARCHIVE_INDEX_MAGIC):])
+            header = json.loads(f.read(header_length))
+            start = prefix_length + header_length
+            keys = header.get('keys') if isinstance(header, dict) else None
+            if (not isinstance(keys, int) or header.get('format') != _ARCHIVE_INDEX_FORMAT or header.get('byteorder') != sys.byteorder
+                    or start % 8 or os.fstat(f.fileno()).st_size != start + keys * 8):
+                logging.warning(f"Ignoring archive index {ARCHIVE_INDEX_PATH}: unsupported format or truncated.")
+                return None
+            if not keys:
+                return header, ()
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return header, memoryview(mapped)[start:].cast('Q')
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring archive index {ARCHIVE_INDEX_PATH}: {e}")
+        return None
+
+
+# In-memory Archive Store (ArchiveItem, ArchiveStore)
+class ArchiveItem:
+    """
+    Compact in-memory archive entry: one slot per known field instead of a dict, with authors,
+    types and communities interned since they repeat across the archive. Keys outside FIELDS,
+    and fields holding anything but a string, are kept unchanged in `extra`. get() mirrors
+    dict.get(); use to_dict() wherever an entry leaves the process (JSON, templates, storage).
+    """
+
+    FIELDS = ('title', 'author', 'fileditch_link', 'original_link', 'type', 'processed_timestamp', 'community')
+    _FIELD_SET = frozenset(FIELDS)
+    _INTERNED = ('author', 'type', 'community')
+    __slots__ = FIELDS + ('extra',)
+
+    def __init__(self, entry):
+        if entry.keys() <= self._FIELD_SET and all(value.__class__ is str for value in entry.values()):
+            # Fast path for entries written by this app: every field a string, nothing else
+            get = entry.get
+            self.title = get('title')
+            self.fileditch_link = get('fileditch_link')
+            self.original_link = get('original_link')
+            self.processed_timestamp = get('processed_timestamp')
+            author, item_type, community = get('author'), get('type'), get('community')
+            self.author = sys.intern(author) if author is not None else None
+            self.type = sys.intern(item_type) if item_type is not None else None
+            self.community = sys.intern(community) if community is not None else None
+            self.extra = None
+            return
+        for field in self.FIELDS:
+            value = entry.get(field)
+            if value.__class__ is not str:
+                value = None
+            elif field in self._INTERNED:
+                value = sys.intern(value)
+            setattr(self, field, value)
+        extra = {key: value for key, value in entry.items() if key not in self._FIELD_SET or value.__class__ is not str}
+        self.extra = extra or None
+
+    def get(self, key, default=None):
+        if key in self._FIELD_SET:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        return default
+
+    def to_dict(self):
+        entry = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                entry[field] = value
+        if self.extra:
+            entry.update(self.extra)
+        return entry
+
+    def __repr__(self):
+        return f"ArchiveItem({self.to_dict()!r})"
+
+class ArchiveStore:
+    """
+    Process-wide copy of the archive as ArchiveItems, loaded from the storage backend once at
+    startup. Readers get an immutable tuple snapshot without taking data_lock; writers must
+    hold data_lock while calling add_items(), which updates memory and persists.
+    Across processes, writes hold the archive file lock exclusively and bump the version stamp;
+    read_only processes (web workers) call refresh() to pick up what the writer committed.
+    With a current dedup index file, load() only reads the index and entries committed after it;
+    the entries themselves are read on first use of snapshot() / add_items(), or by preload().
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._items = ()
+        self._keys = DedupKeySet() # _dedup_hash() of each entry's (title, author) key
+        self._count = 0 # len() while the entries are deferred
+        self._index_tail = 0 # Entries committed after the index file that load() started from
+        self._load_lock = threading.Lock()
+        self.version = 0
+        # Published as one tuple so readers always see a matching version and item tuple
+        self._versioned = (0, ())
+        self._needs_rewrite = False
+        self.read_only = False
+        self._file_lock = _FileLock(ARCHIVE_LOCK_PATH)
+        self._stamp = None
+        self._stamp_signature = None
+
+    def load(self):
+        """(Re)loads the archive from storage, deferring the entries if the index file allows. Assumes lock is held."""
+        with self._file_lock.held(shared=True):
+            if not self.read_only and self._load_index():
+                return
+            self._load()
+        if self.read_only:
+            return
+        with self._file_lock.held():
+            if self.storage.wants_rewrite:
+                self._rewrite()
+                self._publish_stamp(rewritten=True)
+            if not self._needs_rewrite:
+                self._write_index()
+
+    def _load_index(self):
+        """
+        Starts from the index file instead of the entries: checks it still matches the storage and
+        version stamp, then adds the hashes of entries committed after it was written. Returns False
+        if there is no usable index. Assumes both locks are held.
+        """
+        started = time.perf_counter()
+        opened = _open_dedup_index()
+        if opened is None:
+            return False
+        header, hashes = opened
+        signature = _archive_stamp_signature()
+        stamp = _read_archive_stamp()
+        if (header.get('backend') != self.storage.name or header.get('generation') != stamp.get('generation')
+                or not isinstance(header.get('items'), int) or not self.storage.seek(header.get('position'))):
+            logging.info(f"Archive index {ARCHIVE_INDEX_PATH} does not match the archive. Loading the archive in full.")
+            return False
+        entries = self.storage.tail()
+        if entries is None:
+            return False
+        keys = DedupKeySet(hashes)
+        count = header['items']
+        for entry in entries:
+            if isinstance(entry, dict):
+                count += 1
+                key = _dedup_key(entry)
+                if key is not None:
+                    keys.add(_dedup_hash(key))
+        STORAGE_SECONDS.observe(time.perf_counter() - started, self.storage.name, 'load_index')
+        self._stamp, self._stamp_signature = stamp, signature
+        self._keys = keys
+        self._count = count
+        self._index_tail = len(entries)
+        self._items = ()
+        self.version += 1
+        self._versioned = None # Deferred; see _ensure_items()
+        logging.info(f"Archive store opened {ARCHIVE_INDEX_PATH}: {count} items ({len(keys)} unique post IDs), "
+                     f"{len(entries)} committed since it was written. Entries are loaded on first use.")
+        return True
+
+    def _load(self, known_keys=None, publish=True):
+        """
+        Loads storage and the version stamp that goes with it. Assumes both locks are held.
+        known_keys are the hashes load() took from the index file; they are kept instead of
+        hashing every entry again, unless storage turns out to hold a different number of entries.
+        With publish=False the caller publishes _versioned itself once its follow-up writes are done.
+        """
+        self._stamp_signature = _archive_stamp_signature()
+        self._stamp = _read_archive_stamp()
+        started = time.perf_counter()
+        data = self.storage.load()
+        STORAGE_SECONDS.observe(time.perf_counter() - started, self.storage.name, 'load')
+        items, keys = self._convert(data, DedupKeySet() if known_keys is None else None)
+        if keys is None:
+            keys = known_keys
+            if len(items) != self._count:
+                logging.warning(f"Archive holds {len(items)} entries, not the {self._count} the index file accounts for. Rebuilding the dedup set.")
+                keys = DedupKeySet()
+                for item in items:
+                    key = _dedup_key(item)
+                    if key is not None:
+                        keys.add(_dedup_hash(key))
+        self._items = tuple(items)
+        self._keys = keys
+        self.version += 1
+        if publish:
+            self._versioned = (self.version, self._items)
+        logging.info(f"Archive store loaded {len(self._items)} items ({len(self._keys)} unique post IDs) from the {self.storage.name} backend.")
+
+    @staticmethod
+    def _convert(data, keys):
+        """
+        Turns decoded entries into ArchiveItems, adding their dedup hashes to keys (skipped if keys
+        is None). Returns (items, keys).
+        """
+        items = []
+        for position, item in enumerate(data):
+            data[position] = None # Release each decoded dict as soon as it is converted
+            if not isinstance(item, dict):
+                logging.warning(f"Found non-dictionary item in existing data: {item}")
+                continue
+            key = _dedup_key(item)
+            if key is None:
+                logging.warning(f"Found item in existing data with missing title or author: {item}")
+            elif keys is not None:
+                keys.add(_dedup_hash(key))
+            items.append(ArchiveItem(item))
+        return items, keys
+
+    def _ensure_items(self):
+        """
+        Reads the entries load() deferred, at most once. Callable from any thread: the
+        ingestion thread (holding data_lock) waits here on a background preload(). Until
+        _versioned is published at the end, every writer is held at _load_lock, so the
+        compaction and index write below stand in for data_lock.
+        """
+        if self._versioned is not None:
+            return
+        with self._load_lock:
+            if self._versioned is not None:
+                return
+            started = time.perf_counter()
+            with self._file_lock.held(shared=True):
+                self._load(known_keys=self._keys, publish=False)
+            if not self.read_only and (self.storage.wants_rewrite or self._index_tail):
+                with self._file_lock.held():
+                    if self.storage.wants_rewrite:
+                        self._rewrite()
+                        self._publish_stamp(rewritten=True)
+                    if not self._needs_rewrite:
+                        self._write_index()
+            self._versioned = (self.version, self._items)
+            logging.info(f"Deferred archive entries loaded in {time.perf_counter() - started:.2f}s.")
+            startup_timer.milestone('archive entries loaded')
+
+    def preload(self):
+        """Reads deferred entries on a background thread, so the first page view doesn't wait for them."""
+        if self._versioned is None:
+            threading.Thread(target=self._ensure_items, name="ArchiveLoader", daemon=True).start()
+
+    def _write_index(self):
+        """Saves the dedup hashes and the storage position they cover for the next start. Assumes the file lock is held."""
+        started = time.perf_counter()
+        header = {"backend": self.storage.name, "position": self.storage.position(),
+                  "generation": (self._stamp or {}).get('generation', 0), "items": len(self._items)}
+        if _write_dedup_index(self._keys, header):
+            self._index_tail = 0
+            logging.info(f"Wrote archive index {ARCHIVE_INDEX_PATH} ({len(self._keys)} post IDs) in {time.perf_counter() - started:.2f}s.")
+
+    def refresh(self):
+        """
+        Picks up entries another process committed, if the version stamp moved: tails the storage
+        after plain appends and reloads after a rewrite. Returns the number of new entries.
+        Assumes lock is held.
+        """
+        if _archive_stamp_signature() == self._stamp_signature:
+            return 0
+        before = len(self._items)
+        with self._file_lock.held(shared=True):
+            signature = _archive_stamp_signature()
+            stamp = _read_archive_stamp()
+            entries = None
+            if self._stamp is not None and stamp.get('generation') == self._stamp.get('generation'):
+                started = time.perf_counter()
+                entries = self.storage.tail()
+                STORAGE_SECONDS.observe(time.perf_counter() - started, self.storage.name, 'tail')
+            if entries is None:
+                self._load()
+            else:
+                if entries:
+                    items, keys = self._convert(entries, self._keys.copy())
+                    self._items = self._items + tuple(items)
+                    self._keys = keys
+                    self.version += 1
+                    self._versioned = (self.version, self._items)
+                self._stamp, self._stamp_signature = stamp, signature
+        return max(0, len(self._items) - before)
+
+    def _publish_stamp(self, rewritten=False):
+        """Records a write in the version stamp so other processes notice it. Assumes the file lock is held."""
+        stamp = self._stamp or {"version": 0, "generation": 0}
+        self._stamp = {"version": stamp['version'] + 1, "generation": stamp['generation'] + (1 if rewritten else 0),
+                       "items": len(self._items)}
+        _write_archive_stamp(self._stamp)
+        self._stamp_signature = _archive_stamp_signature()
+
+    def snapshot(self):
+        """Returns the current ArchiveItems as an immutable tuple, oldest first. Entries must not be mutated."""
+        return self.versioned_snapshot()[1]
+
+    def versioned_snapshot(self):
+        """Returns (version, items) for the same point in time; version changes whenever the items do."""
+        self._ensure_items()
+        return self._versioned
+
+    def content_tag(self, items):
+        """
+        Names the archive content a snapshot holds in a way every process sharing the data directory
+        agrees on (used in ETags): the stamp's rewrite generation plus the entry count, since entries
+        are only ever appended between rewrites.
+        """
+        return f"{(self._stamp or {}).get('generation', 0)}-{len(items)}"
+
+    def __len__(self):
+        versioned = self._versioned
+        return len(versioned[1]) if versioned is not None else self._count
+
+    def __contains__(self, key):
+        """True if the (title, author) key is archived."""
+        return key is not None and _dedup_hash(key) in self._keys
+
+    def existing_keys(self):
+        """Returns a copy of the current set of dedup hashes (see _dedup_hash()) as a DedupKeySet."""
+        return self._keys.copy()
+
+    def add_items(self, new_items):
+        """
+        Appends entry dicts not already present, then persists them as one batch. Assumes lock is held.
+        Returns the list of entries actually added.
+        """
+        self._ensure_items()
+        added = []
+        keys = self._keys.copy()
+        for item in new_items:
+            key = _dedup_key(item)
+            if key is None or _dedup_hash(key) in keys:
+                logging.debug(f"Not adding duplicate or incomplete entry: {item}")
+                continue
+            keys.add(_dedup_hash(key))
+            added.append(item)
+        if not added:
+            return added
+        if self.read_only:
+            logging.error(f"Not adding {len(added)} entries: this process follows the archive read-only.")
+            return []
+        first_position = len(self._items)
+        items = self._items + tuple(ArchiveItem(item) for item in added)
+        with self._file_lock.held():
+            if self._needs_rewrite or not self._timed('append', self.storage.append, added, first_position):
+                # A failed write leaves memory ahead of disk; the next write brings storage back in line
+                self._needs_rewrite = True
+            self._keys = keys
+            self._items = items
+            self.version += 1
+            self._versioned = (self.version, items)
+            rewritten = self._needs_rewrite or self.storage.wants_rewrite
+            if rewritten:
+                self._rewrite()
+            self._publish_stamp(rewritten)
+            if rewritten and not self._needs_rewrite:
+                self._write_index()
+        return added
+
+    def _rewrite(self):
+        """Compacts the journal, or re-syncs storage after a failed write. Assumes both locks are held."""
+        self._needs_rewrite = not self._timed('rewrite', self.storage.rewrite, [item.to_dict() for item in self._items])
+
+    def _timed(self, operation, func, *args):
+        """Runs a storage write, recording its duration and counting a failure as a storage error."""
+        started = time.perf_counter()
+        ok = func(*args)
+        STORAGE_SECONDS.observe(time.perf_counter() - started, self.storage.name, operation)
+        if not ok:
+            ERRORS.inc('storage')
+        return ok
+
+
+archive_store = ArchiveStore(_build_storage())
+
+
+# Media Dedup Index (MediaIndex)
+DEFAULT_MEDIA_INDEX_PATH = os.path.join(os.path.dirname(DATA_FILE_PATH), 'media_index.json')
+MEDIA_INDEX_PATH = os.path.abspath(os.environ.get('APP_MEDIA_INDEX_PATH', DEFAULT_MEDIA_INDEX_PATH))
+
+def normalize_media_url(url):
+    """Canonical form of a media URL for dedup: lowercase scheme/host, no default port or fragment, sorted query."""
+    try:
+        parsed = urlparse(url.strip())
+        scheme = parsed.scheme.lower()
+        host = (parsed.hostname or '').lower()
+        port = parsed.port
+        netloc = host if port is None or (scheme, port) in (('http', 80), ('https', 443)) else f"{host}:{port}"
+        query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+        return urlunparse((scheme, netloc, parsed.path or '/', '', query, ''))
+    except Exception:
+        return url.strip()
+
+def _content_key(digest, size):
+    return f"sha256:{digest}:{size}"
+
+class MediaIndex:
+    """
+    Maps media already on FileDitch to its fileditch_link, by normalized original URL and by
+    content hash plus size, so reposted or cross-posted media is never uploaded twice.
+    Persisted like the JSON archive: a snapshot file plus a journal of mappings recorded since,
+    folded into a new snapshot every JOURNAL_COMPACT_THRESHOLD records. Seeded from the archive's
+    original links when the snapshot is missing. Thread-safe.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock() # Serializes file writes; _lock only guards memory
+        self._urls = {}
+        self._hashes = {}
+        self._pending = [] # Journal records not yet saved
+        self._journal_records = 0
+        self._needs_compact = False
+        self.url_hits = 0
+        self.hash_hits = 0
+
+    def load(self, archive_snapshot=tuple):
+        """
+        Loads the snapshot and replays the journal. archive_snapshot() supplies the archive items to
+        rebuild URL entries from if the snapshot is missing or unreadable.
+        """
+        rebuild = False
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with self._lock:
+                self._urls.update(data.get('urls', {}))
+                self._hashes.update(data.get('hashes', {}))
+        except FileNotFoundError:
+            logging.info(f"Media index {self.filepath} not found. Building it from the archive.")
+            rebuild = True
+        except Exception as e:
+            logging.error(f"Error loading media index from {self.filepath}: {e}. Rebuilding URL entries from the archive.")
+            rebuild = True
+        replayed, clean = self._replay_journal()
+        archive_items = archive_snapshot() if rebuild else ()
+        with self._lock:
+            for item in archive_items:
+                original_link = item.original_link
+                fileditch_link = item.fileditch_link
+                if original_link and fileditch_link:
+                    self._urls.setdefault(normalize_media_url(original_link), fileditch_link)
+            self._journal_records = replayed
+            # A rebuilt index is written now so the next start doesn't rebuild it; a torn journal is rewritten
+            self._needs_compact = rebuild or not clean
+            logging.info(f"Media index has {len(self._urls)} URLs and {len(self._hashes)} content hashes ({replayed} replayed from the journal).")
+        if self._needs_compact:
+            self.save()
+
+    def _replay_journal(self):
+        """Applies the journal's records. Returns (records applied, False if it ended in a torn or corrupt record)."""
+        journal_path = _journal_path(self.filepath)
+        replayed = 0
+        try:
+            with open(journal_path, 'rb') as f, self._lock:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        logging.warning(f"Dropping incomplete trailing record in journal {journal_path}")
+                        return replayed, False
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError) as json_err:
+                        logging.error(f"Corrupt record in journal {journal_path}: {json_err}. Ignoring the rest of the journal.")
+                        return replayed, False
+                    if isinstance(record, dict) and 'url' in record:
+                        self._urls[record['url']] = record.get('link')
+                    elif isinstance(record, dict) and 'hash' in record:
+                        self._hashes.setdefault(record['hash'], record.get('link'))
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error(f"Error replaying journal {journal_path}: {e}")
+            return replayed, False
+        return replayed, True
+
+    def lookup_url(self, url):
+        with self._lock:
+            link = self._urls.get(normalize_media_url(url))
+            if link:
+                self.url_hits += 1
+            return link
+
+    def lookup_content(self, digest, size):
+        with self._lock:
+            link = self._hashes.get(_content_key(digest, size))
+            if link:
+                self.hash_hits += 1
+            return link
+
+    def record(self, url, fileditch_link, digest=None, size=None):
+        with self._lock:
+            url_key = normalize_media_url(url)
+            if self._urls.get(url_key) != fileditch_link:
+                self._urls[url_key] = fileditch_link
+                self._pending.append({"url": url_key, "link": fileditch_link})
+            if digest is not None:
+                content_key = _content_key(digest, size)
+                if content_key not in self._hashes:
+                    self._hashes[content_key] = fileditch_link
+                    self._pending.append({"hash": content_key, "link": fileditch_link})
+
+    def stats(self):
+        with self._lock:
+            return {"urls": len(self._urls), "content_hashes": len(self._hashes), "url_hits": self.url_hits, "hash_hits": self.hash_hits}
+
+    def save(self):
+        """
+        Persists mappings recorded since the last save: appended to the journal as one batch, or
+        written out as a new snapshot once the journal reaches JOURNAL_COMPACT_THRESHOLD records.
+        """
+        with self._save_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                compact = self._needs_compact or self._journal_records + len(pending) >= JOURNAL_COMPACT_THRESHOLD
+                if not pending and not compact:
+                    return
+                data = {"urls": dict(self._urls), "hashes": dict(self._hashes)} if compact else None
+            ok = self._write_snapshot(data) if compact else append_data(self.filepath, pending)
+            with self._lock:
+                if ok:
+                    self._journal_records = 0 if compact else self._journal_records + len(pending)
+                    self._needs_compact = False
+                else:
+                    # Memory is ahead of disk; the next save writes a full snapshot
+                    self._needs_compact = True
+
+    def _write_snapshot(self, data):
+        """Writes all mappings atomically, then clears the journal. Returns True on success."""
+        try:
+            temp_filepath = self.filepath + ".tmp"
+            with open(temp_filepath, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_filepath, self.filepath)
+            with open(_journal_path(self.filepath), 'w', encoding='utf-8') as f:
+                f.flush()
+                os.fsync(f.fileno())
+            logging.info(f"Compacted media index {self.filepath} ({len(data['urls'])} URLs, {len(data['hashes'])} content hashes)")
+            return True
+        except Exception as e:
+            logging.error(f"Error saving media index to {self.filepath}: {e}")
+            return False
+
+
+media_index = MediaIndex(MEDIA_INDEX_PATH)
+
+
+class _HashingReader:
+    """
+    File-like wrapper that hashes bytes as the upload reads them: an optional in-memory prefix, then the raw stream.
+    If given, throttle(n) is called after each read of n bytes and may block to hold a byte rate.
+    """
+
+    def __init__(self, prefix, raw, hasher, throttle=None):
+        self._prefix = io.BytesIO(prefix)
+        self._raw = raw
+        self._hasher = hasher
+        self._throttle = throttle
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self._prefix.read(size)
+        if size is None or size < 0:
+            chunk += self._raw.read()
+        elif len(chunk) < size:
+            chunk += self._raw.read(size - len(chunk)) or b''
+        self._hasher.update(chunk)
+        self.size += len(chunk)
+        if self._throttle and chunk:
+            self._throttle(len(chunk))
+        return chunk
+
+
+# Transfer Scheduler (TokenBucket, TransferScheduler)
+class TokenBucket:
+    """
+    Byte-rate limiter. reserve() books bytes right away (the balance may go negative) and returns
+    how long the caller must wait before sending them, so threads and event-loop tasks can share it.
+    """
+
+    def __init__(self, rate, burst_seconds):
+        self.rate = rate
+        self.capacity = max(rate * burst_seconds, STREAM_CHUNK_SIZE)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+class TransferScheduler:
+    """
+    Applies the byte-rate caps to media transfers and measures their throughput. Uploads draw on
+    one global bucket; downloads draw on a bucket per source host. Piped transfers draw on both.
+    """
+
+    def __init__(self, max_rate, host_max_rate, burst_seconds):
+        self.max_rate = max_rate
+        self.host_max_rate = host_max_rate
+        self.burst_seconds = burst_seconds
+        self._upload_bucket = TokenBucket(max_rate, burst_seconds) if max_rate > 0 else None
+        self._host_buckets = {}
+        self._lock = threading.Lock()
+        self._bytes = {'upload': 0, 'download': 0}
+        self._recent = deque() # (second, uploaded bytes), oldest first
+
+    def _host_bucket(self, url):
+        host = (urlparse(url).hostname or '').lower()
+        with self._lock:
+            bucket = self._host_buckets.get(host)
+            if bucket is None:
+                bucket = self._host_buckets[host] = TokenBucket(self.host_max_rate, self.burst_seconds)
+            return bucket
+
+    def reserve(self, amount, source_url=None, upload=False):
+        """
+        Books amount bytes downloaded from source_url and/or uploaded to FileDitch.
+        Returns the seconds to wait before moving them (0 when under the caps).
+        """
+        delay = 0.0
+        if source_url is not None and self.host_max_rate > 0:
+            delay = self._host_bucket(source_url).reserve(amount)
+        if upload and self._upload_bucket is not None:
+            delay = max(delay, self._upload_bucket.reserve(amount))
+        second = int(time.monotonic())
+        with self._lock:
+            if source_url is not None:
+                self._bytes['download'] += amount
+            if upload:
+                self._bytes['upload'] += amount
+                if self._recent and self._recent[-1][0] == second:
+                    self._recent[-1][1] += amount
+                else:
+                    self._recent.append([second, amount])
+                while self._recent[0][0] <= second - TRANSFER_RATE_WINDOW_SECONDS:
+                    self._recent.popleft()
+        if delay:
+            TRANSFER_THROTTLED_SECONDS.inc('upload' if upload else 'download', amount=delay)
+        return delay
+
+    def throttle(self, amount, source_url=None, upload=False):
+        """Blocking counterpart of reserve(): sleeps until the bytes fit the caps."""
+        delay = self.reserve(amount, source_url, upload)
+        if delay:
+            time.sleep(delay)
+
+    def uploaded_bytes(self):
+        with self._lock:
+            return self._bytes['upload']
+
+    def upload_rate(self):
+        """Upload throughput in bytes per second over the last TRANSFER_RATE_WINDOW_SECONDS."""
+        cutoff = int(time.monotonic()) - TRANSFER_RATE_WINDOW_SECONDS
+        with self._lock:
+            return sum(amount for second, amount in self._recent if second > cutoff) / TRANSFER_RATE_WINDOW_SECONDS
+
+    def stats(self):
+        rate = self.upload_rate()
+        with self._lock:
+            return {"max_bytes_per_second": self.max_rate or None, "host_max_bytes_per_second": self.host_max_rate or None,
+                    "uploaded_bytes": self._bytes['upload'], "downloaded_bytes": self._bytes['download'],
+                    "upload_bytes_per_second": round(rate)}
+
+
+transfer_scheduler = TransferScheduler(TRANSFER_MAX_BYTES_PER_SECOND, TRANSFER_HOST_MAX_BYTES_PER_SECOND, TRANSFER_BURST_SECONDS)
+
+def _transfer_priority(candidate):
+    """Sort key putting the smallest transfers first: the probed size, else an estimate by media type."""
+    if candidate.size is not None:
+        return candidate.size
+    return TRANSFER_ASSUMED_VIDEO_BYTES if candidate.extension in SUPPORTED_VIDEO_EXTENSIONS else TRANSFER_ASSUMED_IMAGE_BYTES
+
+
+# Pooled HTTP Sessions
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+def _build_session(pool_maxsize, retry, pool_connections=10):
+    """Creates a keep-alive session whose per-host pools hold up to pool_maxsize connections."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=max(1, pool_maxsize), max_retries=retry, pool_block=False)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def _build_http_sessions():
+    idempotent_retry = Retry(total=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF_FACTOR, status_forcelist=RETRY_STATUS_CODES,
+                             allowed_methods=frozenset(['GET', 'HEAD']), respect_retry_after_header=True, raise_on_status=False)
+    # Uploads stream their body, so only retry failures to connect (nothing has been sent yet)
+    upload_retry = Retry(total=HTTP_RETRIES, connect=HTTP_RETRIES, read=0, status=0, other=0, backoff_factor=HTTP_BACKOFF_FACTOR)
+    return {
+        'communities': _build_session(len(COMMUNITIES_API_URLS), idempotent_retry),
+        # Probes for one cycle hit the same CDN hosts concurrently, so the pool also fits PROBE_CONCURRENCY keep-alive connections
+        'media': _build_session(max(MIRROR_PER_HOST_LIMIT, PROBE_CONCURRENCY if PROBE_ENABLED else 0), idempotent_retry, pool_connections=max(10, MIRROR_WORKERS * 2)),
+        'fileditch': _build_session(FILEDITCH_CONCURRENCY, upload_retry),
+    }
+
+http_sessions = _build_http_sessions()
+
+def get_http_pool_stats():
+    """Returns per-session, per-host connection pool statistics (requests, new connections, reuse rate, idle)."""
+    stats = {}
+    for name, session in http_sessions.items():
+        hosts = {}
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                num_requests = pool.num_requests
+                num_connections = pool.num_connections
+                hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                    "requests": num_requests,
+                    "connections_opened": num_connections,
+                    "reuse_rate": round(1 - num_connections / num_requests, 3) if num_requests else None,
+                    # Empty slots in the pool's queue are None placeholders
+                    "idle_connections": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+                }
+        stats[name] = hosts
+    return stats
+
+
+# Feed Polling State (FeedStateStore)
+DEFAULT_FEED_STATE_PATH = os.path.join(os.path.dirname(DATA_FILE_PATH), 'feed_state.json')
+FEED_STATE_PATH = os.path.abspath(os.environ.get('APP_FEED_STATE_PATH', DEFAULT_FEED_STATE_PATH))
+
+# Result of one feed poll: data is the list of new posts kept while streaming the response (see
+# _FeedPostCollector), FEED_NOT_MODIFIED on 304, or None on error; cursor is the newest post of a chronological feed
+# and walked the number of posts read up to the cursor, before filtering (reported as posts checked)
+FeedResult = namedtuple('FeedResult', ['data', 'status', 'validators', 'cursor', 'walked'], defaults=(None, 0))
+FEED_NOT_MODIFIED = object()
+
+POST_ID_KEYS = ('uuid', 'id')
+POST_TIME_KEYS = ('created', 'created_at', 'timestamp')
+
+def _post_id(post):
+    for key in POST_ID_KEYS:
+        value = post.get(key)
+        if value not in (None, ''):
+            return str(value)
+    return None
+
+def _post_time(post):
+    for key in POST_TIME_KEYS:
+        value = post.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    return None
+
+def _is_chronological_feed(api_url):
+    """True for 'new' feeds, which list posts newest first and can be walked only up to the cursor."""
+    return os.path.basename(urlparse(api_url).path).startswith('new')
+
+class FeedStateStore:
+    """
+    Per-feed polling state persisted to a small JSON file: the ETag/Last-Modified validators
+    of the last fully processed response and, for chronological feeds, a cursor on the newest
+    post seen. Thread-safe; state is only advanced once a feed's new posts have been committed.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._state = {}
+        self._dirty = False
+
+    def load(self):
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if isinstance(state, dict):
+                with self._lock:
+                    self._state = state
+                logging.info(f"Loaded polling state for {len(state)} feeds from {self.filepath}")
+        except FileNotFoundError:
+            logging.info(f"Feed state file {self.filepath} not found. Feeds will be fetched in full.")
+        except Exception as e:
+            logging.error(f"Error loading feed state from {self.filepath}: {e}. Feeds will be fetched in full.")
+
+    def get(self, api_url):
+        with self._lock:
+            return dict(self._state.get(api_url, {}))
+
+    def conditional_headers(self, api_url):
+        state = self.get(api_url)
+        headers = {}
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+        return headers
+
+    def advance(self, api_url, validators, cursor):
+        """Records the validators and newest-post cursor of a fully processed response."""
+        with self._lock:
+            state = dict(self._state.get(api_url, {}))
+            state.update(validators or {})
+            if cursor:
+                state.update(cursor)
+            state['updated'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            self._state[api_url] = state
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            state = dict(self._state)
+            self._dirty = False
+        try:
+            temp_filepath = self.filepath + ".tmp"
+            with open(temp_filepath, 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=4, ensure_ascii=False)
+            os.replace(temp_filepath, self.filepath)
+        except Exception as e:
+            logging.error(f"Error saving feed state to {self.filepath}: {e}")
+
+
+feed_state = FeedStateStore(FEED_STATE_PATH)
+
+
+# Streaming Feed Parser (_StreamingPostParser)
+# Keys probed, in document order, for the list of posts in an object response
+POST_LIST_KEYS = ('posts', 'data', 'items', 'results', 'threads', 'newPosts', 'hotPosts')
+POST_FIELDS = ('title', 'author', 'link')
+
+_JSON_WHITESPACE = ' \t\n\r'
+_JSON_DELIMITERS = _JSON_WHITESPACE + ',:]}'
+_INCOMPLETE = object()
+
+class _StreamingPostParser:
+    """
+    Push parser for a feed response. feed() takes the body as text in arbitrary pieces and
+    returns the posts completed so far, so only one post is ever decoded at a time. Accepts a
+    top-level list of posts, or an object holding them in its first list under POST_LIST_KEYS;
+    other top-level values are decoded one by one and dropped. Raises ValueError on malformed input.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._state = 'start'
+        self._in_object = False
+        self._closing = False
+        self._key = None
+        self._root_fields = {}
+        self.found_list = False
+
+    def feed(self, text):
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return self._parse()
+
+    def close(self):
+        """Parses what is left. A root object that is itself a post (no post list) is returned here."""
+        self._closing = True
+        posts = self._parse()
+        if self._state != 'done':
+            raise ValueError(f"Truncated feed response (parser stopped in state '{self._state}')")
+        if not self.found_list:
+            if all(k in self._root_fields for k in POST_FIELDS):
+                posts.append(dict(self._root_fields)) # Treat root dict as single post
+            else:
+                logging.warning("Could not find a list of posts under expected keys or as root dict in response.")
+        return posts
+
+    def _skip_whitespace(self):
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in _JSON_WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos < len(buffer)
+
+    def _decode_value(self):
+        """Decodes the value at the current position, or returns _INCOMPLETE until more text arrives."""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._closing:
+                raise
+            if len(self._buffer) - self._pos > FEED_MAX_VALUE_BYTES:
+                raise ValueError(f"Feed value exceeds FEED_MAX_VALUE_BYTES ({FEED_MAX_VALUE_BYTES}) or is malformed")
+            return _INCOMPLETE
+        if not self._closing and (end == len(self._buffer) or self._buffer[end] not in _JSON_DELIMITERS):
+            return _INCOMPLETE # A number may continue in the next piece ("1" then ".5")
+        self._pos = end
+        return value
+
+    def _parse(self):
+        posts = []
+        while self._skip_whitespace():
+            char = self._buffer[self._pos]
+            if self._state == 'start':
+                if char == '[':
+                    self.found_list = True
+                    self._state = 'items'
+                elif char == '{':
+                    self._in_object = True
+                    self._state = 'key'
+                else:
+                    raise ValueError(f"Feed response is not a JSON object or list (starts with {char!r})")
+                self._pos += 1
+            elif self._state == 'key':
+                if char in ',}':
+                    self._pos += 1
+                    if char == '}':
+                        self._state = 'done'
+                    continue
+                key = self._decode_value()
+                if key is _INCOMPLETE:
+                    break
+                if not isinstance(key, str):
+                    raise ValueError(f"Expected an object key in feed response, got {key!r}")
+                self._key = key
+                self._state = 'colon'
+            elif self._state == 'colon':
+                if char != ':':
+                    raise ValueError(f"Expected ':' after key '{self._key}' in feed response")
+                self._pos += 1
+                self._state = 'value'
+            elif self._state == 'value':
+                if char == '[' and not self.found_list and self._key in POST_LIST_KEYS:
+                    self._pos += 1
+                    self.found_list = True
+                    self._state = 'items'
+                    continue
+                value = self._decode_value()
+                if value is _INCOMPLETE:
+                    break
+                if self._key in POST_FIELDS:
+                    self._root_fields[self._key] = value
+                self._state = 'key'
+            elif self._state == 'items':
+                if char in ',]':
+                    self._pos += 1
+                    if char == ']':
+                        self._state = 'key' if self._in_object else 'done'
+                    continue
+                value = self._decode_value()
+                if value is _INCOMPLETE:
+                    break
+                posts.append(value)
+            else:
+                raise ValueError("Unexpected data after the end of the feed response")
+        return posts
+
+class _FeedPostCollector:
+    """
+    Consumes one feed response chunk by chunk. Posts are decoded one at a time, walked up to the
+    feed's stored cursor and pre-filtered as they arrive: only posts with supported media that
+    are not in existing_post_ids are kept, trimmed to title/author/link. Memory per feed stays
+    bounded by the posts kept, not by the size of the response.
+    """
+
+    def __init__(self, api_url, existing_post_ids=()):
+        self.api_url = api_url
+        self._existing_post_ids = existing_post_ids
+        self._text = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+        self._parser = _StreamingPostParser()
+        self._chronological = _is_chronological_feed(api_url)
+        cursor_state = feed_state.get(api_url) if self._chronological else {}
+        self._stop_id = cursor_state.get('newest_post_id')
+        self._stop_time = cursor_state.get('newest_post_time')
+        self.posts = []
+        self.cursor = None
+        self.walked = 0
+        self.finished = False # Reached the cursor; the rest of the response is not needed
+
+    def feed(self, chunk):
+        """Takes the next piece of the body. Returns True once the rest of the response can be skipped."""
+        if not self.finished:
+            self._accept(self._parser.feed(self._text.decode(chunk)))
+        return self.finished
+
+    def close(self):
+        """Finishes the response and returns the kept posts. Raises ValueError on malformed JSON."""
+        if not self.finished:
+            self._accept(self._parser.feed(self._text.decode(b'', final=True)))
+            self._accept(self._parser.close())
+        logging.debug(f"Walked {self.walked} posts from {self.api_url}, kept {len(self.posts)}")
+        return self.posts
+
+    def _accept(self, posts):
+        for post in posts:
+            if self.finished:
+                return
+            if not isinstance(post, dict):
+                POSTS_SKIPPED.inc('invalid_post')
+                logging.warning(f"Skipping non-dictionary item found in list from {self.api_url}: {post}")
+                continue
+            post_id = _post_id(post)
+            if self._chronological and self.cursor is None and post_id is not None:
+                self.cursor = {'newest_post_id': post_id, 'newest_post_time': _post_time(post)}
+            if self._stop_id is not None and post_id == self._stop_id:
+                logging.debug(f"Reached cursor post {self._stop_id} in {self.api_url}; skipping the rest of the feed.")
+                self.finished = True
+                return
+            post_time = _post_time(post)
+            if self._stop_time is not None and post_time is not None and post_time < self._stop_time:
+                logging.debug(f"Reached posts older than the cursor in {self.api_url}; skipping the rest of the feed.")
+                self.finished = True
+                return
+            if not all(k in post for k in POST_FIELDS):
+                POSTS_SKIPPED.inc('missing_fields')
+                logging.warning(f"Skipping post from {self.api_url} missing required keys (title, author, link): {post}")
+                continue
+            self.walked += 1
+            post = {k: post[k] for k in POST_FIELDS}
+            if self._wanted(post):
+                self.posts.append(post)
+
+    def _wanted(self, post):
+        """Drops posts that _select_candidates() would skip anyway; anything doubtful is kept for it to log."""
+        title, author, link = post['title'], post['author'], post['link']
+        if not (isinstance(title, str) and isinstance(author, str) and isinstance(link, str)):
+            return True
+        try:
+            extension = os.path.splitext(urlparse(link).path)[1].lower()
+        except ValueError:
+            return True
+        if extension not in SUPPORTED_EXTENSIONS:
+            POSTS_SKIPPED.inc('unsupported_extension')
+            return False
+        if _dedup_hash((title.strip(), author.strip())) in self._existing_post_ids:
+            POSTS_SKIPPED.inc('already_archived')
+            return False
+        return True
+
+
+def _record_fetch(api_url, result, elapsed):
+    """Records a feed poll's latency and outcome."""
+    FEED_FETCH_SECONDS.observe(elapsed, api_url)
+    if result.data is FEED_NOT_MODIFIED:
+        FEED_POLLS.inc(api_url, 'not_modified')
+    elif result.data is None:
+        FEED_POLLS.inc(api_url, 'error')
+        ERRORS.inc('fetch')
+    else:
+        FEED_POLLS.inc(api_url, 'ok')
+
+def fetch_communities_data(api_url, existing_post_ids=()):
+    """
+    Fetches data from a communities.win API endpoint, conditionally if validators are known.
+    The body is streamed through a _FeedPostCollector. Returns a FeedResult.
+    """
+    started = time.perf_counter()
+    result = _fetch_communities_data(api_url, existing_post_ids)
+    _record_fetch(api_url, result, time.perf_counter() - started)
+    return result
+
+def _fetch_communities_data(api_url, existing_post_ids):
+    logging.info(f"Attempting to fetch data from: {api_url}")
+    try:
+        # Uses the global COMMUNITIES_HEADERS which now includes env vars
+        headers = dict(COMMUNITIES_HEADERS)
+        headers.update(feed_state.conditional_headers(api_url))
+        response = http_sessions['communities'].get(api_url, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=True)
+        with response:
+            logging.debug(f"Response status code for {api_url}: {response.status_code}")
+            if response.status_code == 304:
+                logging.info(f"Feed not modified since last poll: {api_url}")
+                return FeedResult(FEED_NOT_MODIFIED, 304, None)
+            if not response.ok:
+                response.content # Buffer the error body while the connection is open, for the log below
+            response.raise_for_status()
+            validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+            collector = _FeedPostCollector(api_url, existing_post_ids)
+            try:
+                for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                    if collector.feed(chunk):
+                        break
+                posts = collector.close()
+            except ValueError as json_err:
+                logging.error(f"Error decoding JSON response from {api_url}. Error: {json_err}")
+                return FeedResult(None, response.status_code, None)
+            logging.debug(f"Successfully decoded JSON from {api_url}")
+            return FeedResult(posts, response.status_code, validators, collector.cursor, collector.walked)
+    except requests.exceptions.Timeout:
+        logging.error(f"Timeout occurred while fetching data from {api_url} (connect {CONNECT_TIMEOUT}s, read {READ_TIMEOUT}s).")
+        return FeedResult(None, None, None)
+    except requests.exceptions.HTTPError as http_err:
+        logging.error(f"HTTP error occurred for {api_url}: {http_err}")
+        status = None
+        if http_err.response is not None:
+             status = http_err.response.status_code
+             # Check for 401/403 which might indicate bad credentials
+             if http_err.response.status_code in [401, 403]:
+                  logging.error("Received 401/403 Unauthorized/Forbidden error. Check your CW_API_KEY, CW_API_SECRET, CW_XSRF_TOKEN environment variables.")
+             logging.error(f"Status Code: {http_err.response.status_code}, Response: {http_err.response.text[:200]}...")
+        return FeedResult(None, status, None)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Generic network error fetching data from {api_url}: {e}")
+        status = None
+        if hasattr(e, 'response') and e.response is not None:
+            status = e.response.status_code
+            logging.error(f"Status Code: {e.response.status_code}, Response: {e.response.text[:200]}...")
+        return FeedResult(None, status, None)
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during fetch for {api_url}: {e}")
+        return FeedResult(None, None, None)
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+def _host_semaphore(role, url, limit):
+    """Returns the shared semaphore limiting concurrent transfers of one role ('source'/'upload') to the URL's host."""
+    key = (role, (urlparse(url).hostname or '').lower())
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(key)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(max(1, limit))
+            _host_semaphores[key] = semaphore
+        return semaphore
+
+def upload_to_fileditch(file_url, on_stage=None):
+    """
+    Downloads a file (video/image) from a URL and uploads it to FileDitch.
+    Safe to call from several threads; per-host limits apply to the source and FileDitch.
+    on_stage, if given, is called with JOB_DOWNLOADING / JOB_UPLOADING as the transfer progresses.
+    """
+    existing_link = media_index.lookup_url(file_url)
+    if existing_link:
+        logging.info(f"Media already on FileDitch (same URL), reusing {existing_link} for {file_url}")
+        return existing_link
+    if media_spool is not None and _spool_eligible(file_url):
+        fileditch_link = _mirror_via_spool(file_url, on_stage)
+        if fileditch_link is not SPOOL_BYPASS:
+            return fileditch_link
+    # The download is piped straight into the upload, so both slots are held for the whole transfer.
+    # Always acquire source before FileDitch so workers cannot deadlock.
+    with _host_semaphore('source', file_url, MIRROR_PER_HOST_LIMIT), _host_semaphore('upload', FILEDITCH_UPLOAD_URL, FILEDITCH_CONCURRENCY):
+        return _upload_to_fileditch(file_url, on_stage)
+
+def _record_upload(mode, elapsed, size):
+    UPLOAD_SECONDS.observe(elapsed, mode)
+    MEDIA_BYTES.observe(size, mode)
+    TRANSFER_BYTES.inc(mode, amount=size)
+
+def _read_prefix(raw, limit):
+    """Reads up to limit+1 bytes from a raw stream. Returns (data, complete), complete being False if more remains."""
+    chunks = []
+    total = 0
+    while total <= limit:
+        chunk = raw.read(min(STREAM_CHUNK_SIZE, limit + 1 - total))
+        if not chunk:
+            return b''.join(chunks), True
+        chunks.append(chunk)
+        total += len(chunk)
+    return b''.join(chunks), False
+
+def _download_headers(file_url):
+    return {
+        'User-Agent': COMMUNITIES_HEADERS.get('user-agent'), # Get from global headers
+        'Accept': 'image/jpeg, image/png, image/gif, image/webp, video/mp4, */*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Referer': file_url
+    }
+
+def _upload_filename(file_url, content_disposition):
+    """Chooses the filename to upload under, from Content-Disposition or the URL path."""
+    filename = None
+    original_extension = os.path.splitext(urlparse(file_url).path)[1].lower()
+
+    try:
+        if content_disposition:
+            fname_match = re.search(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', content_disposition, re.IGNORECASE)
+            if fname_match:
+                filename = unquote(fname_match.group(1))
+                filename = re.sub(r'[\\/*?:"<>|]', '_', filename) # Basic sanitization
+                logging.debug(f"Filename from Content-Disposition: '{filename}'")
+
+        if not filename:
+            parsed_url = urlparse(file_url)
+            path_part = unquote(parsed_url.path.split('/')[-1])
+            if path_part and '.' in path_part:
+                filename = re.sub(r'[\\/*?:"<>|]', '_', path_part) # Basic sanitization
+                logging.debug(f"Filename from URL path: '{filename}'")
+
+        if not filename:
+            fallback_ext = original_extension if original_extension in SUPPORTED_EXTENSIONS else ".dat"
+            filename = f"upload{fallback_ext}"
+            logging.debug(f"Using fallback filename: '{filename}'")
+
+        # Ensure filename has an extension (add original if missing and supported)
+        if '.' not in filename[-6:]: # Check last few chars for extension
+            current_ext = os.path.splitext(filename)[1]
+            if not current_ext:
+                  add_ext = original_extension if original_extension in SUPPORTED_EXTENSIONS else ".dat"
+                  filename += add_ext
+                  logging.debug(f"Appended extension '{add_ext}', final filename: '{filename}'")
+
+    except Exception as e_fname:
+        logging.warning(f"Could not reliably determine filename for {file_url}: {e_fname}. Using fallback 'upload.dat'.")
+        filename = "upload.dat"
+    return filename
+
+def _upload_mime_type(filename, file_url):
+    original_extension = os.path.splitext(urlparse(file_url).path)[1].lower()
+    mime_type, _ = mimetypes.guess_type(filename)
+    if not mime_type:
+        # Fallback MIME type guessing based on known extensions
+        if original_extension == '.mp4': mime_type = 'video/mp4'
+        elif original_extension in ['.jpg', '.jpeg']: mime_type = 'image/jpeg'
+        elif original_extension == '.png': mime_type = 'image/png'
+        elif original_extension == '.gif': mime_type = 'image/gif'
+        elif original_extension == '.webp': mime_type = 'image/webp'
+        else: mime_type = 'application/octet-stream'
+        logging.warning(f"Could not guess MIME type for '{filename}'. Using fallback: {mime_type}")
+    logging.debug(f"Using MIME type: {mime_type} for upload.")
+    return mime_type
+
+def _parse_fileditch_response(upload_data):
+    """Returns the file URL from a decoded FileDitch upload.php response, or None on failure."""
+    logging.debug(f"FileDitch response: {json.dumps(upload_data, indent=2)}")
+
+    if isinstance(upload_data, dict) and upload_data.get("success") is True and isinstance(upload_data.get("files"), list) and len(upload_data["files"]) > 0:
+        first_file = upload_data["files"][0]
+        if isinstance(first_file, dict) and first_file.get("url"):
+            fileditch_link = first_file["url"]
+            logging.info(f"Successfully uploaded to FileDitch: {fileditch_link}")
+            return fileditch_link
+        else:
+            logging.error(f"FileDitch response structure mismatch or missing 'url'. File data: {first_file}")
+            return None
+    else:
+        error_message = upload_data.get("error", "No specific error message provided.") if isinstance(upload_data, dict) else "Response is not an object."
+        success_flag = upload_data.get('success') if isinstance(upload_data, dict) else None
+        logging.error(f"FileDitch upload failed. Success flag: {success_flag}. Error: {error_message}. Full response: {upload_data}")
+        return None
+
+def _upload_to_fileditch(file_url, on_stage=None):
+    started = time.perf_counter()
+    try:
+        logging.info(f"Attempting to download: {file_url}")
+        if on_stage:
+            on_stage(JOB_DOWNLOADING)
+        download_headers = _download_headers(file_url)
+        with http_sessions['media'].get(file_url, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), headers=download_headers) as r:
+            r.raise_for_status()
+            logging.info(f"Download started for {file_url} (Status: {r.status_code})")
+
+            filename = _upload_filename(file_url, r.headers.get('content-disposition'))
+            mime_type = _upload_mime_type(filename, file_url)
+
+            # Small files are hashed in full first so already-uploaded content can be reused;
+            # larger ones are hashed while streaming and indexed after the upload.
+            hasher = hashlib.sha256()
+            prefix, complete = b'', False
+            content_length = r.headers.get('content-length')
+            if not (content_length and content_length.isdigit() and int(content_length) > MEDIA_HASH_BUFFER_BYTES):
+                prefix, complete = _read_prefix(r.raw, MEDIA_HASH_BUFFER_BYTES)
+            if complete:
+                digest = hashlib.sha256(prefix).hexdigest()
+                existing_link = media_index.lookup_content(digest, len(prefix))
+                if existing_link:
+                    logging.info(f"Media already on FileDitch (same content), reusing {existing_link} for {file_url}")
+                    media_index.record(file_url, existing_link, digest, len(prefix))
+                    return existing_link
+            throttle = lambda amount: transfer_scheduler.throttle(amount, file_url, upload=True)
+            body = _HashingReader(prefix, r.raw, hasher, throttle)
+            if complete:
+                size = len(prefix)
+            else:
+                size = int(content_length) if content_length and content_length.isdigit() else None
+            # Streamed in chunks so the rate limits apply; sent with Content-Length when the source gave one
+            upload_body = _PipedMultipartBody(body, size, 'files[]', filename, mime_type)
+            # Uses the global FILEDITCH_UPLOAD_URL
+            logging.info(f"Uploading '{filename}' (from {file_url}, type: {mime_type}) to {FILEDITCH_UPLOAD_URL}...")
+            if on_stage:
+                on_stage(JOB_UPLOADING)
+            upload_started = time.perf_counter()
+            DOWNLOAD_SECONDS.observe(upload_started - started, 'piped')
+
+            upload_response = http_sessions['fileditch'].post(FILEDITCH_UPLOAD_URL, data=upload_body, headers={'Content-Type': upload_body.content_type},
+                                                              timeout=(CONNECT_TIMEOUT, UPLOAD_READ_TIMEOUT))
+            upload_response.raise_for_status()
+
+            try:
+                upload_data = upload_response.json()
+            except json.JSONDecodeError:
+                logging.error(f"Error decoding FileDitch JSON response. Status: {upload_response.status_code}. Response text: {upload_response.text[:200]}...")
+                return None
+
+            fileditch_link = _parse_fileditch_response(upload_data)
+            if fileditch_link:
+                media_index.record(file_url, fileditch_link, hasher.hexdigest(), body.size)
+                _record_upload('piped', time.perf_counter() - upload_started, body.size)
+            return fileditch_link
+
+    except requests.exceptions.Timeout:
+        stage = "download" if 'r' not in locals() else "upload"
+        timeout_val = READ_TIMEOUT if stage == "download" else UPLOAD_READ_TIMEOUT
+        logging.error(f"Timeout ({timeout_val}s) occurred during {stage} for URL: {file_url}")
+        return None
+    except requests.exceptions.HTTPError as http_err:
+        stage = "download" if 'r' not in locals() else "upload"
+        logging.error(f"HTTP error occurred during {stage} for {file_url}: {http_err}")
+        if hasattr(http_err, 'response') and http_err.response is not None:
+            logging.error(f"Status Code: {http_err.response.status_code}, Response: {http_err.response.text[:200]}...")
+        return None
+    except requests.exceptions.RequestException as e:
+        stage = "download" if 'r' not in locals() else "upload"
+        logging.error(f"Network error during {stage} for {file_url}: {e}")
+        if hasattr(e, 'response') and e.response is not None:
+            logging.error(f"Status Code: {e.response.status_code}, Response: {e.response.text[:200]}...")
+        return None
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during upload processing for {file_url}: {e}", exc_info=True)
+        return None
+
+# Media Spool (MediaSpool)
+SPOOL_BYPASS = object() # Returned when a file can't be spooled and should be piped directly instead
+
+def _spool_eligible(file_url):
+    """Videos go through the spool; images are small enough to pipe straight into the upload."""
+    return os.path.splitext(urlparse(file_url).path)[1].lower() in SUPPORTED_VIDEO_EXTENSIONS
+
+class MediaSpool:
+    """
+    Size-bounded download cache. Each file is written to <name>.part, resumed with a Range
+    request (guarded by If-Range) after an interruption, and renamed to <name> once complete.
+    A <name>.json sidecar keeps the validators and Content-Disposition. Files are removed
+    after a successful upload; what's left (failed uploads, partial downloads) lets a retry
+    skip the download and is evicted least-recently-used first to stay within max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._in_use = set()
+        self.resumed = 0
+        self.reused = 0
+        self.evicted = 0
+        self.bypassed = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _name(self, file_url):
+        extension = os.path.splitext(urlparse(file_url).path)[1].lower()
+        return hashlib.sha1(normalize_media_url(file_url).encode('utf-8')).hexdigest() + extension
+
+    def _path(self, name, suffix=''):
+        return os.path.join(self.directory, name + suffix)
+
+    def acquire(self, file_url):
+        """Reserves the spool slot for a URL (waiting if another worker holds it). Returns its name."""
+        name = self._name(file_url)
+        with self._released:
+            while name in self._in_use:
+                self._released.wait()
+            self._in_use.add(name)
+        return name
+
+    def release(self, name, discard=False):
+        """Frees a slot; discard=True deletes its files (after a successful upload)."""
+        if discard:
+            for suffix in ('', '.part', '.json'):
+                try:
+                    os.remove(self._path(name, suffix))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logging.warning(f"Could not remove spool file {self._path(name, suffix)}: {e}")
+        with self._released:
+            self._in_use.discard(name)
+            self._released.notify_all()
+
+    def read_meta(self, name):
+        try:
+            with open(self._path(name, '.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            return meta if isinstance(meta, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, name, meta):
+        try:
+            with open(self._path(name, '.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        except OSError as e:
+            logging.warning(f"Could not write spool metadata for {name}: {e}")
+
+    def _evict(self, reserve):
+        """Deletes least recently used files not in use until reserve more bytes fit in the budget."""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(('.json', '.tmp')) or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    total += stat.st_size
+                    entries.append((stat.st_mtime, stat.st_size, entry.name))
+        except OSError as e:
+            logging.error(f"Could not scan spool directory {self.directory}: {e}")
+            return
+        if total + reserve <= self.max_bytes:
+            return
+        with self._lock:
+            in_use = set(self._in_use)
+        for _, size, filename in sorted(entries):
+            name = filename[:-len('.part')] if filename.endswith('.part') else filename
+            if name in in_use:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, filename))
+                try:
+                    os.remove(self._path(name, '.json'))
+                except FileNotFoundError:
+                    pass
+            except OSError as e:
+                logging.warning(f"Could not evict spool file {filename}: {e}")
+                continue
+            self.evicted += 1
+            total -= size
+            logging.info(f"Evicted {filename} ({size} bytes) from the spool")
+            if total + reserve <= self.max_bytes:
+                return
+
+    def fetch(self, file_url, name):
+        """
+        Downloads file_url into the slot `name` (held via acquire()), resuming after interruptions.
+        Returns the complete file's path, None on failure, or SPOOL_BYPASS if the file doesn't fit the budget.
+        """
+        path = self._path(name)
+        part_path = self._path(name, '.part')
+        if os.path.exists(path):
+            os.utime(path)
+            self.reused += 1
+            logging.info(f"Using already spooled download for {file_url}")
+            return path
+        meta = self.read_meta(name)
+        for attempt in range(SPOOL_RESUME_ATTEMPTS + 1):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = _download_headers(file_url)
+            if offset:
+                headers['Range'] = f"bytes={offset}-"
+                validator = meta.get('etag') or meta.get('last_modified')
+                if validator:
+                    headers['If-Range'] = validator
+            try:
+                with http_sessions['media'].get(file_url, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), headers=headers) as r:
+                    if r.status_code == 416 and offset and meta.get('total') == offset:
+                        break # The previous attempt had already received everything
+                    r.raise_for_status()
+                    content_range = r.headers.get('content-range', '')
+                    if r.status_code == 206 and content_range.startswith(f"bytes {offset}-"):
+                        mode = 'ab'
+                        self.resumed += 1
+                        logging.info(f"Resuming download of {file_url} at byte {offset}")
+                    else:
+                        # Full response: the server ignored the range or the file changed (If-Range)
+                        mode = 'wb'
+                        offset = 0
+                        content_length = r.headers.get('content-length')
+                        meta = {
+                            'url': file_url,
+                            'etag': r.headers.get('etag'),
+                            'last_modified': r.headers.get('last-modified'),
+                            'content_disposition': r.headers.get('content-disposition'),
+                            'total': int(content_length) if content_length and content_length.isdigit() else None,
+                        }
+                        self._write_meta(name, meta)
+                    total = meta.get('total')
+                    if total is not None and total > self.max_bytes:
+                        logging.info(f"{file_url} ({total} bytes) exceeds the spool budget; piping it directly.")
+                        self.bypassed += 1
+                        return SPOOL_BYPASS
+                    self._evict((total - offset) if total is not None else 0)
+                    written = offset
+                    with open(part_path, mode) as f:
+                        while True:
+                            chunk = r.raw.read(STREAM_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            transfer_scheduler.throttle(len(chunk), file_url)
+                            f.write(chunk)
+                            written += len(chunk)
+                            if written > self.max_bytes:
+                                logging.info(f"{file_url} outgrew the spool budget; piping it directly.")
+                                self.bypassed += 1
+                                f.close()
+                                os.remove(part_path)
+                                return SPOOL_BYPASS
+                    if total is None or written >= total:
+                        meta['total'] = written
+                        break
+                    logging.warning(f"Download of {file_url} ended early at {written} of {total} bytes.")
+            except requests.exceptions.HTTPError as http_err:
+                logging.error(f"HTTP error occurred during download for {file_url}: {http_err}")
+                return None
+            except (requests.exceptions.RequestException, Urllib3Error, OSError) as e:
+                logging.warning(f"Download of {file_url} interrupted: {e}")
+            if attempt < SPOOL_RESUME_ATTEMPTS:
+                time.sleep(HTTP_BACKOFF_FACTOR * (2 ** attempt))
+        else:
+            logging.error(f"Giving up on downloading {file_url} after {SPOOL_RESUME_ATTEMPTS} resume attempts; the partial file is kept for the next retry.")
+            return None
+        os.replace(part_path, path)
+        self._write_meta(name, meta)
+        return path
+
+    def stats(self):
+        return {"directory": self.directory, "max_bytes": self.max_bytes, "in_use": len(self._in_use),
+                "resumed": self.resumed, "reused": self.reused, "evicted": self.evicted, "bypassed": self.bypassed}
+
+
+media_spool = MediaSpool(MEDIA_SPOOL_DIR, SPOOL_MAX_BYTES) if MEDIA_SPOOL_DIR else None
+
+class _MultipartBody:
+    """
+    multipart/form-data body holding one file, streamed by iteration. With a known size it has a
+    length, so the upload is sent with Content-Length; otherwise len() is 0 and it goes chunked.
+    """
+
+    def __init__(self, size, field, filename, mime_type):
+        self.size = size
+        boundary = os.urandom(16).hex()
+        safe_filename = filename.replace('"', '%22').replace('\r', ' ').replace('\n', ' ')
+        self._head = (f"--{boundary}\r\n"
+                      f"Content-Disposition: form-data; name=\"{field}\"; filename=\"{safe_filename}\"\r\n"
+                      f"Content-Type: {mime_type}\r\n\r\n").encode('utf-8')
+        self._tail = f"\r\n--{boundary}--\r\n".encode('utf-8')
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+    def __len__(self):
+        return 0 if self.size is None else len(self._head) + self.size + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        yield from self._file_chunks()
+        yield self._tail
+
+class _SpooledMultipartBody(_MultipartBody):
+    """
+    Body for one spooled file, streamed from a memory map. Can be iterated again if the
+    connection is retried. Uploaded bytes draw on the transfer scheduler's upload cap.
+    """
+
+    def __init__(self, path, field, filename, mime_type):
+        self.path = path
+        super().__init__(os.path.getsize(path), field, filename, mime_type)
+
+    def _file_chunks(self):
+        if self.size:
+            with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(0, self.size, SPOOL_UPLOAD_CHUNK):
+                    chunk = mapped[offset:offset + SPOOL_UPLOAD_CHUNK]
+                    transfer_scheduler.throttle(len(chunk), upload=True)
+                    yield chunk
+
+class _PipedMultipartBody(_MultipartBody):
+    """Body read from a _HashingReader as the upload goes, so the source is piped straight into FileDitch."""
+
+    def __init__(self, reader, size, field, filename, mime_type):
+        self._reader = reader
+        super().__init__(size, field, filename, mime_type)
+
+    def _file_chunks(self):
+        while True:
+            chunk = self._reader.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+def _file_digest(path):
+    """Returns (sha256 hex digest, size) of a file, read through a memory map."""
+    size = os.path.getsize(path)
+    hasher = hashlib.sha256()
+    if size:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(0, size, SPOOL_UPLOAD_CHUNK):
+                hasher.update(mapped[offset:offset + SPOOL_UPLOAD_CHUNK])
+    return hasher.hexdigest(), size
+
+def _mirror_via_spool(file_url, on_stage=None):
+    """
+    Spool-mode mirror: download to disk (source slot only), then upload from disk (FileDitch slot only).
+    Returns the FileDitch link, None on failure, or SPOOL_BYPASS to fall back to direct piping.
+    """
+    name = media_spool.acquire(file_url)
+    uploaded = False
+    try:
+        with _host_semaphore('source', file_url, MIRROR_PER_HOST_LIMIT):
+            if on_stage:
+                on_stage(JOB_DOWNLOADING)
+            logging.info(f"Attempting to download (spooled): {file_url}")
+            started = time.perf_counter()
+            path = media_spool.fetch(file_url, name)
+        if path is None or path is SPOOL_BYPASS:
+            return path
+        DOWNLOAD_SECONDS.observe(time.perf_counter() - started, 'spool')
+
+        digest, size = _file_digest(path)
+        existing_link = media_index.lookup_content(digest, size)
+        if existing_link:
+            logging.info(f"Media already on FileDitch (same content), reusing {existing_link} for {file_url}")
+            media_index.record(file_url, existing_link, digest, size)
+            uploaded = True
+            return existing_link
+
+        filename = _upload_filename(file_url, media_spool.read_meta(name).get('content_disposition'))
+        mime_type = _upload_mime_type(filename, file_url)
+        body = _SpooledMultipartBody(path, 'files[]', filename, mime_type)
+        with _host_semaphore('upload', FILEDITCH_UPLOAD_URL, FILEDITCH_CONCURRENCY):
+            if on_stage:
+                on_stage(JOB_UPLOADING)
+            logging.info(f"Uploading '{filename}' ({size} bytes from spool, type: {mime_type}) to {FILEDITCH_UPLOAD_URL}...")
+            upload_started = time.perf_counter()
+            upload_response = http_sessions['fileditch'].post(FILEDITCH_UPLOAD_URL, data=body, headers={'Content-Type': body.content_type},
+                                                              timeout=(CONNECT_TIMEOUT, UPLOAD_READ_TIMEOUT))
+            upload_response.raise_for_status()
+        try:
+            upload_data = upload_response.json()
+        except json.JSONDecodeError:
+            logging.error(f"Error decoding FileDitch JSON response. Status: {upload_response.status_code}. Response text: {upload_response.text[:200]}...")
+            return None
+        fileditch_link = _parse_fileditch_response(upload_data)
+        if fileditch_link:
+            media_index.record(file_url, fileditch_link, digest, size)
+            _record_upload('spool', time.perf_counter() - upload_started, size)
+            uploaded = True
+        return fileditch_link
+    except requests.exceptions.Timeout:
+        logging.error(f"Timeout ({UPLOAD_READ_TIMEOUT}s) occurred during upload for URL: {file_url}; the spooled file is kept for the retry.")
+        return None
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Network error during upload for {file_url}: {e}; the spooled file is kept for the retry.")
+        if getattr(e, 'response', None) is not None:
+            logging.error(f"Status Code: {e.response.status_code}, Response: {e.response.text[:200]}...")
+        return None
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during spooled upload for {file_url}: {e}", exc_info=True)
+        return None
+    finally:
+        media_spool.release(name, discard=uploaded)
+
+
+# Pre-flight Media Probe (MediaProber)
+# Outcome of probing one media URL: ok=False means the post is dropped for `reason`;
+# size and content_type are None when the source didn't say
+ProbeResult = namedtuple('ProbeResult', ['ok', 'reason', 'size', 'content_type'])
+# HEAD answers that don't prove anything about a GET (method not allowed, URLs signed for GET only)
+PROBE_HEAD_FALLBACK_STATUSES = (403, 405, 501)
+
+def _probe_size(status, headers):
+    """Total file size from a HEAD / Range 0-0 response: Content-Range on 206, else Content-Length. None if unknown."""
+    if status == 206:
+        total = (headers.get('content-range') or '').rpartition('/')[2].strip()
+        return int(total) if total.isdigit() else None
+    content_length = headers.get('content-length')
+    return int(content_length) if content_length and content_length.isdigit() else None
+
+def _probe_verdict(status, headers):
+    """Judges a probe response. Errors that may be transient (429, 5xx) let the post through unverified."""
+    if status in (404, 410):
+        return ProbeResult(False, 'not_found', None, None)
+    if status == 429 or status >= 500:
+        return ProbeResult(True, 'unverified', None, None)
+    if status >= 400:
+        return ProbeResult(False, f'http_{status}', None, None)
+    content_type = (headers.get('content-type') or '').split(';')[0].strip().lower() or None
+    size = _probe_size(status, headers)
+    if content_type and not content_type.startswith(PROBE_ALLOWED_TYPES):
+        return ProbeResult(False, 'content_type', size, content_type)
+    if size is not None and size > MEDIA_MAX_BYTES:
+        return ProbeResult(False, 'too_large', size, content_type)
+    return ProbeResult(True, 'ok', size, content_type)
+
+class MediaProber:
+    """
+    Pre-flight checks for new mirror candidates, so doomed transfers never take a download or
+    upload slot. Rejections are cached per URL for ttl seconds; passes are not cached.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._rejected = {} # url -> (expires_at, reason)
+        self._lock = threading.Lock()
+
+    def cached_rejection(self, url):
+        """Returns the reason url was rejected within the TTL, or None."""
+        with self._lock:
+            cached = self._rejected.get(url)
+            if cached is None:
+                return None
+            if cached[0] <= time.monotonic():
+                del self._rejected[url]
+                return None
+            return cached[1]
+
+    def probe(self, url):
+        """Probes url with HEAD, falling back to a Range 0-0 GET. Returns a ProbeResult. Safe from several threads."""
+        reason = self.cached_rejection(url)
+        if reason is not None:
+            PROBES.inc('cached')
+            return ProbeResult(False, reason, None, None)
+        if media_index.lookup_url(url):
+            return ProbeResult(True, 'ok', None, None) # Already on FileDitch; mirroring just reuses the link
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+        try:
+            r = http_sessions['media'].head(url, headers=_download_headers(url), timeout=timeout, allow_redirects=True)
+            r.close()
+            if r.status_code in PROBE_HEAD_FALLBACK_STATUSES:
+                range_headers = dict(_download_headers(url), Range='bytes=0-0')
+                with http_sessions['media'].get(url, headers=range_headers, stream=True, timeout=timeout) as r:
+                    pass # Only the headers are needed; the body is discarded with the connection
+            result = _probe_verdict(r.status_code, r.headers)
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Probe failed for {url}: {e}. Mirroring it unverified.")
+            result = ProbeResult(True, 'unverified', None, None)
+        return self.record(url, result)
+
+    def record(self, url, result):
+        """Counts a probe outcome and caches it if it is a rejection. Returns result."""
+        PROBES.inc(result.reason)
+        if not result.ok:
+            with self._lock:
+                self._rejected[url] = (time.monotonic() + self.ttl, result.reason)
+                if len(self._rejected) > 10000:
+                    now = time.monotonic()
+                    self._rejected = {u: entry for u, entry in self._rejected.items() if entry[0] > now}
+        return result
+
+    def vet(self, candidates, results):
+        """Pairs candidates with their ProbeResults (same order). Returns the candidates allowed to mirror."""
+        vetted = []
+        for candidate, result in zip(candidates, results):
+            if result.ok:
+                vetted.append(candidate._replace(size=result.size))
+                continue
+            POSTS_SKIPPED.inc(f'probe_{result.reason}')
+            detail = f" ({result.content_type}, {result.size} bytes)" if result.content_type or result.size else ""
+            logging.info(f"Skipping '{candidate.title}' by {candidate.author}: probe rejected {candidate.link} ({result.reason}){detail}")
+        return vetted
+
+    def stats(self):
+        with self._lock:
+            return {"cached_rejections": len(self._rejected), "ttl_seconds": self.ttl}
+
+
+media_prober = MediaProber(PROBE_NEGATIVE_TTL_SECONDS)
+
+def _probe_candidates(candidates):
+    """Probes candidates concurrently. No lock needed. Returns the candidates that passed, in order."""
+    if not PROBE_ENABLED or not candidates:
+        return candidates
+    logging.info(f"Probing {len(candidates)} new posts with up to {PROBE_CONCURRENCY} workers...")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, PROBE_CONCURRENCY), thread_name_prefix="Probe") as executor:
+        results = list(executor.map(media_prober.probe, [c.link for c in candidates]))
+    return media_prober.vet(candidates, results)
+
+
+# Core Processing Logic (_run_processing_cycle)
+# Posts claimed by a cycle that is still mirroring them, so overlapping cycles never mirror the same post twice
+_inflight_post_ids = set()
+_inflight_lock = threading.Lock()
+
+# A new post found in a feed, waiting to be mirrored
+MirrorCandidate = namedtuple('MirrorCandidate', ['key', 'title', 'author', 'link', 'extension', 'feed', 'size'], defaults=(None,)) # size: bytes, if the probe found out
+
+def _fetch_feeds(api_urls, existing_post_ids=()):
+    """Fetches the given feeds concurrently. No lock needed. Returns FeedResults in api_urls order."""
+    # Fetch data from all APIs concurrently using ThreadPoolExecutor
+    logging.info(f"Starting concurrent fetch for {len(api_urls)} URLs...")
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        # map applies fetch_communities_data to each URL in the list concurrently
+        # it returns an iterator yielding results in the order the URLs were submitted
+        results = list(executor.map(fetch_communities_data, api_urls, [existing_post_ids] * len(api_urls)))
+    logging.info("Concurrent fetching complete. Processing results...")
+    return results
+
+def _collect_posts(api_urls, results):
+    """
+    Turns FeedResults (in api_urls order) into (posts, pending_state): posts is a list of
+    (api_url, post) in feed order and pending_state maps each freshly fetched feed to the
+    (validators, cursor) to record once its posts are committed.
+    """
+    all_posts_from_apis = []
+    pending_state = {}
+    for api_url, result in zip(api_urls, results):
+        if result.data is FEED_NOT_MODIFIED:
+            continue
+        if result.data is None:
+             # Fetch returned None (likely due to error logged in fetch_communities_data)
+             logging.warning(f"Fetch for {api_url} returned no data (check logs above for details).")
+             continue
+        # Already walked and pre-filtered while streaming; an empty list still advances the feed state
+        all_posts_from_apis.extend((api_url, post) for post in result.data)
+        pending_state[api_url] = (result.validators, result.cursor)
+    return all_posts_from_apis, pending_state
+
+def _select_candidates(posts, existing_post_ids, inflight_post_ids=()):
+    """
+    Filters fetched (api_url, post) pairs down to new posts with supported media, claiming each
+    key's dedup hash in existing_post_ids so the same post seen in several feeds is only mirrored once.
+    Returns (candidates, deferred_feeds): MirrorCandidates in feed order, and the feeds that had
+    posts skipped only because another cycle is still mirroring them.
+    """
+    candidates = []
+    deferred_feeds = set()
+    for api_url, post in posts:
+        author = post.get('author', '')
+        title = post.get('title', '')
+        link = post.get('link', '')
+
+        # Non-string values count as missing; _FeedPostCollector keeps such posts for this check to log
+        if not (isinstance(author, str) and isinstance(title, str) and isinstance(link, str)):
+            POSTS_SKIPPED.inc('missing_fields')
+            logging.warning(f"Skipping post with non-string fields: Title type='{type(title)}', Author type='{type(author)}', Link type='{type(link)}'")
+            continue
+        author = author.strip()
+        title = title.strip()
+        if not author or not title or not link:
+            POSTS_SKIPPED.inc('missing_fields')
+            logging.debug(f"Skipping post with missing info: Title='{title}', Author='{author}', Link='{link}'")
+            continue
+
+        # Extract extension safely
+        try:
+            _, extension = os.path.splitext(urlparse(link).path) # Parse path before splitext
+            extension = extension.lower()
+        except Exception as ext_err:
+             POSTS_SKIPPED.inc('bad_link')
+             logging.warning(f"Could not extract extension from link '{link}': {ext_err}. Skipping.")
+             continue
+
+        # Uses global SUPPORTED_EXTENSIONS
+        if extension in SUPPORTED_EXTENSIONS:
+            post_id_tuple = (title, author)
+
+            if _dedup_hash(post_id_tuple) in existing_post_ids:
+                POSTS_SKIPPED.inc('already_archived')
+                logging.debug(f"Skipping already processed/existing post: Title='{title}', Author='{author}'")
+                continue
+            if post_id_tuple in inflight_post_ids:
+                POSTS_SKIPPED.inc('in_flight')
+                logging.debug(f"Skipping post being mirrored by another cycle: Title='{title}', Author='{author}'")
+                deferred_feeds.add(api_url)
+                continue
+
+            logging.info(f"Found new post with supported file: Title='{title}', Author='{author}', Link='{link}'")
+            existing_post_ids.add(_dedup_hash(post_id_tuple))
+            candidates.append(MirrorCandidate(post_id_tuple, title, author, link, extension, api_url))
+        else:
+            POSTS_SKIPPED.inc('unsupported_extension')
+            logging.debug(f"Skipping post with unsupported extension ('{extension}'): Title='{title}', Author='{author}', Link: {link[:100]}...")
+    return candidates, deferred_feeds
+
+def _claim_candidates(posts, existing_post_ids):
+    """
+    Selects candidates from fetched posts and marks them in-flight so overlapping cycles skip them.
+    Returns (candidates, deferred_feeds, claimed_keys); release the keys with _release_candidates().
+    """
+    with _inflight_lock:
+        candidates, deferred_feeds = _select_candidates(posts, existing_post_ids, _inflight_post_ids)
+        claimed = {c.key for c in candidates}
+        _inflight_post_ids.update(claimed)
+    return candidates, deferred_feeds, claimed
+
+def _release_candidates(claimed):
+    with _inflight_lock:
+        _inflight_post_ids.difference_update(claimed)
+
+def _feed_community(api_url):
+    for key, value in parse_qsl(urlparse(api_url).query):
+        if key == 'community':
+            return value
+    return None
+
+def _build_entry(candidate, fileditch_link):
+    entry = {
+        "title": candidate.title,
+        "author": candidate.author,
+        "fileditch_link": fileditch_link,
+        "original_link": candidate.link,
+        "type": "video" if candidate.extension in SUPPORTED_VIDEO_EXTENSIONS else "image",
+        "processed_timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    }
+    community = _feed_community(candidate.feed)
+    if community:
+        entry["community"] = community
+    return entry
+
+def _merge_mirror_results(candidates, fileditch_links):
+    """
+    Pairs candidates with their upload results (same order).
+    Returns (items_to_add, failed_feeds): new archive entries in candidate order, and the
+    feeds that had at least one post fail to mirror.
+    """
+    items_to_add = []
+    failed_feeds = set()
+    for candidate, fileditch_link in zip(candidates, fileditch_links):
+        title, author, link = candidate.title, candidate.author, candidate.link
+        if fileditch_link:
+            new_entry = _build_entry(candidate, fileditch_link)
+            items_to_add.append(new_entry)
+            logging.info(f"Prepared new entry for '{title}' by {author} (Type: {new_entry['type']}).")
+        else:
+            failed_feeds.add(candidate.feed)
+            logging.warning(f"Failed to upload file for post: Title='{title}', Author='{author}' (Link: {link})")
+    return items_to_add, failed_feeds
+
+def _mirror_job(candidate):
+    """Mirrors one candidate, reporting its download/upload stage to the mirror queue."""
+    return upload_to_fileditch(candidate.link, on_stage=lambda state: mirror_queue.set_state(candidate.key, state))
+
+def _log_transfer_throughput(count, uploaded_before, started):
+    uploaded = transfer_scheduler.uploaded_bytes() - uploaded_before
+    elapsed = time.perf_counter() - started
+    logging.info(f"Mirror stage for {count} posts uploaded {uploaded / 1048576:.1f} MiB in {elapsed:.1f}s "
+                 f"({uploaded / 1048576 / max(elapsed, 1e-6):.2f} MiB/s).")
+
+def _mirror_candidates(candidates):
+    """
+    Mirrors candidates on the worker pool, smallest first. No lock needed.
+    Returns FileDitch links (None on failure) in candidate order.
+    """
+    if not candidates:
+        return []
+    logging.info(f"Mirroring {len(candidates)} posts with up to {MIRROR_WORKERS} workers...")
+    order = sorted(range(len(candidates)), key=lambda i: _transfer_priority(candidates[i]))
+    fileditch_links = [None] * len(candidates)
+    uploaded_before, started = transfer_scheduler.uploaded_bytes(), time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MIRROR_WORKERS, thread_name_prefix="Mirror") as executor:
+        # Workers take jobs in submission order; links are put back in feed order for the merge
+        for i, link in zip(order, executor.map(_mirror_job, [candidates[i] for i in order])):
+            fileditch_links[i] = link
+    _log_transfer_throughput(len(candidates), uploaded_before, started)
+    return fileditch_links
+
+def _commit_entries(items_to_add):
+    """
+    Commits new entries, dropping any that another cycle added since the snapshot.
+    Takes data_lock briefly. Returns (new_items_added, total_items).
+    """
+    with data_lock:
+        conflicts = [item for item in items_to_add if _dedup_key(item) in archive_store]
+        if conflicts:
+            logging.info(f"Dropping {len(conflicts)} entries already committed by another cycle.")
+        new_items_added = 0
+        if len(conflicts) < len(items_to_add):
+            logging.info(f"Attempting to save {len(items_to_add) - len(conflicts)} new items to {DATA_FILE_PATH}")
+            new_items_added = len(archive_store.add_items(items_to_add))
+        else:
+            logging.info("No new supported media posts found or processed successfully. Data file not modified.")
+        total_items = len(archive_store)
+    if new_items_added:
+        event_broker.notify()
+    media_index.save()
+    return new_items_added, total_items
+
+def _advance_feed_state(pending_state, failed_feeds, deferred_feeds):
+    """
+    Moves a feed's validators/cursor forward only once all of its new posts are archived;
+    otherwise the next poll must see the full feed again so failed posts get retried.
+    """
+    for api_url, (validators, cursor) in pending_state.items():
+        if api_url in failed_feeds or api_url in deferred_feeds:
+            logging.info(f"Not advancing polling state for {api_url}; some posts were not archived this cycle.")
+            continue
+        feed_state.advance(api_url, validators, cursor)
+    feed_state.save()
+
+def _record_feed_polls(api_urls, results, candidates):
+    """Feeds each poll's outcome and new-post count to the scheduler so it can adapt that feed's interval."""
+    new_posts_by_feed = {}
+    for candidate in candidates:
+        new_posts_by_feed[candidate.feed] = new_posts_by_feed.get(candidate.feed, 0) + 1
+    for api_url, result in zip(api_urls, results):
+        feed_scheduler.record_poll(api_url, result.data is not None, result.status, new_posts_by_feed.get(api_url, 0))
+
+def _run_processing_cycle(api_urls=None):
+    """
+    Internal function to fetch, process, and save data. Handles locking.
+    Runs in three phases so data_lock is never held across network I/O:
+      1. snapshot the dedup keys (lock held briefly),
+      2. fetch feeds and mirror new posts (no lock),
+      3. commit new entries, dropping any another cycle added meanwhile (lock held briefly).
+    Polls api_urls (default: all configured feeds).
+    Returns a tuple: (success_flag, new_items_added, total_items_in_file, posts_checked_this_cycle)
+    """
+    api_urls = list(COMMUNITIES_API_URLS if api_urls is None else api_urls)
+    logging.info(f"Starting processing cycle for {len(api_urls)} feeds...")
+
+    # Phase 1: snapshot
+    with data_lock:
+        # Use (title, author) tuple for duplicate checking
+        existing_post_ids = archive_store.existing_keys()
+    # Posts already waiting in the mirror queue are retried from there, not picked up again
+    existing_post_ids.update(map(_dedup_hash, mirror_queue.keys()))
+    logging.info(f"Initialized duplicate check set with {len(existing_post_ids)} existing post IDs.")
+
+    # Phase 2: network work, no lock held
+    results = _fetch_feeds(api_urls, existing_post_ids)
+    all_posts_from_apis, pending_state = _collect_posts(api_urls, results)
+    processed_api_posts_count = sum(result.walked for result in results)
+    logging.info(f"Total new posts with supported media fetched across all APIs: {len(all_posts_from_apis)}. Processing...")
+
+    candidates, deferred_feeds, claimed = _claim_candidates(all_posts_from_apis, existing_post_ids)
+    _record_feed_polls(api_urls, results, candidates)
+    try:
+        # Rejected posts are dropped like unsupported ones, so their feeds still advance
+        candidates = _probe_candidates(candidates)
+        queued = mirror_queue.enqueue(candidates)
+        fileditch_links = _mirror_candidates(candidates)
+        items_to_add, failed_feeds = _merge_mirror_results(candidates, fileditch_links)
+        logging.info(f"Checked {processed_api_posts_count} posts fetched from APIs in this cycle.")
+
+        # Phase 3: commit
+        new_items_added, current_total_items = _commit_entries(items_to_add)
+        mirror_queue.record_results(candidates, fileditch_links)
+    finally:
+        _release_candidates(claimed)
+    if queued:
+        # Failed posts are safe in the durable queue and retried from there, so their feeds can move on
+        failed_feeds = set()
+
+    _advance_feed_state(pending_state, failed_feeds, deferred_feeds)
+
+    logging.debug(f"HTTP pool stats after cycle: {get_http_pool_stats()}")
+    return True, new_items_added, current_total_items, processed_api_posts_count
+
+# Mirror Job Queue (MirrorQueue)
+DEFAULT_MIRROR_QUEUE_PATH = os.path.join(os.path.dirname(DATA_FILE_PATH), 'mirror_queue.json')
+MIRROR_QUEUE_PATH = os.path.abspath(os.environ.get('APP_MIRROR_QUEUE_PATH', DEFAULT_MIRROR_QUEUE_PATH))
+
+JOB_QUEUED = 'queued'
+JOB_DOWNLOADING = 'downloading'
+JOB_UPLOADING = 'uploading'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+class MirrorQueue:
+    """
+    Posts waiting to be mirrored, persisted to a JSON file so pending work survives restarts.
+    A job moves queued -> downloading -> uploading -> done and is dropped once its entry is
+    committed. A failed attempt goes back to queued with exponential backoff; after
+    MIRROR_MAX_ATTEMPTS it is parked as failed (the dead-letter list) until requeued. Thread-safe.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._save_lock = threading.Lock()
+        self._jobs = {} # (title, author) -> job
+        self.completed = 0
+
+    def load(self, archive):
+        """Loads pending jobs, dropping any whose post is already in the archive."""
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            jobs = {}
+            for job in data.get('jobs', []) if isinstance(data, dict) else []:
+                if not isinstance(job, dict) or not all(job.get(k) for k in ('title', 'author', 'link')):
+                    continue
+                key = (job['title'], job['author'])
+                if key in archive:
+                    continue
+                if job.get('state') in (JOB_DOWNLOADING, JOB_UPLOADING):
+                    # Interrupted by a restart; the attempt never finished, so it isn't counted
+                    job['state'] = JOB_QUEUED
+                if job.get('state') in (JOB_QUEUED, JOB_FAILED):
+                    jobs[key] = job
+            with self._lock:
+                self._jobs = jobs
+            logging.info(f"Loaded {len(jobs)} pending mirror jobs from {self.filepath}")
+        except FileNotFoundError:
+            logging.info(f"Mirror queue file {self.filepath} not found. Starting with an empty queue.")
+        except Exception as e:
+            logging.error(f"Error loading mirror queue from {self.filepath}: {e}. Starting with an empty queue.")
+
+    def save(self):
+        """Writes the queue to disk (fsynced). Returns True on success."""
+        with self._save_lock:
+            with self._lock:
+                jobs = [dict(job) for job in self._jobs.values()]
+            try:
+                temp_filepath = self.filepath + ".tmp"
+                with open(temp_filepath, 'w', encoding='utf-8') as f:
+                    json.dump({"jobs": jobs}, f, indent=4, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_filepath, self.filepath)
+                return True
+            except Exception as e:
+                logging.error(f"Error saving mirror queue to {self.filepath}: {e}")
+                return False
+
+    @staticmethod
+    def _candidate(job):
+        return MirrorCandidate((job['title'], job['author']), job['title'], job['author'], job['link'], job.get('extension', ''), job.get('feed', ''), job.get('size'))
+
+    def keys(self):
+        """Returns the (title, author) keys of every pending or dead-lettered job."""
+        with self._lock:
+            return set(self._jobs)
+
+    def enqueue(self, candidates):
+        """Adds a job per new candidate, due immediately. Returns True once the queue is on disk."""
+        if not candidates:
+            return True
+        now = time.time()
+        with self._lock:
+            for candidate in candidates:
+                if candidate.key in self._jobs:
+                    continue
+                self._jobs[candidate.key] = {
+                    "title": candidate.title,
+                    "author": candidate.author,
+                    "link": candidate.link,
+                    "extension": candidate.extension,
+                    "feed": candidate.feed,
+                    "size": candidate.size,
+                    "state": JOB_QUEUED,
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                    "created": now,
+                    "last_error": None,
+                }
+        return self.save()
+
+    def set_state(self, key, state):
+        """Records a job's progress (downloading/uploading). Kept in memory only; a restart requeues the job."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                job['state'] = state
+
+    def record_results(self, candidates, fileditch_links):
+        """
+        Completes the jobs whose mirror succeeded (their entries must already be committed) and
+        schedules a retry, or dead-letters, the rest. Saves once for the whole batch.
+        """
+        now = time.time()
+        with self._lock:
+            for candidate, fileditch_link in zip(candidates, fileditch_links):
+                job = self._jobs.get(candidate.key)
+                if job is None:
+                    continue
+                if fileditch_link:
+                    job['state'] = JOB_DONE
+                    del self._jobs[candidate.key]
+                    self.completed += 1
+                    continue
+                job['attempts'] = job.get('attempts', 0) + 1
+                failed_stage = job['state'] if job['state'] in (JOB_DOWNLOADING, JOB_UPLOADING) else 'starting'
+                ERRORS.inc({JOB_DOWNLOADING: 'download', JOB_UPLOADING: 'upload'}.get(failed_stage, 'mirror'))
+                job['last_error'] = f"Attempt {job['attempts']} failed while {failed_stage}"
+                job['last_attempt_at'] = now
+                if job['attempts'] >= MIRROR_MAX_ATTEMPTS:
+                    job['state'] = JOB_FAILED
+                    logging.error(f"Giving up on '{candidate.title}' by {candidate.author} after {job['attempts']} attempts; moved to the dead-letter list.")
+                else:
+                    delay = min(MIRROR_RETRY_MAX_SECONDS, MIRROR_RETRY_BASE_SECONDS * 2 ** (job['attempts'] - 1)) * random.uniform(0.9, 1.1)
+                    job['state'] = JOB_QUEUED
+                    job['next_attempt_at'] = now + delay
+                    logging.info(f"Will retry '{candidate.title}' by {candidate.author} in {delay:.0f}s (attempt {job['attempts'] + 1} of {MIRROR_MAX_ATTEMPTS}).")
+            self._changed.notify_all()
+        self.save()
+
+    def due_jobs(self, limit, exclude=()):
+        """Returns MirrorCandidates for up to limit queued jobs whose backoff has expired, most overdue first."""
+        now = time.time()
+        with self._lock:
+            due = [job for key, job in self._jobs.items()
+                   if job['state'] == JOB_QUEUED and job['next_attempt_at'] <= now and key not in exclude]
+        due.sort(key=lambda job: job['next_attempt_at'])
+        return [self._candidate(job) for job in due[:limit]]
+
+    def seconds_until_due(self):
+        """Seconds until the next queued job is due (0 if one already is), or None if nothing is queued."""
+        with self._lock:
+            times = [job['next_attempt_at'] for job in self._jobs.values() if job['state'] == JOB_QUEUED]
+        if not times:
+            return None
+        return max(0.0, min(times) - time.time())
+
+    def wait(self, timeout=None):
+        """Blocks until jobs are added, rescheduled or requeued, or until timeout."""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def requeue_failed(self):
+        """Moves every dead-lettered job back to the queue with a fresh attempt budget. Returns the count."""
+        now = time.time()
+        with self._lock:
+            failed = [job for job in self._jobs.values() if job['state'] == JOB_FAILED]
+            for job in failed:
+                job['state'] = JOB_QUEUED
+                job['attempts'] = 0
+                job['next_attempt_at'] = now
+            self._changed.notify_all()
+        if failed:
+            self.save()
+        return len(failed)
+
+    def state_counts(self):
+        with self._lock:
+            counts = {JOB_QUEUED: 0, JOB_DOWNLOADING: 0, JOB_UPLOADING: 0, JOB_FAILED: 0}
+            for job in self._jobs.values():
+                counts[job['state']] = counts.get(job['state'], 0) + 1
+        return counts
+
+    def stats(self):
+        counts = self.state_counts()
+        with self._lock:
+            dead_letter = [{k: job.get(k) for k in ('title', 'author', 'link', 'attempts', 'last_error')}
+                           for job in self._jobs.values() if job['state'] == JOB_FAILED]
+        return dict(counts, completed=self.completed, dead_letter=dead_letter[:50])
+
+
+mirror_queue = MirrorQueue(MIRROR_QUEUE_PATH)
+
+def mirror_retry_pump():
+    """Thread target: retries queued mirror jobs as their backoff expires, independently of the feed cycles."""
+    logging.info("Mirror retry pump started.")
+    while True:
+        try:
+            delay = mirror_queue.seconds_until_due()
+            if delay is None or delay > 0:
+                mirror_queue.wait(delay)
+                continue
+            with _inflight_lock:
+                # Jobs a cycle is mirroring right now are left to that cycle
+                candidates = mirror_queue.due_jobs(MIRROR_WORKERS * 2, exclude=_inflight_post_ids)
+                claimed = {c.key for c in candidates}
+                _inflight_post_ids.update(claimed)
+            if not candidates:
+                mirror_queue.wait(MIRROR_RETRY_BASE_SECONDS)
+                continue
+            try:
+                logging.info(f"Retrying {len(candidates)} queued mirror jobs...")
+                fileditch_links = _mirror_candidates(candidates)
+                items_to_add, _ = _merge_mirror_results(candidates, fileditch_links)
+                new_items_added, total_items = _commit_entries(items_to_add)
+                mirror_queue.record_results(candidates, fileditch_links)
+                logging.info(f"Mirror retry batch complete. Added: {new_items_added}, Total: {total_items}")
+            finally:
+                _release_candidates(claimed)
+        except Exception as e:
+            ERRORS.inc('cycle')
+            logging.exception(f"!!! Unhandled exception in mirror_retry_pump loop: {e} !!!")
+            time.sleep(MIRROR_RETRY_BASE_SECONDS)
+
+
+# Live Events (EventBroker)
+class EventBroker:
+    """
+    Wakes /events streams when the archive grows and fans out job progress messages.
+    Archive entries are not copied here: streams read them from the archive snapshot by
+    position, which doubles as the SSE event id, so a reconnecting client can resume from
+    any point. Progress messages are kept in a short ring for streams between waits.
+    """
+
+    def __init__(self, max_streams, ring_size=256):
+        self._cond = threading.Condition()
+        self._messages = deque(maxlen=ring_size) # (seq, event, data)
+        self._seq = 0
+        self._max_streams = max_streams
+        self.streams = 0
+
+    def acquire_stream(self):
+        """Reserves a stream slot. Returns False when EVENT_MAX_STREAMS are already open."""
+        with self._cond:
+            if self.streams >= self._max_streams:
+                return False
+            self.streams += 1
+            return True
+
+    def release_stream(self):
+        with self._cond:
+            self.streams -= 1
+
+    @property
+    def sequence(self):
+        with self._cond:
+            return self._seq
+
+    def notify(self):
+        """Called after entries are committed to the archive."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def publish(self, event, data):
+        with self._cond:
+            self._seq += 1
+            self._messages.append((self._seq, event, data))
+            self._cond.notify_all()
+
+    def wait(self, position, seq, timeout):
+        """
+        Blocks until the archive holds more than `position` entries or messages newer than `seq`
+        arrive, or until timeout. Returns (messages, latest seq).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(archive_store) > position or self._seq > seq, timeout)
+            return [(event, data) for message_seq, event, data in self._messages if message_seq > seq], self._seq
+
+
+event_broker = EventBroker(EVENT_MAX_STREAMS)
+
+def _sse(event, data, event_id=None):
+    """Formats one Server-Sent Events frame with a JSON payload."""
+    frame = f"event: {event}\n"
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    return frame + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _event_stream(position):
+    """
+    Yields SSE frames for one client: archive entries after `position` as 'item' events (id =
+    archive position + 1), 'job' progress messages, and keepalive comments. Ends after
+    EVENT_STREAM_MAX_SECONDS; the client reconnects with Last-Event-ID and carries on.
+    """
+    deadline = time.monotonic() + EVENT_STREAM_MAX_SECONDS
+    seq = event_broker.sequence
+    messages = []
+    yield f"retry: {EVENT_KEEPALIVE_SECONDS * 1000}\n\n"
+    while True:
+        items = archive_store.snapshot()
+        frames = []
+        if len(items) - position > EVENT_REPLAY_LIMIT:
+            # Too far behind to replay; the client should reload instead
+            position = len(items)
+            frames.append(_sse('reset', {"total_items": position}, event_id=position))
+        while position < len(items):
+            frames.append(_sse('item', items[position].to_dict(), event_id=position + 1))
+            position += 1
+        frames.extend(_sse(event, data) for event, data in messages)
+        if frames:
+            yield ''.join(frames)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        messages, seq = event_broker.wait(position, seq, min(EVENT_KEEPALIVE_SECONDS, remaining))
+        if not messages and len(archive_store) <= position:
+            # A comment line keeps proxies from timing out the connection and surfaces dead clients
+            yield ": keepalive\n\n"
+
+
+# Feed Scheduler (FeedScheduler)
+class FeedScheduler:
+    """
+    Decides when each feed is polled. Every feed has its own interval, derived from its
+    smoothed new-post rate (aiming at roughly one new post per poll, growing at most 2x per
+    poll) and clamped to [FEED_MIN_INTERVAL_SECONDS, FEED_MAX_INTERVAL_SECONDS], with jitter, and exponential
+    backoff after errors (doubly so on 429). Manual requests mark every feed due and are
+    served by the next cycle the runner starts, so they never run a second concurrent cycle.
+    """
+
+    def __init__(self, api_urls):
+        self._cond = threading.Condition()
+        now = time.monotonic()
+        self._feeds = {url: {'interval': float(PROCESSING_INTERVAL_SECONDS), 'next_due': now, 'rate': None,
+                             'errors': 0, 'last_poll': None, 'polling': False, 'rerun': False} for url in api_urls}
+        self._cycles_started = 0
+        self._cycles_finished = 0
+        self._results = {} # cycle id -> result tuple, for manual requests waiting on it
+        self._cycle_started_at = {}
+        self.last_cycle_seconds = None
+        self._woken = False
+        self.has_runner = False
+
+    def attach_runner(self):
+        with self._cond:
+            self.has_runner = True
+
+    def detach_runner(self):
+        with self._cond:
+            self.has_runner = False
+            self._woken = True
+            self._cond.notify_all()
+
+    def wake(self):
+        """Makes a pending wait_for_due_feeds() return early (used at shutdown)."""
+        with self._cond:
+            self._woken = True
+            self._cond.notify_all()
+
+    def wait_for_due_feeds(self, timeout=None):
+        """Blocks until at least one feed is due. Returns the due feeds, or [] on timeout or wake()."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._woken:
+                    self._woken = False
+                    return []
+                now = time.monotonic()
+                due = [url for url, feed in self._feeds.items() if not feed['polling'] and feed['next_due'] <= now]
+                if due:
+                    return due
+                waiting = [feed['next_due'] for feed in self._feeds.values() if not feed['polling']]
+                wait = (min(waiting) - now) if waiting else None
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return []
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def begin_cycle(self, api_urls):
+        """Marks feeds as being polled and returns the new cycle's id, which is also its /process job id."""
+        with self._cond:
+            self._cycles_started += 1
+            cycle_id = self._cycles_started
+            self._cycle_started_at[cycle_id] = time.monotonic()
+            for url in api_urls:
+                if url in self._feeds:
+                    self._feeds[url]['polling'] = True
+        event_broker.publish('job', {"job_id": cycle_id, "state": "running", "feeds": len(api_urls)})
+        return cycle_id
+
+    def finish_cycle(self, cycle_id, api_urls, result):
+        with self._cond:
+            now = time.monotonic()
+            started = self._cycle_started_at.pop(cycle_id, None)
+            if started is not None:
+                self.last_cycle_seconds = now - started
+                CYCLE_SECONDS.observe(self.last_cycle_seconds)
+            for url in api_urls:
+                feed = self._feeds.get(url)
+                if feed is not None and feed['polling']:
+                    # record_poll() was never reached (cycle crashed); try again after the normal interval
+                    feed['polling'] = False
+                    feed['next_due'] = now if feed['rerun'] else now + feed['interval']
+                    feed['rerun'] = False
+            self._cycles_finished = max(self._cycles_finished, cycle_id)
+            self._results[cycle_id] = result
+            for old_id in [i for i in self._results if i <= cycle_id - 16]:
+                del self._results[old_id]
+            self._cond.notify_all()
+        success, new_items, total_items, posts_checked = result
+        event_broker.publish('job', {"job_id": cycle_id, "state": "done", "success": success, "new_items_added": new_items,
+                                     "total_items": total_items, "posts_checked": posts_checked})
+
+    def record_poll(self, api_url, ok, status, new_posts):
+        with self._cond:
+            feed = self._feeds.get(api_url)
+            if feed is None:
+                return
+            now = time.monotonic()
+            if not ok:
+                feed['errors'] += 2 if status == 429 else 1
+                delay = min(FEED_MAX_INTERVAL_SECONDS, feed['interval'] * (2 ** min(feed['errors'], 8)))
+                logging.info(f"Backing off {api_url} for ~{delay:.0f}s after error (status {status}, {feed['errors']} strikes).")
+            else:
+                feed['errors'] = 0
+                if feed['last_poll'] is not None:
+                    observed = new_posts / max(1.0, now - feed['last_poll'])
+                    feed['rate'] = observed if feed['rate'] is None else FEED_RATE_SMOOTHING * observed + (1 - FEED_RATE_SMOOTHING) * feed['rate']
+                    target = (1.0 / feed['rate']) if feed['rate'] > 0 else FEED_MAX_INTERVAL_SECONDS
+                    # Speed up immediately when posts arrive, but slow down at most 2x per quiet poll
+                    target = min(target, feed['interval'] * 2)
+                    feed['interval'] = float(min(FEED_MAX_INTERVAL_SECONDS, max(FEED_MIN_INTERVAL_SECONDS, target)))
+                feed['last_poll'] = now
+                delay = feed['interval']
+            delay *= 1 + random.uniform(-FEED_INTERVAL_JITTER, FEED_INTERVAL_JITTER)
+            feed['polling'] = False
+            feed['next_due'] = now if feed['rerun'] else now + delay
+            feed['rerun'] = False
+            self._cond.notify_all()
+
+    def request_run(self):
+        """Marks every feed due now. Returns a ticket for wait_for_result(); the serving cycle's id is ticket + 1."""
+        with self._cond:
+            now = time.monotonic()
+            for feed in self._feeds.values():
+                if feed['polling']:
+                    feed['rerun'] = True
+                else:
+                    feed['next_due'] = now
+            self._cond.notify_all()
+            return self._cycles_started
+
+    def wait_for_result(self, ticket, timeout=None):
+        """Waits for the first cycle started after the ticket was issued. Returns its result, or None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._cycles_finished > ticket, timeout):
+                return None
+            return self._results.get(ticket + 1)
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            return {url: {
+                'interval_seconds': round(feed['interval'], 1),
+                'due_in_seconds': 0 if feed['polling'] else round(max(0.0, feed['next_due'] - now), 1),
+                'new_posts_per_hour': None if feed['rate'] is None else round(feed['rate'] * 3600, 2),
+                'error_strikes': feed['errors'],
+                'polling': feed['polling'],
+            } for url, feed in self._feeds.items()}
+
+
+feed_scheduler = FeedScheduler(COMMUNITIES_API_URLS)
+
+
+# Background Processing Thread (background_processor)
+def background_processor():
+    """Target function for the background thread. Polls feeds as the scheduler makes them due."""
+    logging.info("Background processing thread started.")
+    feed_scheduler.attach_runner()
+    while True:
+        due_urls = feed_scheduler.wait_for_due_feeds()
+        if not due_urls:
+            continue
+        logging.info(f"Background thread waking up for processing cycle ({len(due_urls)} feeds due).")
+        _run_scheduled_cycle(feed_scheduler.begin_cycle(due_urls), due_urls)
+
+def _run_scheduled_cycle(cycle_id, api_urls):
+    """Runs a cycle begun with feed_scheduler.begin_cycle() and always reports it finished."""
+    result = (False, 0, len(archive_store), 0)
+    try:
+        # Need app context if background thread interacts with Flask extensions,
+        # but here it only calls _run_processing_cycle which doesn't directly.
+        # However, keeping it is harmless and good practice if dependencies change.
+        with app.app_context():
+             result = _run_processing_cycle(api_urls)
+        success, added, total, checked = result
+        if success:
+             logging.info(f"Background processing cycle complete. Added: {added}, Total: {total}, Checked: {checked}")
+        else:
+             logging.warning("Background processing cycle finished with errors (check logs above).")
+    except Exception as e:
+        # Log the full traceback for unexpected errors in the loop
+        ERRORS.inc('cycle')
+        logging.exception(f"!!! Unhandled exception in background_processor loop: {e} !!!")
+    finally:
+        feed_scheduler.finish_cycle(cycle_id, api_urls, result)
+
+
+# Asyncio Ingestion Engine (AsyncIngestionEngine)
+# asyncio and aiohttp are imported by _import_async_engine() when this engine starts, keeping them off the
+# startup path of the thread engine and of web workers.
+asyncio = None
+aiohttp = None
+
+def _import_async_engine():
+    """Imports the modules AsyncIngestionEngine needs. Returns False if aiohttp is not installed."""
+    global asyncio, aiohttp
+    import asyncio
+    try:
+        import aiohttp
+    except ImportError:
+        aiohttp = None
+        return False
+    return True
+
+class AsyncIngestionEngine:
+    """
+    Alternative to background_processor that runs feed polling, downloads and uploads as
+    tasks on one event loop. Media is streamed from the source response straight into the
+    FileDitch request body. Shares the archive store, feed state and commit path with the
+    thread engine, so the web side reads the same archive either way.
+    """
+
+    def __init__(self):
+        _import_async_engine()
+        self._loop = None
+        self._session = None
+        self._stop_event = None
+        self._ready = threading.Event()
+        self._tasks = set()
+        self._mirror_semaphore = None
+        self._host_semaphores = {}
+
+    def run(self):
+        """Thread target: runs the event loop until stop() is called."""
+        logging.info("Asyncio ingestion engine started.")
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            logging.exception(f"!!! Asyncio ingestion engine crashed: {e} !!!")
+        finally:
+            self._ready.clear()
+        logging.info("Asyncio ingestion engine stopped.")
+
+    def stop(self):
+        """Requests shutdown from any thread; in-flight fetches and mirrors are cancelled."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._shutdown)
+        feed_scheduler.wake()
+
+    def _shutdown(self):
+        self._stop_event.set()
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._mirror_semaphore = asyncio.Semaphore(max(1, ASYNC_MIRROR_CONCURRENCY))
+        timeout = aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+        connector = aiohttp.TCPConnector(limit=ASYNC_MAX_CONNECTIONS)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            self._session = session
+            self._ready.set()
+            feed_scheduler.attach_runner()
+            try:
+                while not self._stop_event.is_set():
+                    # The scheduler blocks on a threading.Condition, so wait for it off the loop
+                    due_urls = await self._loop.run_in_executor(None, feed_scheduler.wait_for_due_feeds)
+                    if not due_urls or self._stop_event.is_set():
+                        continue
+                    cycle_id = feed_scheduler.begin_cycle(due_urls)
+                    result = (False, 0, len(archive_store), 0)
+                    try:
+                        result = await self.run_cycle(due_urls)
+                        success, added, total, checked = result
+                        logging.info(f"Async processing cycle complete. Added: {added}, Total: {total}, Checked: {checked}")
+                    except asyncio.CancelledError:
+                        if self._stop_event.is_set():
+                            break
+                    except Exception as e:
+                        ERRORS.inc('cycle')
+                        logging.exception(f"!!! Unhandled exception in async processing cycle: {e} !!!")
+                    finally:
+                        feed_scheduler.finish_cycle(cycle_id, due_urls, result)
+            finally:
+                feed_scheduler.detach_runner()
+
+    def _host_semaphore(self, role, url, limit):
+        key = (role, (urlparse(url).hostname or '').lower())
+        semaphore = self._host_semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, limit))
+            self._host_semaphores[key] = semaphore
+        return semaphore
+
+    async def run_cycle(self, api_urls=None):
+        """Async counterpart of _run_processing_cycle(); same phases and return value."""
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            logging.info("Starting async processing cycle...")
+            loop = asyncio.get_running_loop()
+            # Lock-taking and disk work runs on the default executor so the loop never blocks on data_lock
+            existing_post_ids = await loop.run_in_executor(None, self._snapshot_keys)
+
+            api_urls = list(COMMUNITIES_API_URLS if api_urls is None else api_urls)
+            results = await asyncio.gather(*(self._fetch(api_url, existing_post_ids) for api_url in api_urls))
+            all_posts_from_apis, pending_state = _collect_posts(api_urls, results)
+            processed_api_posts_count = sum(result.walked for result in results)
+
+            candidates, deferred_feeds, claimed = _claim_candidates(all_posts_from_apis, existing_post_ids)
+            _record_feed_polls(api_urls, results, candidates)
+            try:
+                if PROBE_ENABLED and candidates:
+                    probe_semaphore = asyncio.Semaphore(max(1, PROBE_CONCURRENCY))
+                    probes = await asyncio.gather(*(self._probe(c.link, probe_semaphore) for c in candidates))
+                    candidates = media_prober.vet(candidates, probes)
+                queued = await loop.run_in_executor(None, mirror_queue.enqueue, candidates)
+                if candidates:
+                    logging.info(f"Mirroring {len(candidates)} new posts with up to {ASYNC_MIRROR_CONCURRENCY} concurrent tasks...")
+                # Tasks queue on the mirror semaphore in creation order, so the smallest transfers go first
+                order = sorted(range(len(candidates)), key=lambda i: _transfer_priority(candidates[i]))
+                uploaded_before, started = transfer_scheduler.uploaded_bytes(), time.perf_counter()
+                links = await asyncio.gather(*(self._mirror(candidates[i].link, self._stage_reporter(candidates[i])) for i in order))
+                fileditch_links = [None] * len(candidates)
+                for i, link in zip(order, links):
+                    fileditch_links[i] = link
+                if candidates:
+                    _log_transfer_throughput(len(candidates), uploaded_before, started)
+                items_to_add, failed_feeds = _merge_mirror_results(candidates, fileditch_links)
+                new_items_added, current_total_items = await loop.run_in_executor(None, _commit_entries, items_to_add)
+                await loop.run_in_executor(None, mirror_queue.record_results, candidates, fileditch_links)
+            finally:
+                _release_candidates(claimed)
+            if queued:
+                failed_feeds = set() # Failed posts are retried from the mirror queue
+
+            await loop.run_in_executor(None, _advance_feed_state, pending_state, failed_feeds, deferred_feeds)
+            return True, new_items_added, current_total_items, processed_api_posts_count
+        finally:
+            self._tasks.discard(task)
+
+    @staticmethod
+    def _snapshot_keys():
+        with data_lock:
+            existing_post_ids = archive_store.existing_keys()
+        existing_post_ids.update(map(_dedup_hash, mirror_queue.keys()))
+        return existing_post_ids
+
+    @staticmethod
+    def _stage_reporter(candidate):
+        return lambda state: mirror_queue.set_state(candidate.key, state)
+
+    async def _fetch(self, api_url, existing_post_ids=()):
+        """Async counterpart of fetch_communities_data(); retries connection errors and 429/5xx with backoff."""
+        started = time.perf_counter()
+        result = await self._fetch_feed(api_url, existing_post_ids)
+        _record_fetch(api_url, result, time.perf_counter() - started)
+        return result
+
+    async def _fetch_feed(self, api_url, existing_post_ids):
+        headers = dict(COMMUNITIES_HEADERS)
+        # aiohttp only decodes br/zstd when optional codecs are installed
+        headers['accept-encoding'] = 'gzip, deflate'
+        headers.update(feed_state.conditional_headers(api_url))
+        logging.info(f"Attempting to fetch data from: {api_url}")
+        status = None
+        for attempt in range(HTTP_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(HTTP_BACKOFF_FACTOR * (2 ** (attempt - 1)))
+            try:
+                async with self._session.get(api_url, headers=headers) as response:
+                    status = response.status
+                    if status == 304:
+                        logging.info(f"Feed not modified since last poll: {api_url}")
+                        return FeedResult(FEED_NOT_MODIFIED, 304, None)
+                    if status in RETRY_STATUS_CODES and attempt < HTTP_RETRIES:
+                        logging.warning(f"Fetch for {api_url} returned {status}; retrying.")
+                        continue
+                    if status >= 400:
+                        body = await response.text(errors='replace')
+                        if status in [401, 403]:
+                            logging.error("Received 401/403 Unauthorized/Forbidden error. Check your CW_API_KEY, CW_API_SECRET, CW_XSRF_TOKEN environment variables.")
+                        logging.error(f"HTTP error occurred for {api_url}. Status Code: {status}, Response: {body[:200]}...")
+                        return FeedResult(None, status, None)
+                    validators = {
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                    }
+                    collector = _FeedPostCollector(api_url, existing_post_ids)
+                    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        if collector.feed(chunk):
+                            break
+                    posts = collector.close()
+                    return FeedResult(posts, status, validators, collector.cursor, collector.walked)
+            except asyncio.TimeoutError:
+                logging.error(f"Timeout occurred while fetching data from {api_url} (connect {CONNECT_TIMEOUT}s, read {READ_TIMEOUT}s).")
+            except aiohttp.ClientError as e:
+                logging.error(f"Network error fetching data from {api_url}: {e}")
+            except ValueError as json_err:
+                logging.error(f"Error decoding JSON response from {api_url}. Error: {json_err}")
+                return FeedResult(None, status, None)
+        return FeedResult(None, status, None)
+
+    async def _probe(self, file_url, semaphore):
+        """Async counterpart of MediaProber.probe()."""
+        reason = media_prober.cached_rejection(file_url)
+        if reason is not None:
+            PROBES.inc('cached')
+            return ProbeResult(False, reason, None, None)
+        if media_index.lookup_url(file_url):
+            return ProbeResult(True, 'ok', None, None)
+        async with semaphore:
+            try:
+                async with self._session.head(file_url, headers=_download_headers(file_url), allow_redirects=True) as r:
+                    status, headers = r.status, r.headers
+                if status in PROBE_HEAD_FALLBACK_STATUSES:
+                    range_headers = dict(_download_headers(file_url), Range='bytes=0-0')
+                    async with self._session.get(file_url, headers=range_headers) as r:
+                        status, headers = r.status, r.headers
+                        r.close() # Only the headers are needed; drop the connection rather than read a full body
+                result = _probe_verdict(status, headers)
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                logging.warning(f"Probe failed for {file_url}: {e!r}. Mirroring it unverified.")
+                result = ProbeResult(True, 'unverified', None, None)
+        return media_prober.record(file_url, result)
+
+    async def _mirror(self, file_url, on_stage=None):
+        """
+        Async counterpart of upload_to_fileditch(): returns the FileDitch link, or None on any failure,
+        so one bad post never aborts the cycle's gather() and is retried from the mirror queue instead.
+        """
+        try:
+            return await self._transfer(file_url, on_stage)
+        except Exception as e:
+            logging.error(f"An unexpected error occurred while mirroring {file_url}: {e}", exc_info=True)
+            return None
+
+    async def _transfer(self, file_url, on_stage=None):
+        """Mirrors one media URL; the download is streamed into the upload body."""
+        existing_link = media_index.lookup_url(file_url)
+        if existing_link:
+            logging.info(f"Media already on FileDitch (same URL), reusing {existing_link} for {file_url}")
+            return existing_link
+        if media_spool is not None and _spool_eligible(file_url):
+            # Spooled transfers are file I/O plus blocking HTTP, so they run on the thread path
+            async with self._mirror_semaphore:
+                return await asyncio.get_running_loop().run_in_executor(None, upload_to_fileditch, file_url, on_stage)
+        async with self._mirror_semaphore, \
+                self._host_semaphore('source', file_url, MIRROR_PER_HOST_LIMIT), \
+                self._host_semaphore('upload', FILEDITCH_UPLOAD_URL, FILEDITCH_CONCURRENCY):
+            stage = "download"
+            started = time.perf_counter()
+            try:
+                logging.info(f"Attempting to download: {file_url}")
+                if on_stage:
+                    on_stage(JOB_DOWNLOADING)
+                async with self._session.get(file_url, headers=_download_headers(file_url)) as r:
+                    if r.status >= 400:
+                        logging.error(f"HTTP error occurred during download for {file_url}. Status Code: {r.status}")
+                        return None
+                    filename = _upload_filename(file_url, r.headers.get('Content-Disposition'))
+                    mime_type = _upload_mime_type(filename, file_url)
+
+                    # Same hashing strategy as _upload_to_fileditch: small files are checked before uploading
+                    hasher = hashlib.sha256()
+                    uploaded = {'size': 0}
+                    chunks = r.content.iter_chunked(STREAM_CHUNK_SIZE)
+                    prefix, complete = [], False
+                    if not (r.content_length is not None and r.content_length > MEDIA_HASH_BUFFER_BYTES):
+                        buffered = 0
+                        while buffered <= MEDIA_HASH_BUFFER_BYTES:
+                            try:
+                                chunk = await chunks.__anext__()
+                            except StopAsyncIteration:
+                                complete = True
+                                break
+                            prefix.append(chunk)
+                            buffered += len(chunk)
+                    if complete:
+                        data = b''.join(prefix)
+                        digest = hashlib.sha256(data).hexdigest()
+                        existing_link = media_index.lookup_content(digest, len(data))
+                        if existing_link:
+                            logging.info(f"Media already on FileDitch (same content), reusing {existing_link} for {file_url}")
+                            media_index.record(file_url, existing_link, digest, len(data))
+                            return existing_link
+
+                    async def upload_body():
+                        for chunk in prefix:
+                            hasher.update(chunk)
+                            uploaded['size'] += len(chunk)
+                            await asyncio.sleep(transfer_scheduler.reserve(len(chunk), file_url, upload=True))
+                            yield chunk
+                        if not complete:
+                            async for chunk in chunks:
+                                hasher.update(chunk)
+                                uploaded['size'] += len(chunk)
+                                await asyncio.sleep(transfer_scheduler.reserve(len(chunk), file_url, upload=True))
+                                yield chunk
+
+                    form = aiohttp.FormData()
+                    form.add_field('files[]', upload_body(), filename=filename, content_type=mime_type)
+
+                    stage = "upload"
+                    logging.info(f"Uploading '{filename}' (from {file_url}, type: {mime_type}) to {FILEDITCH_UPLOAD_URL}...")
+                    if on_stage:
+                        on_stage(JOB_UPLOADING)
+                    upload_started = time.perf_counter()
+                    DOWNLOAD_SECONDS.observe(upload_started - started, 'async')
+                    upload_timeout = aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=UPLOAD_READ_TIMEOUT)
+                    async with self._session.post(FILEDITCH_UPLOAD_URL, data=form, timeout=upload_timeout) as upload_response:
+                        if upload_response.status >= 400:
+                            body = await upload_response.text(errors='replace')
+                            logging.error(f"HTTP error occurred during upload for {file_url}. Status Code: {upload_response.status}, Response: {body[:200]}...")
+                            return None
+                        try:
+                            upload_data = await upload_response.json(content_type=None)
+                        except ValueError:
+                            body = await upload_response.text(errors='replace')
+                            logging.error(f"Error decoding FileDitch JSON response. Status: {upload_response.status}. Response text: {body[:200]}...")
+                            return None
+                        fileditch_link = _parse_fileditch_response(upload_data)
+                        if fileditch_link:
+                            media_index.record(file_url, fileditch_link, hasher.hexdigest(), uploaded['size'])
+                            _record_upload('async', time.perf_counter() - upload_started, uploaded['size'])
+                        return fileditch_link
+            except asyncio.TimeoutError:
+                logging.error(f"Timeout occurred during {stage} for URL: {file_url}")
+                return None
+            except aiohttp.ClientError as e:
+                logging.error(f"Network error during {stage} for {file_url}: {e}")
+                return None
+
+
+# Process Roles (ingestion leader, web followers)
+async_engine = None # Set at startup when INGESTION_ENGINE=asyncio
+processor_thread = None
+process_role = 'standalone' # 'ingest' or 'web' once __main__ has started; imported modules run standalone
+ingestion_lease = _FileLock(INGEST_LEASE_PATH)
+
+def _start_ingestion():
+    """Turns this process into the ingestion leader: loads the writable state and starts the engine threads."""
+    global async_engine, processor_thread, process_role
+    process_role = 'ingest'
+    with data_lock:
+        archive_store.read_only = False
+        archive_store.load()
+    archive_store.preload()
+    startup_timer.mark('archive')
+    feed_state.load()
+    media_index.load(archive_store.snapshot)
+    mirror_queue.load(archive_store)
+    event_broker.notify()
+    startup_timer.mark('state')
+
+    if INGESTION_ENGINE == 'asyncio' and not _import_async_engine():
+        logging.error("INGESTION_ENGINE=asyncio requires the 'aiohttp' package. Falling back to the thread engine.")
+    elif INGESTION_ENGINE not in ('thread', 'asyncio'):
+        logging.warning(f"Unknown INGESTION_ENGINE '{INGESTION_ENGINE}'. Using the thread engine.")
+
+    if INGESTION_ENGINE == 'asyncio' and aiohttp is not None:
+        async_engine = AsyncIngestionEngine()
+        processor_thread = threading.Thread(target=async_engine.run, name="AsyncIngestion", daemon=True)
+    else:
+        processor_thread = threading.Thread(target=background_processor, name="BackgroundProcessor", daemon=True)
+    processor_thread.start()
+    logging.info("Background processing thread initiated.")
+    threading.Thread(target=mirror_retry_pump, name="MirrorRetryPump", daemon=True).start()
+    threading.Thread(target=control_watcher, name="ControlWatcher", daemon=True).start()
+    startup_timer.mark('engine')
+
+def archive_follower():
+    """
+    Thread target for web workers: picks up archive changes from the version stamp and, unless
+    APP_ROLE=web, takes over ingestion when the lease holder goes away.
+    """
+    logging.info(f"Following the archive (polling every {ARCHIVE_POLL_SECONDS}s).")
+    next_lease_attempt = time.monotonic() + LEASE_RETRY_SECONDS
+    while True:
+        time.sleep(ARCHIVE_POLL_SECONDS)
+        try:
+            with data_lock:
+                added = archive_store.refresh()
+            if added:
+                logging.info(f"Picked up {added} new archive entries from the ingestion process.")
+                event_broker.notify()
+        except Exception as e:
+            ERRORS.inc('follower')
+            logging.exception(f"Error refreshing the archive from storage: {e}")
+        if APP_ROLE != 'web' and time.monotonic() >= next_lease_attempt:
+            next_lease_attempt = time.monotonic() + LEASE_RETRY_SECONDS
+            if ingestion_lease.acquire(blocking=False):
+                logging.info("Acquired the ingestion lease; this process takes over ingestion.")
+                _start_ingestion()
+                return
+
+CONTROL_COMMANDS = ('process', 'retry')
+
+def _forward_to_leader(command):
+    """Asks the ingestion process to run a command by dropping a file in CONTROL_DIR. Returns True on success."""
+    try:
+        os.makedirs(CONTROL_DIR, exist_ok=True)
+        with open(os.path.join(CONTROL_DIR, command), 'w', encoding='utf-8') as f:
+            f.write(str(os.getpid()))
+        return True
+    except OSError as e:
+        logging.error(f"Could not forward '{command}' to the ingestion process: {e}")
+        return False
+
+def control_watcher():
+    """Thread target for the ingestion leader: runs commands web workers forwarded through CONTROL_DIR."""
+    while True:
+        for command in CONTROL_COMMANDS:
+            try:
+                os.remove(os.path.join(CONTROL_DIR, command))
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logging.error(f"Error reading forwarded command '{command}': {e}")
+                continue
+            if command == 'process':
+                logging.info("Processing requested by a web worker.")
+                feed_scheduler.request_run()
+            else:
+                logging.info(f"Requeued {mirror_queue.requeue_failed()} dead-lettered mirror jobs for a web worker.")
+        time.sleep(ARCHIVE_POLL_SECONDS)
+
+def _trigger_processing_cycle():
+    """
+    Runs all feeds as soon as possible and returns the job id: the id of the cycle serving the
+    request. With an ingestion engine running, the request is merged into that engine's next
+    cycle; otherwise a cycle is started on its own thread. Web workers forward the request to
+    the ingestion process and return None, as its cycle ids are not visible here.
+    """
+    if process_role == 'web':
+        _forward_to_leader('process')
+        return None
+    if feed_scheduler.has_runner:
+        return feed_scheduler.request_run() + 1
+    cycle_id = feed_scheduler.begin_cycle(COMMUNITIES_API_URLS)
+    threading.Thread(target=_run_scheduled_cycle, args=(cycle_id, COMMUNITIES_API_URLS), name=f"ManualCycle-{cycle_id}", daemon=True).start()
+    return cycle_id
+
+
+# Index Page Rendering
+class RenderCache:
+    """
+    Small LRU of rendered HTML keyed on (archive version, view, page).
+    Entries for older archive versions are dropped as soon as a newer version is seen,
+    so a committed cycle invalidates every cached page without an explicit hook.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max(0, max_entries)
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _sync_version(self, version):
+        """Clears the cache when the archive has moved on. Assumes self._lock is held."""
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get_or_render(self, version, key, render):
+        """Returns the cached HTML for (version, key), calling render() on a miss."""
+        with self._lock:
+            self._sync_version(version)
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        # Render outside the lock; two concurrent misses just render the same page twice
+        html = render()
+        with self._lock:
+            if version == self._version and self.max_entries:
+                self._entries[key] = html
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return html
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "version": self._version, "hits": self.hits, "misses": self.misses}
+
+render_cache = RenderCache(INDEX_RENDER_CACHE_SIZE)
+
+def _positive_int_arg(name, default=None):
+    """Returns a positive integer query parameter, or default when missing/invalid."""
+    try:
+        value = int(request.args.get(name, ''))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+def _index_page(items, page, anchor):
+    """
+    Returns (rows, next_page) for a newest-first page of the archive, rows as entry dicts for the templates.
+    Pages are counted back from `anchor` (the archive length when the first page was shown),
+    so items committed while the user scrolls don't shift later pages. The archive is append-only.
+    """
+    end = min(anchor, len(items)) - (page - 1) * INDEX_PAGE_SIZE
+    if end <= 0:
+        return [], None
+    start = max(0, end - INDEX_PAGE_SIZE)
+    rows = [item.to_dict() for item in items[start:end][::-1]]
+    return rows, (page + 1 if start > 0 else None)
+
+# Flask Routes (index, process_posts_request, get_data)
+# These use DATA_FILE_PATH and call _run_processing_cycle, which use global vars
+@app.route('/', methods=['GET'])
+def index():
+    """Renders one page of the HTML table (newest first) from the in-memory archive snapshot."""
+    logging.info("Request received for index page ('/')")
+    # Lock-free read of the in-memory archive; never blocks on a running cycle
+    version, backup_data = archive_store.versioned_snapshot()
+    item_count = len(backup_data)
+    page = _positive_int_arg('page', 1)
+    anchor = _positive_int_arg('before', item_count)
+
+    def render():
+        rows, next_page = _index_page(backup_data, page, anchor)
+        return render_template('index.html', items=rows, item_count=item_count, page=page,
+                               next_page=next_page, anchor=anchor, page_size=INDEX_PAGE_SIZE,
+                               manual_timeout=MANUAL_PROCESS_TIMEOUT)
+
+    return render_cache.get_or_render(version, ('index', page, anchor), render)
+
+@app.route('/rows', methods=['GET'])
+def index_rows():
+    """Returns the table rows for one index page as an HTML fragment (used for infinite scroll)."""
+    version, backup_data = archive_store.versioned_snapshot()
+    page = _positive_int_arg('page', 1)
+    anchor = _positive_int_arg('before', len(backup_data))
+    rows, next_page = _index_page(backup_data, page, anchor)
+    html = render_cache.get_or_render(version, ('rows', page, anchor),
+                                      lambda: render_template('_rows.html', items=rows))
+    return Response(html, mimetype='text/html', headers={'X-Next-Page': str(next_page or '')})
+
+@app.route('/process', methods=['POST'])
+def process_posts_request():
+    """
+    Manual trigger endpoint. Merges into the next processing cycle and returns its job id at once;
+    progress is published as 'job' events on /events. With ?wait=1 it blocks and returns the cycle's result.
+    """
+    logging.info("Manual processing request received via /process endpoint...")
+    try:
+        job_id = _trigger_processing_cycle()
+        if job_id is None:
+            return jsonify({"message": "Processing forwarded to the ingestion process; new items will appear on /events.", "job_id": None}), 202
+        if request.args.get('wait') not in ('1', 'true'):
+            return jsonify({"message": "Processing queued; follow its progress on /events.", "job_id": job_id}), 202
+        result = feed_scheduler.wait_for_result(job_id - 1, timeout=MANUAL_PROCESS_TIMEOUT)
+        if result is None:
+            return jsonify({"message": "Processing is still running; new items will appear once it completes."}), 202
+        success, new_items, total_items, posts_checked = result
+        if success:
+            return jsonify({
+                "message": "Processing complete.",
+                "new_items_added": new_items,
+                "total_items_in_file": total_items,
+                "posts_checked_this_cycle": posts_checked
+            }), 200
+        else:
+            # Even if the cycle had internal errors (e.g., failed fetch),
+            # the request itself might succeed, but report the outcome.
+            # Return 500 only if the request handler itself fails catastrophically.
+             return jsonify({
+                 "message": "Processing cycle finished, potentially with errors (check server logs).",
+                 "new_items_added": new_items,
+                 "total_items_in_file": total_items,
+                 "posts_checked_this_cycle": posts_checked
+             }), 200 # Or maybe 500 if 'success=False' implies a server-side failure state
+    except Exception as e:
+        logging.exception(f"Error during manual /process request: {e}")
+        return jsonify({"message": "An unexpected error occurred during processing."}), 500
+
+def _parse_timestamp(value):
+    """Parses ISO 8601 (including the legacy '+00:00Z' form) or epoch seconds into an aware UTC datetime; None if invalid."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+        text = str(value).strip()
+        try:
+            return datetime.datetime.fromtimestamp(float(text), tz=datetime.timezone.utc)
+        except ValueError:
+            pass
+        if text.endswith('Z'):
+            text = text[:-1]
+            if len(text) <= 19: # No offset left, so the Z was the offset
+                text += '+00:00'
+        parsed = datetime.datetime.fromisoformat(text)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed
+    except (ValueError, OverflowError, OSError):
+        return None
+
+def _item_type(item):
+    """The entry's media type; older entries without one get it from the original link's extension."""
+    item_type = item.get('type')
+    if item_type:
+        return item_type
+    extension = os.path.splitext(urlparse(item.get('original_link') or '').path)[1].lower()
+    if extension in SUPPORTED_VIDEO_EXTENSIONS:
+        return 'video'
+    if extension in SUPPORTED_IMAGE_EXTENSIONS:
+        return 'image'
+    return None
+
+class DataQuery:
+    """Filters, field selection and pagination parsed from /data query parameters. Raises ValueError on bad input."""
+
+    def __init__(self, args):
+        self.type = (args.get('type') or '').strip().lower() or None
+        self.author = (args.get('author') or '').strip().lower() or None
+        self.community = (args.get('community') or '').strip().lower() or None
+        self.since = self._timestamp(args, 'since')
+        self.until = self._timestamp(args, 'until')
+        fields = args.get('fields')
+        self.fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+        self.paginated = any(k in args for k in ('limit', 'offset', 'cursor'))
+        self.limit = self._int(args, 'limit', 100)
+        if not 1 <= self.limit <= DATA_PAGE_MAX_LIMIT:
+            raise ValueError(f"'limit' must be between 1 and {DATA_PAGE_MAX_LIMIT}")
+        self.offset = self._int(args, 'offset', 0)
+        self.cursor = self._int(args, 'cursor', None)
+        if self.offset < 0 or (self.cursor is not None and self.cursor < 0):
+            raise ValueError("'offset' and 'cursor' must not be negative")
+
+    @staticmethod
+    def _int(args, name, default):
+        value = args.get(name)
+        if value is None or value == '':
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"'{name}' must be an integer")
+
+    @staticmethod
+    def _timestamp(args, name):
+        value = args.get(name)
+        if not value:
+            return None
+        parsed = _parse_timestamp(value)
+        if parsed is None:
+            raise ValueError(f"'{name}' must be an ISO 8601 timestamp or epoch seconds")
+        return parsed
+
+    @property
+    def filtered(self):
+        return bool(self.type or self.author or self.community or self.since or self.until)
+
+    def matches(self, item):
+        """Checks an ArchiveItem against the filters."""
+        if self.type and (item.type or _item_type(item)) != self.type:
+            return False
+        if self.author and (item.author or '').strip().lower() != self.author:
+            return False
+        if self.community and (item.community or '').lower() != self.community:
+            return False
+        if self.since or self.until:
+            timestamp = _parse_timestamp(item.get('processed_timestamp'))
+            if timestamp is None or (self.since and timestamp < self.since) or (self.until and timestamp > self.until):
+                return False
+        return True
+
+    def project(self, item):
+        entry = item.to_dict()
+        if self.fields is None:
+            return entry
+        return {field: entry[field] for field in self.fields if field in entry}
+
+def _matching_positions(query, items, start=0, limit=None):
+    """
+    Archive positions from start on matching query's filters, oldest first; uses the storage backend's
+    indexes when it has them. Without filters this is just range(start, len(items)). limit is how many
+    positions the caller will use at most, so an indexed backend can stop there.
+    """
+    if not query.filtered:
+        return range(start, len(items))
+    positions = archive_store.storage.filter_positions(query, len(items), start, limit)
+    if positions is not None:
+        return positions
+    return (position for position in range(start, len(items)) if query.matches(items[position]))
+
+def _stream_json_array(rows, compress):
+    """Yields a JSON array in chunks of DATA_STREAM_BATCH rows, gzip-compressed if requested."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None # wbits=31: gzip container
+    def encode(text):
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+    yield encode('[')
+    batch = []
+    first = True
+    for row in rows:
+        batch.append(json.dumps(row, ensure_ascii=False))
+        if len(batch) >= DATA_STREAM_BATCH:
+            chunk = encode(('' if first else ',') + ','.join(batch))
+            first = False
+            batch = []
+            if chunk:
+                yield chunk
+    if batch:
+        yield encode(('' if first else ',') + ','.join(batch))
+    tail = encode(']')
+    if compressor:
+        tail += compressor.flush()
+    yield tail
+
+@app.route('/data', methods=['GET'])
+def get_data():
+    """
+    Returns archived items as JSON, oldest first.
+    Without limit/offset/cursor the (optionally filtered) archive is streamed as a raw array.
+    With them, one page is returned as {"items", "next_cursor", "total_items"}; pass next_cursor
+    back as cursor to continue. Filters: type, author, community, since/until (processed_timestamp);
+    fields=a,b selects keys. Responses carry a strong ETag tied to the archive content, the same in every worker process.
+    """
+    logging.info("Request received for /data endpoint")
+    try:
+        query = DataQuery(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    items = archive_store.snapshot()
+    compress = request.accept_encodings.quality('gzip') > 0
+    query_hash = hashlib.sha1(urlencode(sorted(request.args.items(multi=True))).encode('utf-8')).hexdigest()[:12]
+    # Strong ETags must differ per encoding
+    etag = f"{archive_store.content_tag(items)}-{query_hash}{'-gz' if compress else ''}"
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if request.if_none_match and request.if_none_match.contains_weak(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    if query.paginated:
+        start = query.cursor if query.cursor is not None else 0
+        to_skip = query.offset if query.cursor is None else 0
+        if not query.filtered:
+            # Every position matches, so an offset is a position too: O(page), not O(offset)
+            start, to_skip = start + to_skip, 0
+        page = []
+        next_cursor = None
+        # One past the page tells whether there is a next page
+        for position in _matching_positions(query, items, start, to_skip + query.limit + 1):
+            if to_skip:
+                to_skip -= 1
+                continue
+            if len(page) == query.limit:
+                next_cursor = str(position)
+                break
+            page.append(query.project(items[position]))
+        body = json.dumps({"items": page, "next_cursor": next_cursor, "total_items": len(items)}, ensure_ascii=False).encode('utf-8')
+        if compress:
+            body = gzip.compress(body, compresslevel=6, mtime=0) # No timestamp: same bytes for the same strong ETag
+            headers['Content-Encoding'] = 'gzip'
+        response = Response(body, mimetype='application/json', headers=headers)
+    else:
+        rows = (query.project(items[position]) for position in _matching_positions(query, items))
+        if compress:
+            headers['Content-Encoding'] = 'gzip'
+        response = Response(_stream_json_array(rows, compress), mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    return response
+
+@app.route('/events', methods=['GET'])
+def events():
+    """
+    Server-Sent Events stream of newly committed archive entries ('item', id = archive position + 1)
+    and /process job progress ('job'). Resumes after the Last-Event-ID header or ?after=<id>;
+    without either only new entries are sent.
+    """
+    total_items = len(archive_store)
+    position = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        position = total_items if position is None else min(max(int(position), 0), total_items)
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID and 'after' must be integers"}), 400
+    if not event_broker.acquire_stream():
+        return jsonify({"error": "Too many open event streams; retry later."}), 503, {'Retry-After': str(EVENT_KEEPALIVE_SECONDS)}
+    logging.info(f"Event stream opened (resuming after {position} of {total_items} items)")
+    response = Response(_event_stream(position), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response, even if the client left before the stream started
+    response.call_on_close(event_broker.release_stream)
+    return response
+
+@app.route('/queue/retry', methods=['POST'])
+def retry_failed_mirrors():
+    """Moves every dead-lettered mirror job back to the queue for another round of attempts."""
+    if process_role == 'web':
+        if not _forward_to_leader('retry'):
+            return jsonify({"error": "Could not reach the ingestion process."}), 503
+        return jsonify({"requeued": None, "message": "Retry forwarded to the ingestion process."}), 202
+    requeued = mirror_queue.requeue_failed()
+    logging.info(f"Requeued {requeued} dead-lettered mirror jobs via /queue/retry")
+    return jsonify({"requeued": requeued})
+
+def _cycle_utilization():
+    """Last cycle's duration as a fraction of the shortest feed interval (above 1 means cycles can't keep up)."""
+    intervals = [feed['interval_seconds'] for feed in feed_scheduler.stats().values()]
+    if feed_scheduler.last_cycle_seconds is None or not intervals:
+        return {}
+    return {(): round(feed_scheduler.last_cycle_seconds / max(1.0, min(intervals)), 4)}
+
+CallbackMetric('archive_items', "Entries in the archive.", (), lambda: {(): len(archive_store)})
+CallbackMetric('mirror_jobs', "Mirror queue depth by job state.", ('state',), lambda: {(state,): count for state, count in mirror_queue.state_counts().items()})
+CallbackMetric('event_streams', "Open /events streams.", (), lambda: {(): event_broker.streams})
+CallbackMetric('transfer_upload_bytes_per_second', f"FileDitch upload throughput over the last {TRANSFER_RATE_WINDOW_SECONDS}s.", (),
+               lambda: {(): round(transfer_scheduler.upload_rate())})
+CallbackMetric('ingestion_leader', "1 if this process holds the ingestion lease (or runs standalone).", (),
+               lambda: {(): int(process_role != 'web')})
+CallbackMetric('inflight_posts', "Posts currently being mirrored.", (), lambda: {(): len(_inflight_post_ids)})
+CallbackMetric('feed_interval_seconds', "Current polling interval of each feed.", ('feed',),
+               lambda: {(url,): feed['interval_seconds'] for url, feed in feed_scheduler.stats().items()})
+CallbackMetric('last_cycle_seconds', "Duration of the most recent processing cycle.", (),
+               lambda: {} if feed_scheduler.last_cycle_seconds is None else {(): round(feed_scheduler.last_cycle_seconds, 4)})
+CallbackMetric('cycle_interval_utilization', "Last cycle duration divided by the shortest feed interval.", (), _cycle_utilization)
+CallbackMetric('media_dedup_hits_total', "Uploads skipped because the media index already had the URL or content.", ('kind',),
+               lambda: {('url',): media_index.stats()['url_hits'], ('content',): media_index.stats()['hash_hits']}, metric_type='counter')
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Returns fetch, mirror, storage, lock and queue metrics in the Prometheus text format."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """Returns runtime statistics (HTTP connection pool reuse) as JSON."""
+    return jsonify({"role": process_role, "http_pools": get_http_pool_stats(), "feeds": feed_scheduler.stats(), "media_index": media_index.stats(),
+                    "render_cache": render_cache.stats(), "mirror_queue": mirror_queue.stats(), "event_streams": event_broker.streams,
+                    "spool": media_spool.stats() if media_spool is not None else None, "probe": media_prober.stats(),
+                    "transfers": transfer_scheduler.stats(), "startup": startup_timer.stats()})
+
+startup_timer.mark('module')
+
+# Main Execution
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['migrate-sqlite']:
+        sys.exit(migrate_to_sqlite(DATA_FILE_PATH, SQLITE_PATH))
+
+    # Ensure backup directory exists (uses DATA_FILE_PATH from env)
+    backup_dir = os.path.dirname(DATA_FILE_PATH)
+    try:
+        os.makedirs(backup_dir, exist_ok=True)
+        logging.info(f"Ensured backup directory exists: {backup_dir}")
+    except Exception as e:
+        logging.error(f"Could not create backup directory {backup_dir}: {e}. File operations might fail.")
+
+    template_dir = app.template_folder 
+    static_dir = app.static_folder   
+
+    if not os.path.exists(template_dir):
+        try:
+            os.makedirs(template_dir)
+            logging.info(f"Created missing 'templates' directory at {template_dir}. Ensure index.html is present.")
         except Exception as e:
             logging.warning(f"Could not create 'templates' directory: {e}. Ensure it exists manually.")
     elif not os.path.isfile(os.path.join(template_dir, 'index.html')):
@@ -575,13 +4537,41 @@ if __name__ == '__main__':
         except Exception as e:
             logging.warning(f"Could not create 'static' directory: {e}. Ensure it exists manually.")
 
-    processor_thread = threading.Thread(target=background_processor, name="BackgroundProcessor", daemon=True)
-    processor_thread.start()
-    logging.info("Background processing thread initiated.")
+    if APP_ROLE not in ('auto', 'web'):
+        logging.warning(f"Unknown APP_ROLE '{APP_ROLE}'. Using 'auto'.")
+    if APP_ROLE != 'web' and ingestion_lease.acquire(blocking=False):
+        logging.info("Acquired the ingestion lease; this process runs ingestion.")
+        _start_ingestion()
+    else:
+        logging.info("Running as a web worker; another process runs ingestion." if APP_ROLE != 'web' else "Running as a web worker (APP_ROLE=web).")
+        process_role = 'web'
+        with data_lock:
+            archive_store.read_only = True
+            archive_store.load()
+        startup_timer.mark('archive')
+        threading.Thread(target=archive_follower, name="ArchiveFollower", daemon=True).start()
 
     listen_host = os.environ.get('APP_HOST', '0.0.0.0')
     listen_port = int(os.environ.get('APP_PORT', 5000))
     waitress_threads = int(os.environ.get('WAITRESS_THREADS', 8)) # Default to 8 threads
+    reuse_port = os.environ.get('APP_REUSE_PORT', 'false').lower() in ('1', 'true', 'yes')
 
     logging.info(f"Starting Waitress server on http://{listen_host}:{listen_port} with {waitress_threads} threads...")
-    serve(app, host=listen_host, port=listen_port, threads=waitress_threads)
+    startup_timer.mark('server')
+    startup_timer.finish()
+    try:
+        if reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            # Several worker processes listen on the same port and the kernel spreads connections across them
+            listen_socket = socket.socket(socket.AF_INET6 if ':' in listen_host else socket.AF_INET, socket.SOCK_STREAM)
+            listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            listen_socket.bind((listen_host, listen_port))
+            serve(app, sockets=[listen_socket], threads=waitress_threads)
+        else:
+            if reuse_port:
+                logging.warning("APP_REUSE_PORT is not supported on this platform; binding normally.")
+            serve(app, host=listen_host, port=listen_port, threads=waitress_threads)
+    finally:
+        if async_engine is not None:
+            async_engine.stop()
+            processor_thread.join(timeout=10)
@@ -0,0 +1,446 @@
+"""
+Offline benchmark for the IP2Ditch pipeline and web endpoints.
+
+Starts local stand-ins for communities.win (newv2.json / hotv2.json feeds), a media CDN and
+FileDitch's upload.php, points app.py at them through its environment variables, then:
+  - runs _run_processing_cycle() at several mirror concurrencies and reports posts and bytes per second,
+  - serves the app with Waitress and measures GET / and GET /data at several archive sizes and
+    client concurrencies, reporting requests per second and latency percentiles.
+
+Nothing leaves the machine. Example:
+    python benchmark.py --posts 40 --feed-latency-ms 80 --error-rate 0.02 --concurrency 1,4,16
+    python benchmark.py --skip-cycles --archive-sizes 1000,50000 --json results.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+import concurrent.futures
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+
+class FakeServices:
+    """
+    One local HTTP server playing communities.win, the media CDN and FileDitch.
+    Each call to next_round() publishes a fresh batch of posts in every feed.
+    """
+
+    def __init__(self, communities, posts_per_feed, video_ratio, video_bytes, image_bytes,
+                 feed_latency, media_latency, upload_latency, error_rate, seed=1):
+        self.communities = communities
+        self.posts_per_feed = posts_per_feed
+        self.video_ratio = video_ratio
+        self.video_bytes = video_bytes
+        self.image_bytes = image_bytes
+        self.feed_latency = feed_latency
+        self.media_latency = media_latency
+        self.upload_latency = upload_latency
+        self.error_rate = error_rate
+        self.round = 0
+        self.upload_times = [] # perf_counter() at each completed upload, for time-to-mirror
+        self.counts = {'feed_requests': 0, 'media_requests': 0, 'probe_requests': 0, 'uploads': 0, 'injected_errors': 0, 'bytes_served': 0, 'bytes_uploaded': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._block = random.Random(seed).randbytes(1024 * 1024)
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="FakeServices", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def next_round(self):
+        with self._lock:
+            self.round += 1
+
+    def feed_urls(self):
+        urls = []
+        for community in self.communities:
+            urls.append(f"{self.base_url}/api/v2/post/newv2.json?community={community}")
+            urls.append(f"{self.base_url}/api/v2/post/hotv2.json?community={community}")
+        return urls
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.counts[key] += amount
+
+    def _fail(self):
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.counts['injected_errors'] += 1
+        return failed
+
+    def _posts(self, community, current_round):
+        """The newest posts first, as newv2.json lists them; the real feed schema, trimmed to what matters."""
+        posts = []
+        for round_number in range(current_round, max(0, current_round - 2), -1):
+            for i in range(self.posts_per_feed - 1, -1, -1):
+                video = (i % 100) < self.video_ratio * 100
+                name = f"{community}-r{round_number}-{i}.{'mp4' if video else 'jpg'}"
+                posts.append({
+                    "uuid": f"{community}-{round_number}-{i}",
+                    "id": round_number * 100000 + i,
+                    "title": f"Benchmark post {i} of round {round_number} in {community}",
+                    "author": f"user{i % 17}",
+                    "community": community,
+                    "link": f"{self.base_url}/media/{name}",
+                    "domain": "127.0.0.1",
+                    "type": "link",
+                    "score": i,
+                    "comments": 0,
+                    "created": 1700000000 + round_number * 1000 + i,
+                    "is_nsfw": False,
+                })
+        return posts
+
+    def _media_body(self, name, size):
+        """Synthetic media: the file name up front keeps every file's hash unique, then a repeated random block."""
+        prefix = name.encode('utf-8').ljust(64, b'\0')
+        return prefix, max(size, len(prefix))
+
+    def _handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_error(self, status=503):
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.startswith('/api/v2/post/'):
+                    services._count('feed_requests')
+                    time.sleep(services.feed_latency)
+                    if services._fail():
+                        return self._send_error()
+                    community = parse_qs(url.query).get('community', ['bench'])[0]
+                    posts = services._posts(community, services.round)
+                    if not url.path.endswith('newv2.json'):
+                        posts = sorted(posts, key=lambda post: -post['score'])
+                    return self._send_json(200, {"posts": posts, "count": len(posts)})
+                if url.path.startswith('/media/'):
+                    services._count('media_requests')
+                    time.sleep(services.media_latency)
+                    if services._fail():
+                        return self._send_error()
+                    name = url.path.rsplit('/', 1)[-1]
+                    prefix, size = services._media_body(name, services.video_bytes if name.endswith('.mp4') else services.image_bytes)
+                    start = 0
+                    range_header = self.headers.get('Range', '')
+                    if range_header.startswith('bytes=') and range_header.endswith('-'):
+                        start = min(int(range_header[6:-1] or 0), size)
+                        self.send_response(206)
+                        self.send_header('Content-Range', f"bytes {start}-{size - 1}/{size}")
+                    else:
+                        self.send_response(200)
+                    self.send_header('Content-Type', 'video/mp4' if name.endswith('.mp4') else 'image/jpeg')
+                    self.send_header('Content-Length', str(size - start))
+                    self.send_header('ETag', f'"{name}"')
+                    self.end_headers()
+                    position = start
+                    while position < size:
+                        if position < len(prefix):
+                            chunk = prefix[position:]
+                        else:
+                            offset = (position - len(prefix)) % len(services._block)
+                            chunk = services._block[offset:offset + min(size - position, len(services._block) - offset)]
+                        chunk = chunk[:size - position]
+                        self.wfile.write(chunk)
+                        position += len(chunk)
+                    services._count('bytes_served', size - start)
+                    return
+                self._send_error(404)
+
+            def do_HEAD(self):
+                url = urlparse(self.path)
+                if not url.path.startswith('/media/'):
+                    return self._send_error(404)
+                services._count('probe_requests')
+                time.sleep(services.media_latency)
+                name = url.path.rsplit('/', 1)[-1]
+                _, size = services._media_body(name, services.video_bytes if name.endswith('.mp4') else services.image_bytes)
+                self.send_response(200)
+                self.send_header('Content-Type', 'video/mp4' if name.endswith('.mp4') else 'image/jpeg')
+                self.send_header('Content-Length', str(size))
+                self.end_headers()
+
+            def do_POST(self):
+                if not self.path.startswith('/upload.php'):
+                    return self._send_error(404)
+                received = 0
+                if self.headers.get('Content-Length'):
+                    remaining = int(self.headers['Content-Length'])
+                    while remaining:
+                        chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                        if not chunk:
+                            break
+                        received += len(chunk)
+                        remaining -= len(chunk)
+                else: # chunked transfer encoding
+                    while True:
+                        size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            break
+                        received += len(self.rfile.read(size))
+                        self.rfile.readline()
+                time.sleep(services.upload_latency)
+                if services._fail():
+                    return self._send_error()
+                services._count('uploads')
+                services._count('bytes_uploaded', received)
+                with services._lock:
+                    services.upload_times.append(time.perf_counter())
+                upload_id = f"{services.round}-{services.counts['uploads']}"
+                return self._send_json(200, {"success": True, "files": [{"url": f"https://fileditch.example/{upload_id}.bin", "size": received}]})
+
+        return Handler
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def _latency_summary(latencies):
+    return {
+        'p50_ms': round(_percentile(latencies, 0.5) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+    }
+
+
+def bench_cycles(app, services, concurrencies, cycles):
+    """Runs processing cycles against fresh posts at each mirror concurrency."""
+    results = []
+    for concurrency in concurrencies:
+        app.MIRROR_WORKERS = concurrency
+        app.MIRROR_PER_HOST_LIMIT = concurrency
+        app.FILEDITCH_CONCURRENCY = concurrency
+        app._host_semaphores.clear()
+        durations = []
+        time_to_mirror = []
+        added_total = 0
+        bytes_before = services.counts['bytes_uploaded']
+        started = time.perf_counter()
+        for _ in range(cycles):
+            services.next_round()
+            cycle_started = time.perf_counter()
+            uploads_before = len(services.upload_times)
+            _, added, _, _ = app._run_processing_cycle(services.feed_urls())
+            durations.append(time.perf_counter() - cycle_started)
+            time_to_mirror.extend(t - cycle_started for t in services.upload_times[uploads_before:])
+            added_total += added
+        elapsed = time.perf_counter() - started
+        uploaded = services.counts['bytes_uploaded'] - bytes_before
+        result = {
+            'concurrency': concurrency,
+            'cycles': cycles,
+            'posts_added': added_total,
+            'posts_per_second': round(added_total / elapsed, 2),
+            'upload_mb_per_second': round(uploaded / elapsed / 1e6, 2),
+            'cycle_mean_s': round(statistics.mean(durations), 3),
+            'cycle_max_s': round(max(durations), 3),
+            'time_to_mirror_p50_s': round(_percentile(time_to_mirror, 0.5) or 0, 3),
+            'queued_for_retry': app.mirror_queue.state_counts()[app.JOB_QUEUED],
+        }
+        results.append(result)
+        print(f"  workers={concurrency:<3} cycles={cycles} added={added_total:<5} {result['posts_per_second']:>8} posts/s "
+              f"{result['upload_mb_per_second']:>7} MB/s  cycle mean {result['cycle_mean_s']}s max {result['cycle_max_s']}s "
+              f"mirror p50 {result['time_to_mirror_p50_s']}s "
+              f"(queued for retry: {result['queued_for_retry']})")
+    return results
+
+
+def _fill_archive(app, size):
+    """Grows the in-memory archive (and its storage) to size entries with synthetic items."""
+    current = len(app.archive_store)
+    if current >= size:
+        return
+    items = [{
+        "title": f"Archived post {i}",
+        "author": f"user{i % 211}",
+        "fileditch_link": f"https://fileditch.example/archive/{i}.bin",
+        "original_link": f"https://media.example/{i}.{'mp4' if i % 3 == 0 else 'jpg'}",
+        "type": "video" if i % 3 == 0 else "image",
+        "processed_timestamp": "2025-01-01T00:00:00+00:00",
+        "community": "bench",
+    } for i in range(current, size)]
+    with app.data_lock:
+        app.archive_store.add_items(items)
+
+def bench_web(app, archive_sizes, concurrencies, requests_per_run, waitress_threads):
+    """Serves the app with Waitress and measures the read endpoints at each archive size and client concurrency."""
+    from waitress import create_server
+    server = create_server(app.app, host='127.0.0.1', port=0, threads=waitress_threads)
+    base_url = f"http://127.0.0.1:{server.effective_port}"
+    threading.Thread(target=server.run, name="BenchWaitress", daemon=True).start()
+    endpoints = [
+        ('index', '/'),
+        ('index page 5', '/?page=5'),
+        ('data page', '/data?limit=100'),
+        ('data filtered', '/data?author=user7&type=video&limit=100'),
+        ('data export', '/data'),
+    ]
+    results = []
+    local = threading.local()
+
+    def fetch(path):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.get(base_url + path, headers={'Accept-Encoding': 'gzip'}, stream=True)
+        wire_bytes = sum(len(chunk) for chunk in response.raw.stream(64 * 1024, decode_content=False))
+        return time.perf_counter() - started, response.status_code, wire_bytes
+
+    # The server thread is a daemon and ends with the process; closing it from here races its select loop
+    for size in archive_sizes:
+        _fill_archive(app, size)
+        print(f"  archive size {len(app.archive_store)}")
+        for name, path in endpoints:
+            # The full export grows with the archive, so it gets fewer requests
+            count = max(concurrencies) * 2 if name == 'data export' else requests_per_run
+            for concurrency in concurrencies:
+                started = time.perf_counter()
+                with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    samples = list(pool.map(fetch, [path] * count))
+                elapsed = time.perf_counter() - started
+                latencies = [sample[0] for sample in samples]
+                errors = sum(1 for sample in samples if sample[1] != 200)
+                result = dict({
+                    'archive_size': len(app.archive_store),
+                    'endpoint': name,
+                    'path': path,
+                    'concurrency': concurrency,
+                    'requests': count,
+                    'errors': errors,
+                    'requests_per_second': round(count / elapsed, 1),
+                    'mean_wire_bytes': int(statistics.mean(sample[2] for sample in samples)),
+                }, **_latency_summary(latencies))
+                results.append(result)
+                print(f"    {name:<14} c={concurrency:<3} {result['requests_per_second']:>9} req/s  "
+                      f"p50 {result['p50_ms']:>8}ms  p95 {result['p95_ms']:>8}ms  p99 {result['p99_ms']:>8}ms  "
+                      f"{result['mean_wire_bytes']} B{'  errors=' + str(errors) if errors else ''}")
+    return results
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',') if value.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark with local communities.win, CDN and FileDitch stand-ins.")
+    parser.add_argument('--communities', default='ip2always,spictank', help="Comma-separated communities; each gets a newv2 and a hotv2 feed.")
+    parser.add_argument('--posts', type=int, default=25, help="New posts per feed per cycle.")
+    parser.add_argument('--video-ratio', type=float, default=0.3, help="Fraction of posts linking to an .mp4.")
+    parser.add_argument('--video-kb', type=int, default=2048, help="Size of each synthetic video.")
+    parser.add_argument('--image-kb', type=int, default=150, help="Size of each synthetic image.")
+    parser.add_argument('--feed-latency-ms', type=float, default=50)
+    parser.add_argument('--media-latency-ms', type=float, default=20)
+    parser.add_argument('--upload-latency-ms', type=float, default=100)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of fake-server requests answered with 503.")
+    parser.add_argument('--concurrency', type=_int_list, default=[1, 4, 16], help="Mirror worker counts for the cycle benchmark.")
+    parser.add_argument('--cycles', type=int, default=2, help="Cycles per concurrency level.")
+    parser.add_argument('--archive-sizes', type=_int_list, default=[1000, 10000, 50000])
+    parser.add_argument('--clients', type=_int_list, default=[1, 8, 32], help="Client concurrencies for the web benchmark.")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and client concurrency.")
+    parser.add_argument('--waitress-threads', type=int, default=8)
+    parser.add_argument('--skip-cycles', action='store_true')
+    parser.add_argument('--skip-web', action='store_true')
+    parser.add_argument('--json', metavar='PATH', help="Also write the results as JSON, for comparing runs.")
+    parser.add_argument('--keep-dir', action='store_true', help="Keep the temporary data directory.")
+    parser.add_argument('--verbose', action='store_true', help="Show the app's INFO logs.")
+    args = parser.parse_args(argv)
+
+    services = FakeServices(
+        communities=[c.strip() for c in args.communities.split(',') if c.strip()],
+        posts_per_feed=args.posts, video_ratio=args.video_ratio,
+        video_bytes=args.video_kb * 1024, image_bytes=args.image_kb * 1024,
+        feed_latency=args.feed_latency_ms / 1000, media_latency=args.media_latency_ms / 1000,
+        upload_latency=args.upload_latency_ms / 1000, error_rate=args.error_rate,
+    ).start()
+    data_dir = tempfile.mkdtemp(prefix='ip2ditch-bench-')
+
+    # app.py reads its configuration at import time
+    os.environ.update({
+        'CW_API_KEY': 'benchmark', 'CW_API_SECRET': 'benchmark', 'CW_XSRF_TOKEN': 'benchmark',
+        'CW_API_URLS': ','.join(services.feed_urls()),
+        'APP_FILEDITCH_URL': f"{services.base_url}/upload.php",
+        'APP_DATA_FILE_PATH': os.path.join(data_dir, 'data.json'),
+        'HTTP_BACKOFF_FACTOR': '0.05',
+        # Size the connection pools for the highest concurrency; each run then narrows the limits
+        'MIRROR_WORKERS': str(max(args.concurrency)),
+        'MIRROR_PER_HOST_LIMIT': str(max(args.concurrency)),
+        'FILEDITCH_CONCURRENCY': str(max(args.concurrency)),
+    })
+    if os.environ.get('APP_SPOOL_DIR'):
+        os.environ['APP_SPOOL_DIR'] = os.path.join(data_dir, 'spool')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    # Injected errors are expected and show up in the results, so the app's error logs are hidden unless asked for
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.CRITICAL)
+
+    with app.data_lock:
+        app.archive_store.load()
+    app.feed_state.load()
+    app.media_index.load(app.archive_store.snapshot)
+    app.mirror_queue.load(app.archive_store)
+
+    results = {'settings': vars(args), 'cycles': [], 'web': []}
+    try:
+        if not args.skip_cycles:
+            print(f"Processing cycles ({len(services.feed_urls())} feeds, {args.posts} new posts each per cycle):")
+            results['cycles'] = bench_cycles(app, services, args.concurrency, args.cycles)
+            results['fake_services'] = dict(services.counts)
+        if not args.skip_web:
+            print("Web endpoints:")
+            results['web'] = bench_web(app, args.archive_sizes, args.clients, args.requests, args.waitress_threads)
+    finally:
+        services.stop()
+        if not args.keep_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        else:
+            print(f"Data directory kept at {data_dir}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app reads its configuration at import time: point it at a scratch directory with dummy credentials
+os.environ.setdefault('CW_API_KEY', 'test')
+os.environ.setdefault('CW_API_SECRET', 'test')
+os.environ.setdefault('CW_XSRF_TOKEN', 'test')
+os.environ['APP_DATA_FILE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='ip2ditch-tests-'), 'data.json')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+
+
+@pytest.fixture
+def app():
+    return app_module
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Per-test data directory for the cross-process files an ArchiveStore uses."""
+    monkeypatch.setattr(app_module, 'ARCHIVE_LOCK_PATH', str(tmp_path / 'archive.lock'))
+    monkeypatch.setattr(app_module, 'ARCHIVE_STAMP_PATH', str(tmp_path / 'archive.version'))
+    monkeypatch.setattr(app_module, 'ARCHIVE_INDEX_PATH', str(tmp_path / 'archive.idx'))
+    return tmp_path
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def make_storage(request, data_dir):
+    """Builds storage instances of the parametrized backend over the same files, like separate processes would."""
+    def make():
+        if request.param == 'sqlite':
+            return app_module.SqliteStorage(str(data_dir / 'archive.db'))
+        return app_module.JsonJournalStorage(str(data_dir / 'data.json'))
+    make.backend = request.param
+    return make
+
+
+@pytest.fixture
+def make_entry():
+    return _entry
+
+
+def _entry(i):
+    return {
+        "title": f"post {i}",
+        "author": f"User{i % 3}",
+        "fileditch_link": f"https://fd/{i}",
+        "original_link": f"https://o/{i}.{'mp4' if i % 2 else 'jpg'}",
+        "processed_timestamp": f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}+00:00",
+        "community": "ip2always" if i % 4 else "spictank",
+    }
@@ -0,0 +1,84 @@
+import gzip
+import json
+
+import pytest
+
+
+@pytest.fixture
+def client(app, make_storage, make_entry, monkeypatch):
+    store = app.ArchiveStore(make_storage())
+    with app.data_lock:
+        store.load()
+        store.add_items([make_entry(i) for i in range(25)])
+    monkeypatch.setattr(app, 'archive_store', store)
+    return app.app.test_client()
+
+
+def _pages(client, query):
+    """Follows next_cursor from the first page to the last, returning every page."""
+    pages = []
+    url = f'/data?{query}'
+    while True:
+        response = client.get(url)
+        assert response.status_code == 200
+        page = response.get_json()
+        pages.append(page)
+        if page['next_cursor'] is None:
+            return pages
+        url = f"/data?{query}&cursor={page['next_cursor']}"
+
+
+def _titles(pages):
+    return [item['title'] for page in pages for item in page['items']]
+
+
+def test_cursor_pagination_walks_the_whole_archive(client):
+    pages = _pages(client, 'limit=10')
+    assert [len(page['items']) for page in pages] == [10, 10, 5]
+    assert [page['next_cursor'] for page in pages] == ['10', '20', None]
+    assert _titles(pages) == [f'post {i}' for i in range(25)]
+    assert all(page['total_items'] == 25 for page in pages)
+
+
+def test_cursor_pagination_with_filters(client):
+    pages = _pages(client, 'limit=3&type=video&author=user1')
+    assert _titles(pages) == ['post 1', 'post 7', 'post 13', 'post 19']
+    # The cursor is the archive position of the next match, not a count of matches
+    assert [page['next_cursor'] for page in pages] == ['19', None]
+
+
+def test_offset_matches_cursor_pages(client):
+    by_offset = client.get('/data?limit=5&offset=10&community=ip2always').get_json()
+    everything = client.get('/data?community=ip2always').get_json()
+    assert [item['title'] for item in by_offset['items']] == [item['title'] for item in everything[10:15]]
+    unfiltered = client.get('/data?limit=3&offset=22').get_json()
+    assert [item['title'] for item in unfiltered['items']] == ['post 22', 'post 23', 'post 24']
+    assert unfiltered['next_cursor'] is None
+
+
+def test_fields_projection(client):
+    page = client.get('/data?limit=2&fields=title,author').get_json()
+    assert page['items'] == [{'title': 'post 0', 'author': 'User0'}, {'title': 'post 1', 'author': 'User1'}]
+
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=abc', 'cursor=-1', 'offset=-5', 'since=yesterday'])
+def test_invalid_parameters_are_rejected(client, query):
+    response = client.get(f'/data?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_etag_revalidation(app, client, make_entry):
+    first = client.get('/data?limit=5', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(first.data))['next_cursor'] == '5'
+    etag = first.headers['ETag']
+    assert client.get('/data?limit=5', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code == 304
+    # The identity encoding has its own tag
+    assert client.get('/data?limit=5', headers={'If-None-Match': etag}).status_code == 200
+
+    with app.data_lock:
+        app.archive_store.add_items([make_entry(25)])
+    changed = client.get('/data?limit=5', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
@@ -0,0 +1,141 @@
+import json
+import os
+
+import pytest
+
+QUERIES = [
+    {'type': 'video'},
+    {'author': 'user1'},
+    {'community': 'spictank'},
+    {'since': '2025-01-01T00:00:30Z'},
+    {'until': '2025-01-01T00:00:30Z'},
+    {'type': 'image', 'author': 'USER2', 'since': '1735689610'},
+]
+
+
+def _store(app, storage, read_only=False):
+    store = app.ArchiveStore(storage)
+    store.read_only = read_only
+    with app.data_lock:
+        store.load()
+    return store
+
+
+def _titles(items):
+    return [item.get('title') for item in items]
+
+
+@pytest.mark.parametrize('args', QUERIES)
+def test_sqlite_filter_positions_match_in_memory_filters(app, data_dir, make_entry, args):
+    store = _store(app, app.SqliteStorage(str(data_dir / 'archive.db')))
+    with app.data_lock:
+        store.add_items([make_entry(i) for i in range(50)])
+    items = store.snapshot()
+    query = app.DataQuery(args)
+    expected = [position for position, item in enumerate(items) if query.matches(item)]
+    assert expected
+    assert store.storage.filter_positions(query, len(items)) == expected
+    # Paged: from a cursor, at most limit positions
+    start = expected[2]
+    assert store.storage.filter_positions(query, len(items), start, 3) == expected[2:5]
+    # Positions past upto are not reported
+    assert store.storage.filter_positions(query, expected[1] + 1) == expected[:2]
+
+
+def test_json_storage_has_no_index(app, data_dir):
+    storage = app.JsonJournalStorage(str(data_dir / 'data.json'))
+    assert storage.filter_positions(app.DataQuery({'type': 'video'}), 10) is None
+
+
+def test_backends_load_the_same_archive(app, data_dir, make_entry):
+    entries = [make_entry(i) for i in range(20)]
+    factories = [lambda: app.JsonJournalStorage(str(data_dir / 'data.json')),
+                 lambda: app.SqliteStorage(str(data_dir / 'archive.db'))]
+    for make in factories:
+        store = _store(app, make())
+        with app.data_lock:
+            store.add_items(entries[:10])
+            store.add_items(entries[5:])
+    json_store, sqlite_store = (_store(app, make(), read_only=True) for make in factories)
+    assert _titles(json_store.snapshot()) == _titles(sqlite_store.snapshot()) == [e['title'] for e in entries]
+
+
+def test_journal_replays_after_compaction(app, data_dir, make_entry, monkeypatch):
+    monkeypatch.setattr(app, 'JOURNAL_COMPACT_THRESHOLD', 7)
+    path = str(data_dir / 'data.json')
+    store = _store(app, app.JsonJournalStorage(path))
+    for start in range(0, 12, 3):
+        with app.data_lock:
+            store.add_items([make_entry(i) for i in range(start, start + 3)])
+    # 12 entries in batches of 3: compacted at 9, then 3 more in the journal
+    with open(path, encoding='utf-8') as f:
+        assert len(json.load(f)) == 9
+    assert app.count_journal_records(path) == 3
+
+    entries = app.load_data(path)
+    assert [e['title'] for e in entries] == [make_entry(i)['title'] for i in range(12)]
+
+
+def test_journal_replay_skips_entries_already_compacted(app, data_dir, make_entry):
+    path = str(data_dir / 'data.json')
+    entries = [make_entry(i) for i in range(4)]
+    # A compaction interrupted before the journal was cleared leaves the same entries in both
+    assert app.save_data(path, entries)
+    assert app.append_data(path, entries[2:] + [make_entry(4)])
+    assert [e['title'] for e in app.load_data(path)] == [make_entry(i)['title'] for i in range(5)]
+
+
+def test_journal_torn_tail_is_dropped(app, data_dir, make_entry):
+    path = str(data_dir / 'data.json')
+    assert app.append_data(path, [make_entry(0), make_entry(1)])
+    with open(app._journal_path(path), 'a', encoding='utf-8') as f:
+        f.write('{"title": "torn')
+    assert [e['title'] for e in app.load_data(path)] == ['post 0', 'post 1']
+    # Truncated back to the last complete record, so later appends stay readable
+    assert app.append_data(path, [make_entry(2)])
+    assert [e['title'] for e in app.load_data(path)] == ['post 0', 'post 1', 'post 2']
+
+
+def test_follower_refresh_tails_appends(app, make_storage, make_entry):
+    writer = _store(app, make_storage())
+    follower = _store(app, make_storage(), read_only=True)
+    with app.data_lock:
+        writer.add_items([make_entry(i) for i in range(3)])
+        assert follower.refresh() == 3
+        assert follower.refresh() == 0
+        writer.add_items([make_entry(i) for i in range(3, 5)])
+        assert follower.refresh() == 2
+    assert _titles(follower.snapshot()) == _titles(writer.snapshot())
+    assert ('post 4', 'User1') in follower
+
+
+def test_follower_refresh_reloads_after_generation_bump(app, make_storage, make_entry, monkeypatch):
+    monkeypatch.setattr(app, 'JOURNAL_COMPACT_THRESHOLD', 4)
+    writer = _store(app, make_storage())
+    follower = _store(app, make_storage(), read_only=True)
+    with app.data_lock:
+        writer.add_items([make_entry(i) for i in range(3)])
+        follower.refresh()
+        generation = app._read_archive_stamp()['generation']
+        # Compaction (JSON) or a forced re-sync (SQLite) bumps the stamp's generation
+        writer._needs_rewrite = make_storage.backend == 'sqlite'
+        writer.add_items([make_entry(i) for i in range(3, 6)])
+        assert app._read_archive_stamp()['generation'] == generation + 1
+        assert follower.refresh() == 3
+    assert _titles(follower.snapshot()) == [f'post {i}' for i in range(6)]
+    assert len(follower.existing_keys()) == 6
+
+
+def test_dedup_index_defers_entries_until_first_use(app, make_storage, make_entry):
+    writer = _store(app, make_storage())
+    with app.data_lock:
+        writer.add_items([make_entry(i) for i in range(4)])
+    assert os.path.exists(app.ARCHIVE_INDEX_PATH)
+
+    store = _store(app, make_storage())
+    assert ('post 2', 'User2') in store and ('post 9', 'User0') not in store
+    # Entries written after the index file are picked up from the storage tail
+    assert len(store) == 4
+    with app.data_lock:
+        assert len(store.add_items([make_entry(3), make_entry(4)])) == 1
+    assert _titles(store.snapshot()) == [f'post {i}' for i in range(5)]